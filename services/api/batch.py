@@ -0,0 +1,209 @@
+"""Offline batch processing of WhatsApp exports.
+
+Precomputes dashboards for many archived chats without going through the
+HTTP API::
+
+    python batch.py exports/ --out dashboards/ --workers 8
+    python batch.py "archive/**/*.zip" --out dashboards/
+
+Each ``.txt`` export is memory-mapped (``.zip`` exports are read through the
+archive index), parsed and run through ``kpis.compute`` in a process pool.
+Results are written as ``<name>.kpis.json`` plus ``<name>.messages.parquet``
+(or ``.messages.json`` when no Parquet engine is installed), where ``<name>``
+is the export's path relative to the inputs' common directory, without its
+suffix (``a/_chat.txt`` and ``b/_chat.txt`` become ``a/_chat`` and
+``b/_chat``).
+"""
+
+import argparse
+import datetime as dt
+import glob
+import importlib.util
+import json
+import mmap
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from kpis import compute, to_df
+from parse import open_zip_export, parse_file, parse_stream
+from store import MessageStore
+
+EXPORT_SUFFIXES = (".txt", ".zip")
+
+
+def find_exports(patterns: List[str]) -> List[Path]:
+    """Expand directories and glob patterns into a sorted list of exports."""
+
+    found = set()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            candidates = [p for p in path.rglob("*")]
+        else:
+            candidates = [Path(p) for p in glob.glob(pattern, recursive=True)]
+        found.update(
+            p for p in candidates if p.is_file() and p.suffix.lower() in EXPORT_SUFFIXES
+        )
+    return sorted(found)
+
+
+def output_names(paths: List[Path]) -> Dict[Path, Path]:
+    """Collision-free output names for ``paths``, relative to the output directory.
+
+    Names mirror the paths below their common directory; exports that differ
+    only by suffix keep it (``chat.txt`` and ``chat.zip``).
+    """
+
+    if not paths:
+        return {}
+    resolved = {p: p.resolve() for p in paths}
+    root = Path(os.path.commonpath([r.parent for r in resolved.values()]))
+    rel = {p: r.relative_to(root) for p, r in resolved.items()}
+    stems = Counter(r.with_suffix("") for r in rel.values())
+    return {
+        p: r if stems[r.with_suffix("")] > 1 else r.with_suffix("")
+        for p, r in rel.items()
+    }
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"unknown timezone: {name}")
+
+
+def _messages_format(requested: str) -> str:
+    if requested != "auto":
+        return requested
+    has_parquet = any(
+        importlib.util.find_spec(mod) is not None for mod in ("pyarrow", "fastparquet")
+    )
+    return "parquet" if has_parquet else "json"
+
+
+def process_export(
+    path: Path,
+    out_dir: Path,
+    messages_format: str,
+    parse_workers: int = 1,
+    name: Optional[Path] = None,
+    default_tz: Optional[dt.tzinfo] = None,
+) -> Dict[str, Any]:
+    """Parse one export and write its KPI payload and messages to ``out_dir``.
+
+    Outputs are named ``out_dir / name`` (default: the export's stem) plus a
+    suffix. Large plain-text exports are parsed with ``parse_workers``
+    processes; ``default_tz`` is the timezone the export was written in.
+    """
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        if path.suffix.lower() == ".zip":
+            # zipfile seeks to the chat member itself; media is never read
+            chat, _ = open_zip_export(f)
+            with chat:
+                store = MessageStore.from_messages(parse_stream(chat, default_tz))
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                store = MessageStore.from_messages(
+                    parse_file(mm, default_tz, workers=parse_workers)
+                )
+    if not len(store):
+        raise ValueError("No messages parsed")
+
+    df = to_df(store)
+    k = compute(df)
+
+    base = out_dir / (name or path.stem)
+    base.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{base}.kpis.json", "w", encoding="utf-8") as f:
+        json.dump(k, f, default=_json_default)
+    if messages_format == "parquet":
+        df.to_parquet(f"{base}.messages.parquet", index=False)
+    else:
+        df.to_json(
+            f"{base}.messages.json",
+            orient="records",
+            date_format="iso",
+            force_ascii=False,
+        )
+    return {
+        "path": str(path),
+        "messages": int(len(store)),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="export files, directories or glob patterns")
+    parser.add_argument("--out", required=True, type=Path, help="output directory")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--messages-format",
+        choices=["auto", "parquet", "json"],
+        default="auto",
+        help="format for parsed messages; auto uses Parquet when available",
+    )
+    parser.add_argument(
+        "--tz",
+        type=_zone,
+        default=None,
+        help="IANA timezone the exports were written in (default: UTC)",
+    )
+    args = parser.parse_args(argv)
+
+    paths = find_exports(args.inputs)
+    if not paths:
+        print("No exports found", file=sys.stderr)
+        return 1
+    fmt = _messages_format(args.messages_format)
+    # workers left over when there are fewer exports than workers parse the
+    # large exports in parallel
+    parse_workers = max(1, args.workers // len(paths))
+    names = output_names(paths)
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(
+                process_export, p, args.out, fmt, parse_workers, names[p], args.tz
+            ): p
+            for p in paths
+        }
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as exc:
+                failures += 1
+                print(f"FAILED {path}: {exc}", file=sys.stderr)
+                continue
+            print(f"{res['path']}: {res['messages']} messages in {res['seconds']:.1f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Report peak memory of KPI computation for plain and lean frames.
+
+Runs ``to_df`` + ``kpis.compute`` under :mod:`tracemalloc` once with the
+default object-dtype frame and once with ``to_df(..., lean=True)``::
+
+    python bench_memory.py --messages 500000 --distributions sketch
+
+Each run gets a freshly built store (whose texts are decoded lazily), made
+before tracing starts, so the figures cover the frame and the KPI
+computation only. Both payloads are checked to be equal.
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import List
+
+from bench_sections import synthetic_messages
+from kpis import compute, to_df
+from parse import parse_stream
+from store import MessageStore
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("export", nargs="?", help=".txt export to measure (default: synthetic)")
+    parser.add_argument("--messages", type=int, default=200_000, help="size of the synthetic chat")
+    parser.add_argument("--distributions", choices=["raw", "sketch"], default="raw")
+    args = parser.parse_args(argv)
+
+    if args.export:
+        with open(args.export, "rb") as f:
+            messages = list(parse_stream(f))
+    else:
+        messages = synthetic_messages(args.messages)
+    print(f"{len(messages)} messages")
+
+    payloads = []
+    for lean in (False, True):
+        store = MessageStore.from_messages(messages)
+        tracemalloc.start()
+        start = time.perf_counter()
+        payloads.append(compute(to_df(store, lean=lean), distributions=args.distributions))
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        label = "lean" if lean else "plain"
+        print(f"{label:5}  peak {peak / 2**20:8.1f} MiB  {seconds:7.2f}s (traced)")
+    if payloads[0] != payloads[1]:
+        print("lean payload differs from plain payload", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
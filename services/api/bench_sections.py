@@ -0,0 +1,93 @@
+"""Benchmark section-parallel KPI computation.
+
+Times ``kpis.compute`` sequentially and with the section process pool of
+:mod:`parallel` at several worker counts::
+
+    python bench_sections.py --messages 500000 --workers 1,4,8,16
+    python bench_sections.py exports/big_chat.txt --repeat 5
+
+Without an export a synthetic chat of ``--messages`` messages is generated.
+Each configuration is run ``--repeat`` times and the best wall-clock time is
+reported together with the speed-up over the first worker count. Every
+parallel payload is checked against the sequential one.
+"""
+
+import argparse
+import datetime as dt
+import os
+import random
+import sys
+import time
+from typing import List
+
+from kpis import compute, to_df
+from parse import Message, parse_stream
+from store import MessageStore
+
+WORDS = (
+    "love you we should go home tonight what the hell are you doing did you eat "
+    "my dog thinks our plan is great haha 😂 ❤️ 🚀 ok sure maybe tomorrow"
+).split()
+
+
+def synthetic_messages(n: int, senders: int = 4, seed: int = 0) -> List[Message]:
+    """A reproducible chat with bursty timing and mixed vocabulary."""
+
+    rng = random.Random(seed)
+    names = [f"Person {k}" for k in range(senders)]
+    ts = dt.datetime(2020, 1, 1, 8, 0)
+    out = []
+    for _ in range(n):
+        ts += dt.timedelta(seconds=rng.choice([5, 30, 120, 900, 4 * 3600]))
+        if rng.random() < 0.02:
+            out.append(Message(ts=ts, sender=rng.choice(names), text="<Media omitted>", has_media=True))
+            continue
+        text = " ".join(rng.choices(WORDS, k=rng.randint(1, 14)))
+        if rng.random() < 0.2:
+            text += "?"
+        out.append(Message(ts=ts, sender=rng.choice(names), text=text))
+    return out
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("export", nargs="?", help=".txt export to benchmark (default: synthetic)")
+    parser.add_argument("--messages", type=int, default=200_000, help="size of the synthetic chat")
+    parser.add_argument("--workers", default="1,4,8,16", help="comma-separated worker counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration")
+    parser.add_argument("--word-cloud-capacity", type=int, default=None)
+    parser.add_argument("--distributions", choices=["raw", "sketch"], default="raw")
+    args = parser.parse_args(argv)
+
+    if args.export:
+        with open(args.export, "rb") as f:
+            store = MessageStore.from_messages(parse_stream(f))
+    else:
+        store = MessageStore.from_messages(synthetic_messages(args.messages))
+    df = to_df(store)
+    options = {
+        "word_cloud_capacity": args.word_cloud_capacity,
+        "distributions": args.distributions,
+    }
+    print(f"{len(df)} messages, {os.cpu_count()} CPUs")
+
+    baseline = None
+    expected = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        best = float("inf")
+        for _ in range(max(1, args.repeat)):
+            start = time.perf_counter()
+            payload = compute(df, workers=workers, **options)
+            best = min(best, time.perf_counter() - start)
+        if expected is None:
+            expected = payload if workers <= 1 else compute(df, **options)
+        if payload != expected:
+            print(f"workers={workers}: payload differs from sequential compute", file=sys.stderr)
+            return 1
+        baseline = baseline or best
+        print(f"workers={workers:>3}  {best:8.2f}s  x{baseline / best:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
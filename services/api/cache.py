@@ -0,0 +1,112 @@
+"""Content-addressed on-disk cache of parsed chats and KPI payloads.
+
+Uploads are keyed by a hash of their bytes, so the same export uploaded
+again (or from a second tab) reuses the parsed :class:`store.MessageStore`
+and any KPI payload computed for it instead of parsing and analysing anew.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from parse import CHUNK_SIZE
+from store import MessageStore
+
+
+def content_hash(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> str:
+    """Hash a seekable file in chunks and rewind it."""
+
+    h = hashlib.blake2b(digest_size=20)
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        h.update(chunk)
+    fileobj.seek(0)
+    return h.hexdigest()
+
+
+class KPICache:
+    """Size-capped LRU cache of parsed chats keyed by content hash.
+
+    Each entry is a directory holding the message store (``store.npz``), the
+    media index of a zip export (``media.json``) and one ``kpis-<variant>.json``
+    per KPI configuration. Reads refresh an entry's mtime; writes evict the
+    least recently used entries until the cache fits in ``max_bytes``.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / key
+
+    def load(self, key: str) -> Optional[Tuple[MessageStore, Dict[str, int]]]:
+        entry = self._entry(key)
+        try:
+            store = MessageStore.load(entry / "store.npz")
+            with open(entry / "media.json", "r", encoding="utf-8") as f:
+                media = json.load(f)
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        self._touch(entry)
+        return store, media
+
+    def save(self, key: str, store: MessageStore, media: Dict[str, int]) -> None:
+        entry = self._entry(key)
+        entry.mkdir(parents=True, exist_ok=True)
+        # write-then-rename so a concurrent reader never sees half a file
+        tmp = entry / "store.npz.tmp"
+        store.save(tmp)
+        os.replace(tmp, entry / "store.npz")
+        self._write_json(entry / "media.json", media)
+        self._evict()
+
+    def load_kpis(self, key: str, variant: str) -> Optional[Dict[str, Any]]:
+        entry = self._entry(key)
+        try:
+            with open(entry / f"kpis-{variant}.json", "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self._touch(entry)
+        return payload
+
+    def save_kpis(self, key: str, variant: str, payload: Dict[str, Any]) -> None:
+        entry = self._entry(key)
+        if not entry.is_dir():
+            return
+        self._write_json(entry / f"kpis-{variant}.json", payload)
+        self._evict()
+
+    @staticmethod
+    def _write_json(path: Path, data: Any) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _touch(entry: Path) -> None:
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for entry in self.directory.iterdir():
+                if entry.is_dir():
+                    size = sum(f.stat().st_size for f in entry.iterdir())
+                    entries.append((entry.stat().st_mtime, size, entry))
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
@@ -0,0 +1,16 @@
+import pytest
+
+import daily_themes
+import main
+from cache import KPICache
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches(tmp_path, monkeypatch):
+    """Give every test its own empty upload and theme caches and no current chat."""
+    monkeypatch.setattr(main, "KPI_CACHE", KPICache(tmp_path / "kpi_cache", 64 << 20))
+    monkeypatch.setattr(daily_themes, "CACHE_FILE", tmp_path / "daily_themes_cache.json")
+    monkeypatch.setattr(daily_themes, "_CACHE", {})
+    # a test's upload must not extend the chat an earlier test left behind
+    fresh = {k: {} if isinstance(v, dict) else None for k, v in main.STATE.items()}
+    monkeypatch.setattr(main, "STATE", fresh)
@@ -0,0 +1,224 @@
+"""Day × sender × metric cube for date-range KPIs.
+
+Per-day aggregates are laid out densely from the first to the last day of a
+chat and accumulated along the day axis, so the totals of any date range are
+one subtraction of two prefix rows. Only additive metrics live in the cube;
+sections that need message-level data (word cloud, distributions) stay
+whole-chat.
+"""
+
+import datetime as dt
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from incremental import KPIState
+from kpis import KPIEngine
+
+# Metric axis of the cube. ``reply_seconds`` sums reply times (clipped at 0)
+# credited to the replier on the day of the reply.
+METRICS = [
+    "messages", "words", "media", "questions", "unanswered_15m",
+    "affection", "profanity", "we", "i", "replies", "reply_seconds",
+]
+# Column of the KPIState timeline sums feeding each cube metric
+_TIMELINE_METRICS = {
+    "messages": 0, "words": 1, "media": 3, "questions": 2,
+    "affection": 4, "profanity": 5, "we": 6, "i": 7,
+}
+
+
+def _day(value: str) -> dt.date:
+    return dt.date.fromisoformat(value)
+
+
+class DayCube:
+    """Dense per-day aggregates with prefix sums over the day axis.
+
+    ``cum[k]`` holds the totals of the first ``k`` days, one
+    ``(senders, METRICS)`` matrix per row, so range totals cost O(1);
+    ``hours`` keeps the per-day hour-of-day counts for range heatmaps.
+    """
+
+    def __init__(self, first_day: Optional[dt.date], senders: List[str],
+                 counts: np.ndarray, hours: np.ndarray):
+        self.first_day = first_day
+        self.senders = senders
+        self.hours = hours
+        self.cum = np.zeros((counts.shape[0] + 1,) + counts.shape[1:], dtype=np.float64)
+        np.cumsum(counts, axis=0, out=self.cum[1:])
+
+    @property
+    def n_days(self) -> int:
+        return self.cum.shape[0] - 1
+
+    @classmethod
+    def from_state(cls, state: KPIState) -> "DayCube":
+        """Lay out the per-(day, sender) aggregates of ``state`` densely.
+
+        Costs O(days × senders), independent of the number of messages; use
+        :meth:`from_engine` when the chat has no folded state.
+        """
+        senders = list(state.participants)
+        if not state.timeline:
+            return cls(None, senders, np.zeros((0, len(senders), len(METRICS))),
+                       np.zeros((0, len(senders), 24), dtype=np.int64))
+        days = sorted({day for day, _ in state.timeline})
+        first = _day(days[0])
+        n_days = (_day(days[-1]) - first).days + 1
+        col = {s: k for k, s in enumerate(senders)}
+        counts = np.zeros((n_days, len(senders), len(METRICS)))
+        hours = np.zeros((n_days, len(senders), 24), dtype=np.int64)
+
+        def at(day: str, sender: str):
+            return (_day(day) - first).days, col[sender]
+
+        src = list(_TIMELINE_METRICS.values())
+        dst = [METRICS.index(m) for m in _TIMELINE_METRICS]
+        for (day, sender), row in state.timeline.items():
+            counts[at(day, sender) + (dst,)] = row[src]
+        for (day, sender), n in state.unanswered_by_day().items():
+            counts[at(day, sender) + (METRICS.index("unanswered_15m"),)] = n
+        replies = [METRICS.index("replies"), METRICS.index("reply_seconds")]
+        for (day, sender), row in state.replies.items():
+            counts[at(day, sender) + (replies,)] = row
+        for (day, sender), row in state.hours.items():
+            hours[at(day, sender)] = row
+        return cls(first, senders, counts, hours)
+
+    @classmethod
+    def from_engine(cls, engine: KPIEngine) -> "DayCube":
+        """Sum the engine's cleaned messages per (day, sender).
+
+        Reuses the engine's lexical features, unanswered questions and reply
+        pairs, so nothing beyond the range sections' own inputs is analysed;
+        costs O(messages + days × senders).
+        """
+        d = engine.d
+        senders = list(engine.participants)
+        codes = pd.Categorical(d["sender"], categories=senders).codes.astype(np.int64)
+        named = codes >= 0
+        if not named.any():
+            return cls(None, senders, np.zeros((0, len(senders), len(METRICS))),
+                       np.zeros((0, len(senders), 24), dtype=np.int64))
+        day = d["ts"].to_numpy().astype("datetime64[D]")[named]
+        first = day.min()
+        n_days = int((day.max() - first).astype(np.int64)) + 1
+        n_cells = n_days * len(senders)
+        cell = (day - first).astype(np.int64) * len(senders) + codes[named]
+
+        lex = engine.lexical
+        columns = {
+            "messages": None, "words": d["n_words"], "media": d["has_media"],
+            "questions": lex["is_question"], "unanswered_15m": engine.unanswered,
+            "affection": lex["is_affection"], "profanity": lex["is_profanity"],
+            "we": lex["we_count"], "i": lex["i_count"],
+        }
+        counts = np.zeros((n_cells, len(METRICS)))
+        for name, col in columns.items():
+            weights = None if col is None else col.to_numpy(np.float64)[named]
+            counts[:, METRICS.index(name)] = np.bincount(cell, weights, minlength=n_cells)
+
+        rp = engine.reply_pairs
+        if not rp.empty:
+            to = pd.Categorical(rp["to"], categories=senders).codes.astype(np.int64)
+            rday = rp["to_ts"].to_numpy().astype("datetime64[D]")
+            rcell = (rday - first).astype(np.int64) * len(senders) + to
+            sec = rp["sec"].clip(lower=0).to_numpy(np.float64)
+            counts[:, METRICS.index("replies")] = np.bincount(rcell, minlength=n_cells)
+            counts[:, METRICS.index("reply_seconds")] = np.bincount(rcell, sec, minlength=n_cells)
+
+        hour = d["ts"].dt.hour.to_numpy()[named]
+        hours = np.bincount(cell * 24 + hour, minlength=n_cells * 24).astype(np.int64)
+        return cls(
+            first.astype(dt.date), senders, counts.reshape(n_days, len(senders), len(METRICS)),
+            hours.reshape(n_days, len(senders), 24),
+        )
+
+    def _bounds(self, start: Optional[dt.date], end: Optional[dt.date]):
+        if self.first_day is None:
+            return 0, 0
+        a = 0 if start is None else (start - self.first_day).days
+        b = self.n_days if end is None else (end - self.first_day).days + 1
+        a = min(max(a, 0), self.n_days)
+        b = min(max(b, a), self.n_days)
+        return a, b
+
+    def totals(self, start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> np.ndarray:
+        """``(senders, METRICS)`` totals for the inclusive date range."""
+        a, b = self._bounds(start, end)
+        return self.cum[b] - self.cum[a]
+
+    def kpis(self, start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> Dict[str, Any]:
+        """Range version of the additive sections of the KPI payload.
+
+        Messages are attributed to the day they were sent, replies to the day
+        of the reply; whether a question was answered is judged against the
+        whole chat, even when the reply falls outside the range.
+        """
+        a, b = self._bounds(start, end)
+        t = self.cum[b] - self.cum[a]
+        m = {name: t[:, k] for k, name in enumerate(METRICS)}
+        senders = self.senders
+        present = [k for k in range(len(senders)) if m["messages"][k] > 0]
+
+        by_sender = [
+            {"sender": senders[k], "messages": int(m["messages"][k]),
+             "words": int(m["words"][k]), "media": int(m["media"][k])}
+            for k in sorted(present, key=lambda k: senders[k])
+        ]
+        reply_simple = []
+        for k in sorted(range(len(senders)), key=lambda k: senders[k]):
+            n = int(m["replies"][k])
+            if n:
+                reply_simple.append(
+                    {"person": senders[k], "seconds": float(m["reply_seconds"][k] / n), "n": n}
+                )
+        replied = {r["person"] for r in reply_simple}
+        reply_simple += [
+            {"person": s, "seconds": 0.0, "n": 0} for s in senders if s not in replied
+        ]
+
+        # heatmap: fold the range's days onto weekdays, O(days)
+        weekday0 = self.first_day.weekday() if self.first_day else 0
+        weekdays = (weekday0 + np.arange(a, b)) % 7
+        heat = np.zeros((7,) + self.hours.shape[1:], dtype=np.int64)
+        np.add.at(heat, weekdays, self.hours[a:b])
+        order = sorted(range(len(senders)), key=lambda k: senders[k])
+        heatmap = [
+            {"weekday": w, "hour": h, "sender": senders[k], "count": int(heat[w, k, h])}
+            for w in range(7) for h in range(24) for k in order if heat[w, k, h]
+        ]
+
+        we, i = int(m["we"].sum()), int(m["i"].sum())
+        span = {"start": None, "end": None}
+        if b > a:
+            span = {
+                "start": (self.first_day + dt.timedelta(days=a)).isoformat(),
+                "end": (self.first_day + dt.timedelta(days=b - 1)).isoformat(),
+            }
+        return {
+            "range": span,
+            "participants": senders,
+            "by_sender": by_sender,
+            "totals": {"messages": int(m["messages"].sum()), "words": int(m["words"].sum())},
+            "reply_simple": reply_simple,
+            "questions": {
+                "total": int(m["questions"].sum()),
+                "unanswered_15m": int(m["unanswered_15m"].sum()),
+            },
+            "questions_split": [
+                {"sender": s, "questions": int(m["questions"][k]),
+                 "unanswered_15m": int(m["unanswered_15m"][k])}
+                for k, s in enumerate(senders)
+            ],
+            "media_total": int(m["media"].sum()),
+            "profanity_hits": int(m["profanity"].sum()),
+            "we_ness_ratio": float(we / max(1, we + i)),
+            "affection_hits": int(m["affection"].sum()),
+            "affection_split": [
+                {"sender": s, "affection": int(m["affection"][k])} for k, s in enumerate(senders)
+            ],
+            "heatmap": heatmap,
+        }
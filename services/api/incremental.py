@@ -0,0 +1,439 @@
+"""Incrementally maintained KPI payload for chats that grow at the end.
+
+Weekly re-exports of a chat repeat all of its history and add a few hundred
+messages. :class:`KPIState` keeps the aggregates behind :func:`kpis.compute`
+in mergeable form so only the appended messages have to be analysed; its
+:meth:`KPIState.payload` is identical to a full recompute.
+"""
+
+import copy
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from kpis import (
+    INTERRUPTION_RUN,
+    LEXICAL_COLUMNS,
+    REPLY_TIME_BINS,
+    WORDS_PER_MESSAGE_BINS,
+    Distribution,
+    KPIEngine,
+    WordSketch,
+    _message_tokens,
+    answered_by_next,
+    day_labels,
+    distribution_payload,
+    distributions_by,
+    interruption_records,
+    lexical_features,
+    reply_graph_payload,
+    reply_pairs,
+    reply_summary,
+    sender_split,
+    turn_runs,
+    word_cloud_entries,
+)
+from sketches import QuantileSketch
+
+# per-sender and per-(day, sender) summaries, as built by kpis.distributions_by
+_Dists = Tuple[Dict[str, Distribution], Dict[Tuple[str, str], Distribution]]
+# Per (day, sender) sums kept for the timeline sections, in this order
+_TIMELINE_SUMS = [
+    "messages", "n_words", "is_question", "has_media",
+    "is_affection", "is_profanity", "we_count", "i_count",
+]
+
+
+def _merge_dists(into: _Dists, new: _Dists) -> None:
+    for target, source in zip(into, new):
+        for key, dist in source.items():
+            if key in target:
+                target[key].merge(dist)
+            else:
+                target[key] = dist
+
+
+class KPIState:
+    """Mergeable aggregates of a chat, folded in message by message.
+
+    Besides per-sender and per-(day, sender) sums and word counters, the
+    state remembers what the next message may still change: the start of the
+    current reply run, the open interruption run and whether the last
+    message, if a question, gets answered. Messages must be folded in
+    timestamp order; :meth:`extend` rejects a batch that predates what has
+    already been seen.
+    """
+
+    def __init__(
+        self,
+        word_cloud_capacity: Optional[int] = None,
+        top_n: int = 50,
+        distributions: str = "raw",
+    ):
+        if word_cloud_capacity is not None and word_cloud_capacity < top_n:
+            raise ValueError("capacity must be at least top_n")
+        if distributions not in ("raw", "sketch"):
+            raise ValueError("distributions must be 'raw' or 'sketch'")
+        self.word_cloud_capacity = word_cloud_capacity
+        self.distributions = distributions
+        self.top_n = top_n
+        self.last_ts: Optional[np.datetime64] = None
+        self.participants: List[str] = []
+        self.by_sender: Dict[str, np.ndarray] = {}
+        self.words_per_message: Dict[str, List[int]] = {}
+        self.words_per_message_timeline: List[Dict[str, Any]] = []
+        self.reply_times: Dict[str, List[float]] = {}
+        self.reply_times_timeline: List[Dict[str, Any]] = []
+        # "sketch" mode keeps bounded summaries instead of the lists above
+        self.words_dists: _Dists = ({}, {})
+        self.reply_dists: _Dists = ({}, {})
+        # sender, start and length of the current reply run
+        self.run_start: Optional[Tuple[str, np.datetime64, int]] = None
+        self.open_run: Optional[Tuple[str, int]] = None
+        self.interrupts: Dict[str, List[int]] = {}
+        self.questions: Counter = Counter()
+        # unanswered questions and reply counts/seconds per (day, sender)
+        self.unanswered: Counter = Counter()
+        self.replies: Dict[Tuple[str, str], np.ndarray] = {}
+        # replies, interruptions and latencies (list or sketch) per (from, to)
+        self.graph: Dict[Tuple[str, str], list] = {}
+        self.pending: Optional[Tuple[str, np.datetime64, str, bool]] = None
+        self.affection: Counter = Counter()
+        self.profanity = 0
+        self.we = 0
+        self.i = 0
+        self.media = 0
+        self.timeline: Dict[Tuple[str, str], np.ndarray] = {}
+        self.heatmap: Counter = Counter()
+        # messages per hour of day for every (day, sender)
+        self.hours: Dict[Tuple[str, str], np.ndarray] = {}
+        self.words: Dict[str, Union[Counter, WordSketch]] = {}
+
+    def __len__(self) -> int:
+        return int(sum(v[0] for v in self.by_sender.values()))
+
+    def extend(self, df: pd.DataFrame) -> None:
+        """Fold the messages of ``df`` (a ``kpis.to_df`` frame) into the state.
+
+        Work is proportional to ``len(df)``, not to the size of the state.
+        """
+        d = df.loc[~df["is_system"].to_numpy(bool), ["ts", "sender", "text", "has_media", "n_words"]]
+        if not pd.api.types.is_datetime64_dtype(d["ts"]):
+            d["ts"] = pd.to_datetime(d["ts"], errors="coerce")
+        if d["ts"].hasnans:
+            d = d.dropna(subset=["ts"])
+        if not d["ts"].is_monotonic_increasing:
+            d = d.sort_values("ts", kind="stable")
+        d.index = pd.RangeIndex(len(d))
+        if len(d) == 0:
+            return
+        if self.last_ts is not None and d["ts"].to_numpy()[0] < self.last_ts:
+            raise ValueError("messages predate the folded chat")
+        d[LEXICAL_COLUMNS] = lexical_features(d["text"])
+        d["day"] = day_labels(d["ts"])
+        self._fold(d)
+        self._fold_words(d)
+
+    @classmethod
+    def from_engine(cls, engine: KPIEngine, top_n: int = 50) -> "KPIState":
+        """State of ``engine``'s whole chat, in ``engine``'s payload settings.
+
+        Built from the engine's cleaned frame, day keys, lexical features
+        and word counts, so neither analyses the messages twice; the engine
+        memoizes whichever of them it had not built yet.
+        """
+        state = cls(engine.word_cloud_capacity, top_n, engine.distributions)
+        d = engine.d[["ts", "sender", "text", "has_media", "n_words"]].copy()
+        if len(d) == 0:
+            return state
+        d[LEXICAL_COLUMNS] = engine.lexical
+        d["day"] = engine.days
+        state._fold(d)
+        # copies, so extending the state leaves the engine's counts alone
+        state.words = copy.deepcopy(engine.words)
+        return state
+
+    def _fold(self, d: pd.DataFrame) -> None:
+        """Fold all but the word counts of ``d``: clean, sorted messages
+        with their lexical features and day keys."""
+        ts = d["ts"].to_numpy()
+        self.last_ts = ts[-1]
+        senders = d["sender"].to_numpy(dtype=object)
+
+        for s in pd.unique(d["sender"].dropna()):
+            if s not in self.by_sender:
+                self.participants.append(s)
+                self.by_sender[s] = np.zeros(3, dtype=np.int64)
+        by_sender = d.groupby("sender", sort=False, observed=True)
+        sums = by_sender.agg(
+            messages=("ts", "size"), words=("n_words", "sum"), media=("has_media", "sum")
+        )
+        for s, row in zip(sums.index, sums.to_numpy(np.int64)):
+            self.by_sender[s] += row
+        if self.distributions == "sketch":
+            _merge_dists(self.words_dists, distributions_by(
+                d["day"], d["sender"], d["n_words"], WORDS_PER_MESSAGE_BINS
+            ))
+        else:
+            for s, arr in by_sender["n_words"]:
+                self.words_per_message.setdefault(s, []).extend(arr.astype(int).tolist())
+            self.words_per_message_timeline.extend(
+                d[["day", "sender", "n_words"]].rename(columns={"n_words": "words"})
+                .to_dict(orient="records")
+            )
+
+        self._fold_replies(d)
+        self._fold_runs(senders)
+        self._fold_questions(
+            senders, ts, d["day"].to_numpy(dtype=object), d["is_question"].to_numpy(dtype=bool)
+        )
+
+        self.profanity += int(d["is_profanity"].sum())
+        self.we += int(d["we_count"].sum())
+        self.i += int(d["i_count"].sum())
+        self.media += int(d["has_media"].sum())
+        self.affection.update(by_sender["is_affection"].sum().astype(int).to_dict())
+
+        d["messages"] = 1
+        day_sums = d.groupby(["day", "sender"], sort=False, observed=True)[_TIMELINE_SUMS].sum()
+        for key, row in zip(day_sums.index, day_sums.to_numpy(np.int64)):
+            prev = self.timeline.get(key)
+            self.timeline[key] = row if prev is None else prev + row
+        hours = pd.DataFrame(
+            {"weekday": d["ts"].dt.weekday, "hour": d["ts"].dt.hour, "sender": senders}
+        )
+        self.heatmap.update(hours.groupby(["weekday", "hour", "sender"], sort=False).size().to_dict())
+        hours["day"] = d["day"]
+        by_hour = hours.groupby(["day", "sender", "hour"], sort=False, observed=True).size()
+        for (day, sender, hour), n in by_hour.items():
+            row = self.hours.get((day, sender))
+            if row is None:
+                row = self.hours[(day, sender)] = np.zeros(24, dtype=np.int64)
+            row[hour] += n
+
+    def _fold_replies(self, d: pd.DataFrame) -> None:
+        sub = d.loc[d["sender"].astype(bool), ["sender", "ts"]]
+        if len(sub) == 0:
+            return
+        if self.run_start is not None:
+            head = pd.DataFrame({"sender": [self.run_start[0]], "ts": [self.run_start[1]]})
+            sub = pd.concat([head, sub], ignore_index=True)
+        else:
+            sub = sub.reset_index(drop=True)
+        turns = turn_runs(sub["sender"])
+        # the head row stands in for the whole run it started
+        carried = self.run_start[2] - 1 if self.run_start is not None else 0
+        last = turns.starts[-1]
+        length = int(turns.lengths[-1]) + (carried if len(turns.starts) == 1 else 0)
+        self.run_start = (sub["sender"].iat[last], sub["ts"].to_numpy()[last], length)
+        rp = reply_pairs(sub, turns, lengths=True)
+        if rp.empty:
+            return
+        rp.loc[0, "from_len"] += carried
+        rp["day"] = day_labels(rp["to_ts"])
+        if self.distributions == "sketch":
+            rp["sec"] = rp["sec"].clip(lower=0)
+            _merge_dists(self.reply_dists, distributions_by(
+                rp["day"], rp["to"], rp["sec"], REPLY_TIME_BINS
+            ))
+        else:
+            self.reply_times_timeline.extend(
+                rp[["day", "to", "sec"]]
+                .rename(columns={"to": "sender", "sec": "seconds"})
+                .to_dict(orient="records")
+            )
+            rp["sec"] = rp["sec"].clip(lower=0)
+            for person, arr in rp.groupby("to", sort=False)["sec"]:
+                times = self.reply_times.setdefault(str(person), [])
+                times.extend(arr.astype(float).tolist())
+        per_day = rp.groupby(["day", "to"], sort=False, observed=True)["sec"].agg(["size", "sum"])
+        for key, row in zip(per_day.index, per_day.to_numpy(np.float64)):
+            prev = self.replies.get(key)
+            self.replies[key] = row if prev is None else prev + row
+        self._fold_graph(rp)
+
+    def _fold_graph(self, rp: pd.DataFrame) -> None:
+        sec = rp["sec"].to_numpy(np.float64)
+        interrupted = rp["from_len"].to_numpy() >= INTERRUPTION_RUN
+        for key, idx in rp.groupby(["from", "to"], sort=False).indices.items():
+            cell = self.graph.get(key)
+            if cell is None:
+                dist = QuantileSketch() if self.distributions == "sketch" else []
+                cell = self.graph[key] = [0, 0, dist]
+            cell[0] += len(idx)
+            cell[1] += int(interrupted[idx].sum())
+            if self.distributions == "sketch":
+                cell[2].update(sec[idx])
+            else:
+                cell[2].extend(sec[idx].tolist())
+
+    def _fold_runs(self, senders: np.ndarray) -> None:
+        turns = turn_runs(pd.Series(senders))
+        run_senders = senders[turns.starts].tolist()
+        lengths = turns.lengths.tolist()
+        if self.open_run is not None:
+            if run_senders[0] == self.open_run[0]:
+                lengths[0] += self.open_run[1]
+            else:
+                run_senders.insert(0, self.open_run[0])
+                lengths.insert(0, self.open_run[1])
+        for s, n in zip(run_senders[:-1], lengths[:-1]):
+            self._close_run(self.interrupts, s, n)
+        self.open_run = (run_senders[-1], lengths[-1])
+
+    @staticmethod
+    def _close_run(interrupts: Dict[str, List[int]], sender: str, length: int) -> None:
+        if length < INTERRUPTION_RUN:
+            return
+        stats = interrupts.setdefault(sender, [0, 0])
+        stats[0] += 1
+        stats[1] = max(stats[1], length)
+
+    def _fold_questions(
+        self, senders: np.ndarray, ts: np.ndarray, days: np.ndarray, is_q: np.ndarray
+    ) -> None:
+        self.questions.update(senders[is_q].tolist())
+        if self.pending is not None:
+            p_sender, p_ts, p_day, p_q = self.pending
+            senders = np.concatenate([np.array([p_sender], dtype=object), senders])
+            ts = np.concatenate([np.array([p_ts], dtype=ts.dtype), ts])
+            days = np.concatenate([np.array([p_day], dtype=object), days])
+            is_q = np.concatenate([[p_q], is_q])
+        # every message but the last now knows its successor
+        answered = answered_by_next(senders, ts)
+        missed = is_q[:-1] & ~answered
+        self.unanswered.update(zip(days[:-1][missed].tolist(), senders[:-1][missed].tolist()))
+        self.pending = (senders[-1], ts[-1], days[-1], bool(is_q[-1]))
+
+    def unanswered_by_day(self) -> Counter:
+        """Unanswered questions per (day, sender), the last message included."""
+        unanswered = Counter(self.unanswered)
+        if self.pending is not None and self.pending[3]:
+            unanswered[(self.pending[2], self.pending[0])] += 1
+        return unanswered
+
+    def _fold_words(self, d: pd.DataFrame) -> None:
+        keep = d["sender"].notna() & ~d["has_media"] & ~d["text"].str.contains(
+            "<media omitted>", case=False, na=False
+        )
+        for sender, sub in d[keep].groupby("sender", sort=False, observed=True):
+            texts = sub["text"].fillna("").tolist()
+            if self.word_cloud_capacity is None:
+                cnt = self.words.setdefault(str(sender), Counter())
+                for text in texts:
+                    cnt.update(_message_tokens(text))
+            else:
+                sketch = self.words.get(str(sender))
+                if sketch is None:
+                    sketch = self.words[str(sender)] = WordSketch(self.word_cloud_capacity)
+                for text in texts:
+                    for w in _message_tokens(text):
+                        sketch.add(w)
+
+    def payload(self) -> Dict[str, Any]:
+        """Render the state in the shape returned by :func:`kpis.compute`."""
+        participants = list(self.participants)
+
+        by_sender = [
+            {"sender": s, "messages": int(v[0]), "words": int(v[1]), "media": int(v[2])}
+            for s, v in sorted(self.by_sender.items())
+        ]
+        totals = {
+            "messages": sum(r["messages"] for r in by_sender),
+            "words": sum(r["words"] for r in by_sender),
+        }
+
+        stats = []
+        reply_times = {str(p): [] for p in participants}
+        if self.distributions == "sketch":
+            for person, dist in sorted(self.reply_dists[0].items()):
+                stats.append((person, dist.total / dist.sketch.count, dist.sketch.count))
+        for person in sorted(self.reply_times):
+            arr = np.asarray(self.reply_times[person], dtype=float)
+            reply_times[person] = list(self.reply_times[person])
+            stats.append((person, arr.mean(), arr.size))
+        replies = reply_summary(participants, stats)
+
+        interrupts = {s: list(v) for s, v in self.interrupts.items()}
+        if self.open_run is not None:
+            self._close_run(interrupts, *self.open_run)
+
+        n = len(participants)
+        pos = {str(p): k for k, p in enumerate(participants)}
+        counts = np.zeros(n * n, dtype=np.int64)
+        interrupted = np.zeros(n * n, dtype=np.int64)
+        medians = np.full(n * n, np.nan)
+        for (src, dst), (count, n_interrupted, dist) in self.graph.items():
+            k = pos[str(src)] * n + pos[str(dst)]
+            counts[k], interrupted[k] = count, n_interrupted
+            medians[k] = dist.quantile(0.5) if self.distributions == "sketch" else np.median(dist)
+
+        unanswered: Counter = Counter()
+        for (_, sender), k in self.unanswered_by_day().items():
+            unanswered[sender] += k
+
+        keys = sorted(self.timeline)
+
+        def timeline(*columns: str) -> List[Dict[str, Any]]:
+            idx = [_TIMELINE_SUMS.index(c) for c in columns]
+            names = [{"n_words": "words", "is_question": "questions", "has_media": "media",
+                      "is_affection": "affection", "is_profanity": "profanity",
+                      "we_count": "we", "i_count": "i"}.get(c, c) for c in columns]
+            out = []
+            for day, sender in keys:
+                row = self.timeline[(day, sender)]
+                rec = {"day": day, "sender": sender}
+                rec.update((n, int(row[k])) for n, k in zip(names, idx))
+                out.append(rec)
+            return out
+
+        error_bounds: Dict[str, int] = {}
+        word_cloud = word_cloud_entries(dict(sorted(self.words.items())), self.top_n, error_bounds)
+
+        payload = {
+            "participants": participants,
+            "by_sender": by_sender,
+            "totals": totals,
+            "reply_simple": replies["reply_simple"],
+            "words_per_message": {
+                str(p): list(self.words_per_message.get(p, [])) for p in participants
+            },
+            "words_per_message_timeline": list(self.words_per_message_timeline),
+            "reply_times": reply_times,
+            "reply_times_timeline": list(self.reply_times_timeline),
+            "interruptions": interruption_records(interrupts),
+            "reply_graph": reply_graph_payload(participants, counts, interrupted, medians),
+            "questions": {
+                "total": int(sum(self.questions.values())),
+                "unanswered_15m": int(sum(unanswered.values())),
+            },
+            "questions_split": sender_split(
+                participants, questions=self.questions, unanswered_15m=unanswered
+            ),
+            "media_total": self.media,
+            "profanity_hits": self.profanity,
+            "we_ness_ratio": float(self.we / max(1, self.we + self.i)),
+            "affection_hits": int(sum(self.affection.values())),
+            "affection_split": sender_split(participants, affection=self.affection),
+            "timeline_messages": timeline("messages"),
+            "timeline_words": timeline("n_words"),
+            "timeline_questions": timeline("is_question"),
+            "timeline_media": timeline("has_media"),
+            "timeline_affection": timeline("is_affection"),
+            "timeline_profanity": timeline("is_profanity"),
+            "timeline_we_ness": timeline("we_count", "i_count"),
+            "heatmap": [
+                {"weekday": int(w), "hour": int(h), "sender": s, "count": int(c)}
+                for (w, h, s), c in sorted(self.heatmap.items())
+            ],
+            "word_cloud": word_cloud,
+        }
+        if self.word_cloud_capacity is not None:
+            payload["word_cloud_error_bound"] = error_bounds
+        if self.distributions == "sketch":
+            payload.update(distribution_payload(participants, self.words_dists, self.reply_dists))
+        payload["timeline"] = payload["timeline_messages"]
+        payload["reply_times_summary"] = replies["reply_times_summary"]
+        return payload
@@ -1,8 +1,13 @@
-from typing import List, Dict, Any, Set
-import re, pandas as pd
+from dataclasses import dataclass
+from functools import cached_property
+import heapq
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple, Union
+import re, numpy as np, pandas as pd
 from collections import Counter
 from wordcloud import STOPWORDS as WC_STOPWORDS
 from parse import Message
+from sketches import QuantileSketch, SpaceSaving
+from store import MessageStore
 import emoji
 
 AFFECTION_TOKENS = [
@@ -36,142 +41,518 @@ def count_tokens(text: str, toks: List[str]) -> int:
     words = txt.split()
     return sum(1 for w in words if w in toks)
 
-def word_counts(df: pd.DataFrame, participants: List[str], top_n: int = 50) -> Dict[str, List[Dict[str, Any]]]:
-    out: Dict[str, List[Dict[str, Any]]] = {}
+_NON_ALPHA = re.compile(r"[^a-zA-Z\s]")
+_WE_SET = frozenset(PRONOUNS_WE)
+_I_SET = frozenset(PRONOUNS_I)
+_CATEGORY_SETS = {
+    "swear": frozenset(PROFANITY),
+    "sexual": frozenset(SEXUAL_WORDS),
+    "space": frozenset(SPACE_WORDS),
+}
+# Profanity and affection are substring matches; a single alternation scan
+# over the lowercased text replaces one ``str.contains`` pass per list.
+_PROFANITY_RE = re.compile("|".join(re.escape(w.lower()) for w in PROFANITY)) if PROFANITY else None
+_AFFECTION_RE = re.compile("|".join(re.escape(t.lower()) for t in AFFECTION_TOKENS)) if AFFECTION_TOKENS else None
+
+LEXICAL_COLUMNS = [
+    "is_question", "is_profanity", "is_affection", "we_count", "i_count",
+    *(f"{c}_hits" for c in _CATEGORY_SETS),
+]
+
+
+def lexical_features(texts: pd.Series) -> pd.DataFrame:
+    """Extract per-message lexical features in one pass over ``texts``.
+
+    Each message is lowercased and tokenized once; the result has one row per
+    message with the columns in ``LEXICAL_COLUMNS``: question/profanity/
+    affection flags, first-person plural and singular pronoun counts (as in
+    :func:`count_tokens`) and token hits per word-cloud category.
+    """
+    question = QUESTION_PAT.search
+    prof = _PROFANITY_RE.search if _PROFANITY_RE is not None else None
+    aff = _AFFECTION_RE.search if _AFFECTION_RE is not None else None
+    categories = list(_CATEGORY_SETS.values())
+    rows = []
+    for text in texts.tolist():
+        if not isinstance(text, str) or not text:
+            rows.append((False, False, False, 0, 0, *(0 for _ in categories)))
+            continue
+        low = text.lower()
+        words = _NON_ALPHA.sub(" ", low).split()
+        we = i = 0
+        hits = [0] * len(categories)
+        for w in words:
+            if w in _WE_SET:
+                we += 1
+            elif w in _I_SET:
+                i += 1
+            for k, cat in enumerate(categories):
+                if w in cat:
+                    hits[k] += 1
+        rows.append((
+            question(text) is not None,
+            prof is not None and prof(low) is not None,
+            aff is not None and aff(low) is not None,
+            we,
+            i,
+            *hits,
+        ))
+    columns = list(zip(*rows)) if rows else [()] * len(LEXICAL_COLUMNS)
+    return pd.DataFrame(
+        {
+            name: np.array(col, dtype=bool if name.startswith("is_") else np.int64)
+            for name, col in zip(LEXICAL_COLUMNS, columns)
+        },
+        index=texts.index,
+    )
+
+_WORD_RE = re.compile(r"[A-Za-z']+")
+_ZWJ = "\u200d"
+_EMOJI_SET = frozenset(emoji.EMOJI_DATA)
+# Candidate emoji lengths per first character, longest first, so a scan only
+# does a handful of set lookups at each possible emoji start.
+_EMOJI_LENGTHS: Dict[str, List[int]] = {}
+for _e in _EMOJI_SET:
+    _EMOJI_LENGTHS.setdefault(_e[0], []).append(len(_e))
+for _lens in _EMOJI_LENGTHS.values():
+    _lens.sort(reverse=True)
+# Emoji start at a non-ASCII character, except keycaps such as "#\ufe0f\u20e3"
+_EMOJI_CANDIDATE = re.compile(r"[^\x00-\x7f]|[#*0-9](?=[\ufe0f\u20e3])")
+_WORD_TAGS: Dict[str, Set[str]] = {}
+for _tag, _words in (("swear", PROFANITY), ("sexual", SEXUAL_WORDS), ("space", SPACE_WORDS)):
+    for _w in _words:
+        _WORD_TAGS.setdefault(_w, set()).add(_tag)
+_WORD_TAGS = {w: frozenset(t) for w, t in _WORD_TAGS.items()}
+_EMOJI_TAGS = frozenset({"emoji"})
+_NO_TAGS: frozenset = frozenset()
+
+
+def emoji_tokens(text: str) -> List[str]:
+    """Return the emoji in ``text`` in order, as ``emoji.emoji_list`` would.
+
+    Uses a leftmost-longest scan over ``emoji.EMOJI_DATA``; texts where a
+    zero-width joiner is left outside every match (non-standard ZWJ chains)
+    are handed to ``emoji.emoji_list`` so the result stays identical.
+    """
+    if text.isascii():
+        return []
+    out: List[str] = []
+    search = _EMOJI_CANDIDATE.search
+    i = 0
+    while True:
+        m = search(text, i)
+        if m is None:
+            break
+        i = m.start()
+        for n in _EMOJI_LENGTHS.get(text[i], ()):
+            tok = text[i:i + n]
+            if tok in _EMOJI_SET:
+                out.append(tok)
+                i += n
+                break
+        else:
+            i += 1
+    if _ZWJ in text and sum(t.count(_ZWJ) for t in out) != text.count(_ZWJ):
+        return [d["emoji"] for d in emoji.emoji_list(text)]
+    return out
+
+
+def _token_tags(token: str) -> frozenset:
+    if token.isascii():
+        return _WORD_TAGS.get(token, _NO_TAGS)
+    return _EMOJI_TAGS
+
+
+def _word_cloud_groups(df: pd.DataFrame, participants: List[str]):
     filtered = df[
         df["sender"].isin(participants)
         & (~df["has_media"])
         & (~df["text"].str.contains("<media omitted>", case=False, na=False))
     ]
-    for sender, sub in filtered.groupby("sender"):
-        words: List[str] = []
-        tags: Dict[str, Set[str]] = {}
-        for text in sub["text"].fillna(""):
-            tokens = re.findall(r"[A-Za-z']+", text.lower())
-            emoji_tokens = [d["emoji"] for d in emoji.emoji_list(text)]
-            for w in tokens:
-                if w in STOPWORDS:
+    return filtered.groupby("sender", observed=True)
+
+
+def _message_tokens(text: str) -> List[str]:
+    stop = STOPWORDS
+    words = [w for w in _WORD_RE.findall(text.lower()) if w not in stop]
+    words.extend(emoji_tokens(text))
+    return words
+
+
+def _word_cloud_entries(cnt: Counter, top_n: int) -> List[Dict[str, Any]]:
+    """Overall and per-tag top ``top_n`` words of one sender's counter."""
+    # One pass over the vocabulary buckets words by tag; the overall and
+    # per-tag top N are then heap selections over the single counter.
+    # Ties keep first-seen order, as Counter.most_common does.
+    tagged: Dict[str, List[str]] = {}
+    for w in cnt:
+        for t in _token_tags(w):
+            tagged.setdefault(t, []).append(w)
+    top_words = {w for w, _ in cnt.most_common(top_n)}
+    for ws in tagged.values():
+        top_words.update(heapq.nlargest(top_n, ws, key=cnt.__getitem__))
+    rank = {w: k for k, w in enumerate(cnt)}
+    return [
+        {"name": w, "value": int(cnt[w]), "tags": sorted(_token_tags(w))}
+        for w in sorted(top_words, key=lambda x: (-cnt[x], rank[x]))
+    ]
+
+
+def word_counts(
+    df: pd.DataFrame,
+    participants: List[str],
+    top_n: int = 50,
+    capacity: Optional[int] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Top words and emoji per sender, plus the top N of every tag.
+
+    With ``capacity`` set, counts come from :func:`word_counts_approx`
+    instead, using constant memory per sender.
+    """
+    if capacity is not None:
+        return word_counts_approx(df, participants, top_n, capacity)
+    return word_cloud_entries(word_counters(df, participants), top_n)
+
+
+class WordSketch:
+    """Space-Saving sketches for one sender: all tokens plus one per tag."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.overall = SpaceSaving(capacity)
+        self.by_tag: Dict[str, SpaceSaving] = {}
+
+    def add(self, token: str) -> None:
+        self.overall.add(token)
+        for t in _token_tags(token):
+            sketch = self.by_tag.get(t)
+            if sketch is None:
+                sketch = self.by_tag[t] = SpaceSaving(self.capacity)
+            sketch.add(token)
+
+    def entries(self, top_n: int) -> List[Dict[str, Any]]:
+        # A word may be monitored by the overall sketch and its tag sketches;
+        # report the estimate with the smallest error (tag sketches only see
+        # tagged words and are usually exact).
+        chosen: Dict[str, Tuple[int, int]] = {}
+        for sketch in [self.overall, *self.by_tag.values()]:
+            for w, _ in sketch.top(top_n):
+                if w in chosen:
                     continue
-                words.append(w)
-                if w not in tags:
-                    tags[w] = set()
-                if w in PROFANITY:
-                    tags[w].add("swear")
-                if w in SEXUAL_WORDS:
-                    tags[w].add("sexual")
-                if w in SPACE_WORDS:
-                    tags[w].add("space")
-            for e in emoji_tokens:
-                words.append(e)
-                if e not in tags:
-                    tags[e] = set()
-                tags[e].add("emoji")
-        cnt = Counter(words)
-
-        # start with overall top N
-        top_words = {w for w, _ in cnt.most_common(top_n)}
-        # ensure we also include top N for each tag category
-        all_tags = {t for ts in tags.values() for t in ts}
-        for t in all_tags:
-            tagged = [w for w in cnt if t in tags.get(w, set())]
-            top_words.update(
-                [w for w, _ in Counter({w: cnt[w] for w in tagged}).most_common(top_n)]
-            )
-        out[str(sender)] = [
-            {"name": w, "value": int(cnt[w]), "tags": sorted(list(tags.get(w, set())))}
-            for w in sorted(top_words, key=lambda x: cnt[x], reverse=True)
+                estimates = [
+                    (sk.counts[w], sk.errors[w])
+                    for sk in [self.overall, *(self.by_tag[t] for t in _token_tags(w))]
+                    if w in sk.counts
+                ]
+                chosen[w] = min(estimates, key=lambda ce: ce[1])
+        return [
+            {"name": w, "value": int(c), "tags": sorted(_token_tags(w)), "error": int(e)}
+            for w, (c, e) in sorted(chosen.items(), key=lambda kv: -kv[1][0])
         ]
+
+
+def word_counts_approx(
+    df: pd.DataFrame,
+    participants: List[str],
+    top_n: int = 50,
+    capacity: int = 2000,
+    error_bounds: Optional[Dict[str, int]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Approximate :func:`word_counts` in bounded memory.
+
+    Each sender gets a :class:`WordSketch` of ``capacity`` counters for all
+    tokens and per tag, so memory does not grow with chat length. Every
+    entry carries ``error``, the most its ``value`` may overstate the true
+    count. If ``error_bounds`` is given it receives each sender's
+    sketch-wide bound: no word whose true count exceeds it is missed.
+    """
+    if capacity < top_n:
+        raise ValueError("capacity must be at least top_n")
+    return word_cloud_entries(word_counters(df, participants, capacity), top_n, error_bounds)
+
+
+def word_counters(
+    df: pd.DataFrame, participants: List[str], capacity: Optional[int] = None
+) -> Dict[str, Union[Counter, WordSketch]]:
+    """Token counts of each sender's word-cloud messages: a ``Counter``, or
+    with ``capacity`` a :class:`WordSketch` of that many counters."""
+    out: Dict[str, Union[Counter, WordSketch]] = {}
+    for sender, sub in _word_cloud_groups(df, participants):
+        texts = sub["text"].fillna("").tolist()
+        if capacity is None:
+            words: List[str] = []
+            for text in texts:
+                words.extend(_message_tokens(text))
+            out[str(sender)] = Counter(words)
+        else:
+            sketch = out[str(sender)] = WordSketch(capacity)
+            for text in texts:
+                for w in _message_tokens(text):
+                    sketch.add(w)
     return out
 
-def to_df(messages: List[Message]) -> pd.DataFrame:
-    rows = []
-    for i, m in enumerate(messages):
-        rows.append({
-            "i": i,
-            "ts": m.ts,
-            "sender": m.sender or "",
-            "text": m.text or "",
-            "has_media": m.has_media,
-            "is_system": m.is_system,
-            "n_words": len(m.text.split()) if m.text else 0,
-            "n_chars": len(m.text) if m.text else 0,
-        })
-    df = pd.DataFrame(rows).sort_values("ts").reset_index(drop=True)
-    return df
-
-def reply_pairs(df: pd.DataFrame) -> pd.DataFrame:
+
+def word_cloud_entries(
+    counters: Dict[str, Union[Counter, WordSketch]],
+    top_n: int = 50,
+    error_bounds: Optional[Dict[str, int]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Word-cloud entries of :func:`word_counters` output, in its order.
+
+    Sketches also fill ``error_bounds``, if given, with their sketch-wide
+    bound (see :func:`word_counts_approx`).
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for sender, cnt in counters.items():
+        if isinstance(cnt, WordSketch):
+            if error_bounds is not None:
+                error_bounds[sender] = cnt.overall.error_bound
+            out[sender] = cnt.entries(top_n)
+        else:
+            out[sender] = _word_cloud_entries(cnt, top_n)
+    return out
+
+def to_df(messages: Union[MessageStore, Iterable[Message]], lean: bool = False) -> pd.DataFrame:
+    """Return the message DataFrame, sorted by timestamp.
+
+    Given a :class:`store.MessageStore` this is a view over its columns;
+    other message iterables are first packed into a store. ``lean`` gives a
+    categorical ``sender`` and, with pyarrow installed, Arrow-backed ``text``
+    (see :meth:`store.MessageStore.to_df`); ``compute`` accepts either form.
+    """
+    if not isinstance(messages, MessageStore):
+        messages = MessageStore.from_messages(messages)
+    return messages.to_df(lean=lean)
+
+@dataclass
+class Turns:
+    """Run-length view of a sender sequence.
+
+    ``starts`` and ``lengths`` describe each run of consecutive messages from
+    one sender; ``next_other[i]`` is the position of the next message from a
+    different sender than message ``i`` (``-1`` if there is none).
+    """
+
+    codes: np.ndarray
+    starts: np.ndarray
+    lengths: np.ndarray
+    next_other: np.ndarray
+
+
+def turn_runs(senders: pd.Series) -> Turns:
+    """Compute sender runs and next-different-sender indices in one pass."""
+    codes, _ = pd.factorize(senders)
+    n = len(codes)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return Turns(codes, empty, empty, empty)
+    starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+    lengths = np.diff(np.append(starts, n))
+    next_start = np.append(starts[1:], -1)
+    next_other = np.repeat(next_start, lengths)
+    return Turns(codes, starts, lengths, next_other)
+
+
+def day_labels(ts: pd.Series) -> pd.Series:
+    """Calendar day of each timestamp as a ``YYYY-MM-DD`` categorical.
+
+    The codes are day ordinals relative to the first day, so only the days of
+    the spanned range are ever formatted; categories sort chronologically.
+    Group by the result with ``observed=True``.
+    """
+    days = ts.to_numpy("datetime64[ns]").astype("datetime64[D]").view(np.int64)
+    if len(days) == 0:
+        return pd.Series(pd.Categorical([]), index=ts.index, name="day")
+    first = int(days.min())
+    span = np.arange(first, int(days.max()) + 1).astype("datetime64[D]")
+    labels = pd.Categorical.from_codes(
+        (days - first).astype(np.int32), categories=np.datetime_as_string(span, unit="D")
+    )
+    return pd.Series(labels, index=ts.index, name="day")
+
+
+def _seconds(ts: pd.Series, later: np.ndarray, earlier: np.ndarray) -> np.ndarray:
+    values = ts.to_numpy()
+    return (values[later] - values[earlier]) / np.timedelta64(1, "s")
+
+
+def reply_pairs(
+    df: pd.DataFrame, turns: Optional[Turns] = None, lengths: bool = False
+) -> pd.DataFrame:
     """Run-based pairing: for each streak of messages from the same sender,
     pair the *first* message in that streak with the next message from a
     different sender. This ensures response time measures from the start of
-    a message run rather than the last message before a reply."""
+    a message run rather than the last message before a reply.
+
+    ``turns`` may be passed when already computed for ``df``; it is ignored
+    if ``df`` contains rows without a sender. With ``lengths`` a ``from_len``
+    column holds the number of messages in each answered run."""
     if len(df) == 0:
         return pd.DataFrame()
 
     # Ignore rows without a sender to avoid creating spurious runs
-    d = df[df["sender"].astype(bool)].reset_index(drop=True)
-
-    # Identify the first message of each run where the sender changes
-    run_starts = d[d["sender"].ne(d["sender"].shift())].reset_index(drop=True)
-
-    pairs = []
-    for idx in range(len(run_starts) - 1):
-        cur = run_starts.iloc[idx]
-        nxt = run_starts.iloc[idx + 1]
-        if cur["sender"] != nxt["sender"]:
-            pairs.append({
-                "from": cur["sender"],
-                "to": nxt["sender"],
-                "sec": (nxt["ts"] - cur["ts"]).total_seconds(),
-                "from_ts": cur["ts"],
-                "to_ts": nxt["ts"],
-            })
-    return pd.DataFrame(pairs)
-
-def reply_pairs_general(df: pd.DataFrame) -> pd.DataFrame:
+    has_sender = df["sender"].astype(bool)
+    if turns is None or not has_sender.all():
+        df = df[has_sender]
+        turns = turn_runs(df["sender"])
+
+    starts = turns.starts
+    if len(starts) < 2:
+        return pd.DataFrame()
+    cur, nxt = starts[:-1], starts[1:]
+    senders = df["sender"].to_numpy()
+    ts = df["ts"].reset_index(drop=True)
+    rp = pd.DataFrame({
+        "from": senders[cur],
+        "to": senders[nxt],
+        "sec": _seconds(ts, nxt, cur),
+        "from_ts": ts.iloc[cur].reset_index(drop=True),
+        "to_ts": ts.iloc[nxt].reset_index(drop=True),
+    })
+    if lengths:
+        rp["from_len"] = turns.lengths[:-1]
+    return rp
+
+def reply_pairs_general(df: pd.DataFrame, turns: Optional[Turns] = None) -> pd.DataFrame:
     """For each message, find the next message by a *different* sender (not just adjacent)."""
-    pairs = []
-    n = len(df)
-    for i in range(n - 1):
-        cur = df.iloc[i]
-        cur_sender = cur["sender"]
-        j = i + 1
-        while j < n and df.iloc[j]["sender"] == cur_sender:
-            j += 1
-        if j >= n:
-            break
-        nxt = df.iloc[j]
-        delta = (nxt["ts"] - cur["ts"]).total_seconds()
-        if delta >= 0:
-            pairs.append({"initiator": cur_sender, "responder": nxt["sender"], "sec": float(delta)})
-    return pd.DataFrame(pairs)
-
-def interruptions(df: pd.DataFrame) -> pd.DataFrame:
-    runs = []
-    if len(df) == 0:
+    if turns is None:
+        turns = turn_runs(df["sender"])
+    cur = np.flatnonzero(turns.next_other >= 0)
+    nxt = turns.next_other[cur]
+    sec = _seconds(df["ts"], nxt, cur)
+    keep = sec >= 0
+    if not keep.any():
         return pd.DataFrame()
-    df = df.reset_index(drop=True)
-    cur_sender = df.iloc[0]["sender"]
-    run_len = 1
-    for idx in range(1, len(df)):
-        s = df.iloc[idx]["sender"]
-        if s == cur_sender:
-            run_len += 1
+    senders = df["sender"].to_numpy()
+    return pd.DataFrame({
+        "initiator": senders[cur[keep]],
+        "responder": senders[nxt[keep]],
+        "sec": sec[keep].astype(float),
+    })
+
+def reply_graph(
+    rp: pd.DataFrame, participants: List[str], sketch: bool = False
+) -> Dict[str, Any]:
+    """Who-replies-to-whom matrices over ``participants`` from ``reply_pairs(..., lengths=True)``.
+
+    Cell ``[i][j]`` of ``replies`` counts the runs of ``participants[i]``
+    answered by ``participants[j]``; ``interruptions`` counts those of the
+    runs that had two or more messages, and ``median_seconds`` is the median
+    reply latency (``None`` where ``j`` never answered ``i``; a
+    :class:`sketches.QuantileSketch` estimate when ``sketch``). Senders are
+    coded once and every matrix is a single ``bincount`` or sorted scan.
+    """
+    n = len(participants)
+    replies = np.zeros(n * n, dtype=np.int64)
+    interrupts = np.zeros(n * n, dtype=np.int64)
+    medians = np.full(n * n, np.nan)
+    if not rp.empty and n:
+        src = pd.Categorical(rp["from"], categories=participants).codes.astype(np.int64)
+        dst = pd.Categorical(rp["to"], categories=participants).codes.astype(np.int64)
+        key = src * n + dst
+        sec = rp["sec"].clip(lower=0).to_numpy(np.float64)
+        replies = np.bincount(key, minlength=n * n)
+        interrupts = np.bincount(
+            key, weights=rp["from_len"].to_numpy() >= INTERRUPTION_RUN, minlength=n * n
+        ).astype(np.int64)
+        # sort by cell, then latency: each cell is a contiguous sorted slice
+        order = np.lexsort((sec, key))
+        sec = sec[order]
+        starts = np.concatenate(([0], np.cumsum(replies)[:-1]))
+        present = np.flatnonzero(replies)
+        if sketch:
+            for k in present.tolist():
+                qs = QuantileSketch()
+                qs.update(sec[starts[k]:starts[k] + replies[k]])
+                medians[k] = qs.quantile(0.5)
         else:
-            runs.append({"sender": cur_sender, "len": run_len})
-            cur_sender = s
-            run_len = 1
-    runs.append({"sender": cur_sender, "len": run_len})
-    return pd.DataFrame(runs)
+            lo = starts[present] + (replies[present] - 1) // 2
+            hi = starts[present] + replies[present] // 2
+            medians[present] = (sec[lo] + sec[hi]) / 2
+    return reply_graph_payload(participants, replies, interrupts, medians)
+
+
+def reply_graph_payload(
+    participants: List[str], replies: np.ndarray, interrupts: np.ndarray, medians: np.ndarray
+) -> Dict[str, Any]:
+    """The ``reply_graph`` section from flat ``n * n`` cell arrays (NaN medians
+    where a cell has no replies)."""
+    n = len(participants)
+    return {
+        "senders": [str(p) for p in participants],
+        "replies": np.asarray(replies, dtype=np.int64).reshape(n, n).tolist(),
+        "median_seconds": [
+            [None if np.isnan(v) else float(v) for v in row] for row in medians.reshape(n, n)
+        ],
+        "interruptions": np.asarray(interrupts, dtype=np.int64).reshape(n, n).tolist(),
+    }
+
+def interruptions(df: pd.DataFrame, turns: Optional[Turns] = None) -> pd.DataFrame:
+    if len(df) == 0:
+        return pd.DataFrame()
+    if turns is None:
+        turns = turn_runs(df["sender"])
+    return pd.DataFrame({
+        "sender": df["sender"].to_numpy()[turns.starts],
+        "len": turns.lengths.astype(np.int64),
+    })
+
+# Runs of at least this many messages count as interruptions
+INTERRUPTION_RUN = 2
+# A question counts as answered when another sender writes within this window
+ANSWER_WINDOW = np.timedelta64(15, "m")
+
+
+def answered_by_next(senders: np.ndarray, ts: np.ndarray) -> np.ndarray:
+    """For every message but the last, whether the next one comes from another
+    sender within ``ANSWER_WINDOW``."""
+    return (senders[1:] != senders[:-1]) & (ts[1:] - ts[:-1] <= ANSWER_WINDOW)
+
+
+def interruption_records(stats: Dict[str, Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """The ``interruptions`` section from each sender's (runs, longest run)."""
+    return [{"sender": s, "count": int(c), "max": int(m)} for s, (c, m) in sorted(stats.items())]
+
+
+def reply_summary(
+    participants: List[str], stats: Iterable[Tuple[str, float, int]]
+) -> Dict[str, Any]:
+    """``reply_simple`` and ``reply_times_summary`` from (person, mean seconds,
+    replies) per replier; participants who never replied get zeros."""
+    reply_simple = [{"person": str(p), "seconds": float(s), "n": int(n)} for p, s, n in stats]
+    present = {r["person"] for r in reply_simple}
+    reply_simple += [
+        {"person": str(p), "seconds": 0.0, "n": 0} for p in participants if str(p) not in present
+    ]
+    return {
+        "reply_simple": reply_simple,
+        "reply_times_summary": [
+            {"to": r["person"], "seconds": r["seconds"], "count": r["n"]} for r in reply_simple
+        ],
+    }
+
+
+def sender_split(participants: List[str], **columns: Any) -> List[Dict[str, Any]]:
+    """One record per participant with each column's count (a mapping by sender)."""
+    return [
+        {"sender": p, **{name: int(col.get(p, 0)) for name, col in columns.items()}}
+        for p in participants
+    ]
+
 
 def heatmap_hour_weekday(df: pd.DataFrame) -> pd.DataFrame:
-    d = df[~df["is_system"]].copy()
-    d["hour"] = d["ts"].dt.hour
-    d["weekday"] = d["ts"].dt.weekday
-    return d.groupby(["weekday","hour","sender"]).size().reset_index(name="count")
+    d = df[~df["is_system"]] if df["is_system"].any() else df
+    ts = d["ts"].dt
+    keys = [ts.weekday.rename("weekday"), ts.hour.rename("hour"), d["sender"]]
+    return d.groupby(keys, observed=True).size().reset_index(name="count")
 
 def we_ness(df: pd.DataFrame) -> float:
-    we = int(df["text"].fillna("").apply(lambda t: count_tokens(t, PRONOUNS_WE)).sum())
-    i_tokens = int(df["text"].fillna("").apply(lambda t: count_tokens(t, PRONOUNS_I)).sum())
+    if "we_count" in df and "i_count" in df:
+        we = int(df["we_count"].sum())
+        i_tokens = int(df["i_count"].sum())
+    else:
+        we = int(df["text"].fillna("").apply(lambda t: count_tokens(t, PRONOUNS_WE)).sum())
+        i_tokens = int(df["text"].fillna("").apply(lambda t: count_tokens(t, PRONOUNS_I)).sum())
     return float(we / max(1, we + i_tokens))
 
 def affection_hits(df: pd.DataFrame) -> int:
@@ -185,157 +566,509 @@ def profanity_hits(df: pd.DataFrame) -> int:
     pat = re.compile("|".join(re.escape(w) for w in PROFANITY), re.IGNORECASE)
     return int(df["text"].str.contains(pat, na=False).sum())
 
-def compute(df: pd.DataFrame) -> Dict[str, Any]:
-    d = df[~df["is_system"]].copy().reset_index(drop=True)
-    # Coerce timestamps to pandas datetime, drop NaT, and sort
-    d["ts"] = pd.to_datetime(d["ts"], errors="coerce")
-    d = d.dropna(subset=["ts"]).sort_values("ts").reset_index(drop=True)
+# Pre-binned histogram edges for the "sketch" distribution payloads: bin k
+# counts values in [edges[k], edges[k + 1]), the last bin is open-ended.
+WORDS_PER_MESSAGE_BINS = [0, 1, 2, 3, 5, 8, 13, 21, 34, 55]
+REPLY_TIME_BINS = [0, 60, 300, 900, 3600, 3 * 3600, 12 * 3600, 86400, 7 * 86400]
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
 
-    participants = list(d["sender"].dropna().unique())
 
-    by_sender_df = d.groupby("sender").agg(
-        messages=("i","count"),
-        words=("n_words","sum"),
-        media=("has_media","sum")
-    ).reset_index()
+class Distribution:
+    """Bounded, mergeable summary of a value distribution.
 
-    totals = {
-        "messages": int(by_sender_df["messages"].sum()) if len(by_sender_df)>0 else 0,
-        "words": int(by_sender_df["words"].sum()) if len(by_sender_df)>0 else 0
-    }
+    Keeps a fixed-bin histogram, the count and sum, and a
+    :class:`sketches.QuantileSketch` for percentiles.
+    """
 
-    # Words per message distribution per participant
-    words_per_message = {
-        str(p): d[d["sender"] == p]["n_words"].astype(int).tolist()
-        for p in participants
-    }
+    def __init__(self, bins: List[float]):
+        self.bins = bins
+        self.counts = np.zeros(len(bins), dtype=np.int64)
+        self.total = 0.0
+        self.sketch = QuantileSketch()
 
-    wpm_timeline_df = d.copy()
-    wpm_timeline_df["day"] = wpm_timeline_df["ts"].dt.strftime("%Y-%m-%d")
-    words_per_message_timeline = (
-        wpm_timeline_df[["day", "sender", "n_words"]]
-        .rename(columns={"n_words": "words"})
-        .to_dict(orient="records")
+    def update(self, values) -> None:
+        x = np.asarray(values, dtype=np.float64)
+        self.sketch.update(x)
+        self.total += float(x.sum())
+        self.counts += np.bincount(
+            np.searchsorted(self.bins, x, side="right") - 1, minlength=len(self.bins)
+        )
+
+    def merge(self, other: "Distribution") -> None:
+        self.sketch.merge(other.sketch)
+        self.total += other.total
+        self.counts += other.counts
+
+    def summary(self, histogram: bool = True) -> Dict[str, Any]:
+        n = self.sketch.count
+        out: Dict[str, Any] = {"count": n, "mean": self.total / n if n else 0.0}
+        out.update((k, self.sketch.quantile(q) if n else 0.0) for k, q in QUANTILES.items())
+        if histogram:
+            out["histogram"] = {"edges": list(self.bins), "counts": self.counts.tolist()}
+        return out
+
+
+def distributions_by(
+    days: pd.Series, senders: pd.Series, values: pd.Series, bins: List[float]
+) -> Tuple[Dict[str, Distribution], Dict[Tuple[str, str], Distribution]]:
+    """Summarise ``values`` per sender and per (day, sender)."""
+    frame = pd.DataFrame(
+        {"day": days.to_numpy(), "sender": senders.to_numpy(), "v": values.to_numpy()}
     )
+    by_day: Dict[Tuple[str, str], Distribution] = {}
+    for key, sub in frame.groupby(["day", "sender"], sort=False)["v"]:
+        by_day[key] = dist = Distribution(bins)
+        dist.update(sub.to_numpy())
+    by_sender: Dict[str, Distribution] = {}
+    for (_, sender), dist in by_day.items():
+        if sender not in by_sender:
+            by_sender[sender] = Distribution(bins)
+        by_sender[sender].merge(dist)
+    return by_sender, by_day
+
+
+ROLLING_WINDOWS = [7, 30]
+
+
+def rolling_latency(
+    days: np.ndarray,
+    senders: np.ndarray,
+    keys: np.ndarray,
+    counts: np.ndarray,
+    windows: List[int] = ROLLING_WINDOWS,
+) -> List[Dict[str, Any]]:
+    """Rolling p50/p90 reply latency per sender over trailing windows of days.
+
+    Replies come as ``counts`` of :meth:`sketches.QuantileSketch.bucket_keys`
+    per reply day (``datetime64[D]``) and sender. Per sender the counts form
+    a day x bucket grid: its cumulative sum over days makes every window one
+    subtraction and a cumulative sum over buckets locates the percentiles,
+    so the cost does not depend on the window length. Percentiles are those
+    of a :class:`sketches.QuantileSketch` of the window's replies.
+
+    One record per window, day and sender with replies in the window, in
+    that order.
+    """
+    if len(days) == 0:
+        return []
+    sketch = QuantileSketch()
+    day = np.asarray(days, dtype="datetime64[D]").astype(np.int64)
+    first = int(day.min())
+    day -= first
+    n_days = int(day.max()) + 1
+    codes, names = pd.factorize(np.asarray(senders, dtype=object), sort=True)
+    counts = np.asarray(counts, dtype=np.int64)
+    quantiles = [("p50", QUANTILES["p50"]), ("p90", QUANTILES["p90"])]
+    # per window: replies and percentiles for every (sender, day)
+    totals = {w: np.zeros((len(names), n_days), dtype=np.int64) for w in windows}
+    values = {(w, k): np.zeros((len(names), n_days)) for w in windows for k, _ in quantiles}
+    ends = np.arange(1, n_days + 1)
+    # replies grouped by sender once, so each sender only touches its own
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    keys = np.asarray(keys)
+    for s in range(len(names)):
+        mine = order[bounds[s]:bounds[s + 1]]
+        buckets, bucket = np.unique(keys[mine], return_inverse=True)
+        width = len(buckets)
+        grid = np.bincount(
+            (day[mine] + 1) * width + bucket, weights=counts[mine], minlength=(n_days + 1) * width
+        ).astype(np.int64).reshape(n_days + 1, width)
+        cum = grid.cumsum(axis=0)
+        midpoints = sketch.bucket_values(buckets)
+        for w in windows:
+            cdf = (cum[1:] - cum[np.maximum(ends - w, 0)]).cumsum(axis=1)
+            n = cdf[:, -1]
+            totals[w][s] = n
+            for k, q in quantiles:
+                rank = q * (n - 1)
+                values[(w, k)][s] = midpoints[(cdf > rank[:, None]).argmax(axis=1)]
+
+    out = []
+    for w in windows:
+        day_idx, sender_idx = np.nonzero(totals[w].T)
+        labels = np.datetime_as_string(
+            (day_idx + first).astype("datetime64[D]"), unit="D"
+        ).tolist()
+        columns = [totals[w][sender_idx, day_idx].tolist()] + [
+            values[(w, k)][sender_idx, day_idx].tolist() for k, _ in quantiles
+        ]
+        for label, s, n, *qs in zip(labels, sender_idx.tolist(), *columns):
+            rec = {"window": w, "day": label, "sender": str(names[s]), "replies": n}
+            rec.update(zip((k for k, _ in quantiles), qs))
+            out.append(rec)
+    return out
+
+
+def distribution_payload(
+    participants: List[str],
+    words: Tuple[Dict[str, Distribution], Dict[Tuple[str, str], Distribution]],
+    replies: Tuple[Dict[str, Distribution], Dict[Tuple[str, str], Distribution]],
+) -> Dict[str, Any]:
+    """The words-per-message and reply-time sections in sketch form.
+
+    Per sender: count, mean, p50/p90/p99 and a histogram; per (day, sender)
+    the same without histogram. The timelines keep their ``day``/``sender``
+    records with ``messages``/``replies`` counts and ``words``/``seconds``
+    sums, so range averages remain sum over count.
+    """
+    def per_sender(by_sender, bins):
+        return {str(p): by_sender.get(p, Distribution(bins)).summary() for p in participants}
+
+    def per_day(by_day, count, total, cast):
+        out = []
+        for day, sender in sorted(by_day):
+            dist = by_day[(day, sender)]
+            s = dist.summary(histogram=False)
+            rec = {"day": day, "sender": sender, count: s.pop("count"), total: cast(dist.total)}
+            del s["mean"]
+            rec.update(s)
+            out.append(rec)
+        return out
+
+    return {
+        "words_per_message": per_sender(words[0], WORDS_PER_MESSAGE_BINS),
+        "words_per_message_timeline": per_day(words[1], "messages", "words", int),
+        "reply_times": per_sender(replies[0], REPLY_TIME_BINS),
+        "reply_times_timeline": per_day(replies[1], "replies", "seconds", float),
+    }
+
+
+# Payload keys in output order, each mapped to the KPIEngine section that
+# produces it. Sections producing several keys run once for all of them.
+SECTIONS = {
+    "participants": "_participants",
+    "by_sender": "_by_sender",
+    "totals": "_by_sender",
+    "reply_simple": "_replies",
+    "words_per_message": "_words_per_message",
+    "words_per_message_timeline": "_words_per_message",
+    "reply_times": "_reply_times",
+    "reply_times_timeline": "_reply_times",
+    "reply_latency_rolling": "_reply_latency_rolling",
+    "interruptions": "_interruptions",
+    "reply_graph": "_reply_graph",
+    "questions": "_questions",
+    "questions_split": "_questions",
+    "media_total": "_media_total",
+    "profanity_hits": "_profanity",
+    "we_ness_ratio": "_we_ness",
+    "affection_hits": "_affection",
+    "affection_split": "_affection",
+    "timeline_messages": "_timeline_messages",
+    "timeline_words": "_timeline_words",
+    "timeline_questions": "_timeline_lexical",
+    "timeline_media": "_timeline_media",
+    "timeline_affection": "_timeline_lexical",
+    "timeline_profanity": "_timeline_lexical",
+    "timeline_we_ness": "_timeline_lexical",
+    "heatmap": "_heatmap",
+    "word_cloud": "_word_cloud",
+    "word_cloud_error_bound": "_word_cloud",
+    "timeline": "_timeline_messages",
+    "reply_times_summary": "_replies",
+}
+# Keys left out of the default payload for their size (a record per day,
+# sender and window); they are computed only when asked for by name.
+ON_REQUEST = {"reply_latency_rolling"}
+
+
+class KPIEngine:
+    """Lazily computed, memoized sections of the KPI payload.
+
+    Each payload key belongs to a section (see ``SECTIONS``) that runs on
+    first request and keeps its result. Sections share intermediates -- the
+    cleaned frame, day keys, sender runs, reply pairs, lexical features -- as
+    cached properties, so each is built at most once per chat whichever
+    sections ask for it.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        word_cloud_capacity: Optional[int] = None,
+        distributions: str = "raw",
+    ):
+        if distributions not in ("raw", "sketch"):
+            raise ValueError("distributions must be 'raw' or 'sketch'")
+        self.df = df
+        self.word_cloud_capacity = word_cloud_capacity
+        self.distributions = distributions
+        self._results: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def keys(self) -> List[str]:
+        """Keys of the default payload, in output order."""
+        return [
+            k for k in SECTIONS
+            if k not in ON_REQUEST
+            and (k != "word_cloud_error_bound" or self.word_cloud_capacity is not None)
+        ]
+
+    def get(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """The payload restricted to ``keys`` (the default payload by default;
+        ``ON_REQUEST`` keys only when named)."""
+        keys = self.keys if keys is None else list(keys)
+        unknown = [k for k in keys if k not in self.keys and k not in ON_REQUEST]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        out = {}
+        for k in keys:
+            section = SECTIONS[k]
+            if section not in self._results:
+                self._results[section] = getattr(self, section)()
+            out[k] = self._results[section][k]
+        return out
+
+    # -- shared intermediates ------------------------------------------------
+
+    @cached_property
+    def d(self) -> pd.DataFrame:
+        """Non-system messages with valid timestamps, sorted stably by time.
 
-    # Reply stats (first message in each run versus next sender)
-    rp = reply_pairs(d)
-    reply_simple = []
-    reply_times = {str(p): [] for p in participants}
-    reply_times_timeline = []
-    if not rp.empty:
-        rp["day"] = rp["to_ts"].dt.strftime("%Y-%m-%d")
-        reply_times_timeline = (
-            rp[["day", "to", "sec"]]
-            .rename(columns={"to": "sender", "sec": "seconds"})
+        The row selection is the only copy; conversion, NaT removal and
+        sorting only run when the frame needs them (``to_df`` frames don't).
+        """
+        d = self.df[~self.df["is_system"].to_numpy(bool)]
+        if not pd.api.types.is_datetime64_dtype(d["ts"]):
+            d = d.assign(ts=pd.to_datetime(d["ts"], errors="coerce"))
+        if d["ts"].hasnans:
+            d = d.dropna(subset=["ts"])
+        if not d["ts"].is_monotonic_increasing:
+            d = d.sort_values("ts", kind="stable")
+        d.index = pd.RangeIndex(len(d))
+        return d
+
+    @cached_property
+    def participants(self) -> List[str]:
+        return list(self.d["sender"].dropna().unique())
+
+    @cached_property
+    def days(self) -> pd.Series:
+        return day_labels(self.d["ts"])
+
+    @cached_property
+    def turns(self) -> Turns:
+        return turn_runs(self.d["sender"])
+
+    @cached_property
+    def reply_pairs(self) -> pd.DataFrame:
+        rp = reply_pairs(self.d, self.turns, lengths=True)
+        if not rp.empty:
+            rp["day"] = day_labels(rp["to_ts"])
+        return rp
+
+    @cached_property
+    def lexical(self) -> pd.DataFrame:
+        """The :data:`LEXICAL_COLUMNS` of ``d``, extracted once (same index)."""
+        return lexical_features(self.d["text"])
+
+    @cached_property
+    def words(self) -> Dict[str, Union[Counter, WordSketch]]:
+        """Word-cloud token counts per sender (see :func:`word_counters`)."""
+        return word_counters(self.d, self.participants, self.word_cloud_capacity)
+
+    @cached_property
+    def unanswered(self) -> pd.Series:
+        """Questions of ``d`` not followed within 15 minutes by another sender."""
+        d = self.d
+        answered = answered_by_next(d["sender"].to_numpy(dtype=object), d["ts"].to_numpy())
+        return self.lexical["is_question"] & ~np.append(answered, False)
+
+    # -- sections ------------------------------------------------------------
+
+    def _participants(self) -> Dict[str, Any]:
+        return {"participants": self.participants}
+
+    def _by_sender(self) -> Dict[str, Any]:
+        by_sender_df = self.d.groupby("sender", observed=True).agg(
+            messages=("i","count"),
+            words=("n_words","sum"),
+            media=("has_media","sum")
+        ).reset_index()
+        totals = {
+            "messages": int(by_sender_df["messages"].sum()) if len(by_sender_df)>0 else 0,
+            "words": int(by_sender_df["words"].sum()) if len(by_sender_df)>0 else 0
+        }
+        return {"by_sender": by_sender_df.to_dict(orient="records"), "totals": totals}
+
+    def _words_per_message(self) -> Dict[str, Any]:
+        d = self.d
+        if self.distributions == "sketch":
+            words = distributions_by(self.days, d["sender"], d["n_words"], WORDS_PER_MESSAGE_BINS)
+            out = distribution_payload(self.participants, words, ({}, {}))
+            return {k: out[k] for k in ("words_per_message", "words_per_message_timeline")}
+        # Words per message distribution per participant
+        per_sender = {
+            str(p): arr.astype(int).tolist()
+            for p, arr in d.groupby("sender", observed=True, sort=False)["n_words"]
+        }
+        words_per_message = {str(p): per_sender.get(str(p), []) for p in self.participants}
+        words_per_message_timeline = (
+            d[["sender", "n_words"]].assign(day=self.days)[["day", "sender", "n_words"]]
+            .rename(columns={"n_words": "words"})
             .to_dict(orient="records")
         )
-        for person, arr in rp.groupby("to")["sec"]:
-            arr = arr.clip(lower=0)
-            reply_times[str(person)] = arr.astype(float).tolist()
-            reply_simple.append({
-                "person": str(person),
-                "seconds": float(arr.mean()),
-                "n": int(arr.size),
-            })
-    # ensure all participants present
-    present = {r["person"] for r in reply_simple}
-    for p in participants:
-        if str(p) not in present:
-            reply_simple.append({"person": str(p), "seconds": 0.0, "n": 0})
-
-    # Interruptions
-    runs_df = interruptions(d)
-    interrupts = runs_df[runs_df["len"]>=2].groupby("sender")["len"].agg(["count","max"]).reset_index() if not runs_df.empty else pd.DataFrame()
-
-    # Questions and unanswered within 15 minutes
-    d["is_question"] = d["text"].fillna("").str.contains(QUESTION_PAT)
-    d["next_ts"] = d["ts"].shift(-1)
-    d["next_sender"] = d["sender"].shift(-1)
-    fifteen = pd.Timedelta(minutes=15)
-    d["answered_15m"] = (~d["is_question"]) | ((d["next_sender"] != d["sender"]) & ((d["next_ts"] - d["ts"]) <= fifteen))
-    questions_total = int(d["is_question"].sum())
-    unanswered_total = int((d["is_question"] & ~d["answered_15m"]).sum())
-
-    q_counts = d.groupby("sender")["is_question"].sum().astype(int) if len(d)>0 else pd.Series(dtype=int)
-    tmp = d[d["is_question"]].copy()
-    un_counts = tmp.groupby("sender").apply(lambda g: (~g["answered_15m"]).sum()).astype(int) if len(tmp)>0 else pd.Series(dtype=int)
-    q_split = [{"sender": p, "questions": int(q_counts.get(p,0)), "unanswered_15m": int(un_counts.get(p,0))} for p in participants]
-
-    # Profanity + we-ness + affection
-    if PROFANITY:
-        prof_pat = re.compile("|".join(re.escape(w) for w in PROFANITY), re.IGNORECASE)
-        d["is_profanity"] = d["text"].str.contains(prof_pat, na=False)
-    else:
-        d["is_profanity"] = False
-    prof_total = int(d["is_profanity"].sum())
+        return {
+            "words_per_message": words_per_message,
+            "words_per_message_timeline": words_per_message_timeline,
+        }
 
-    if AFFECTION_TOKENS:
-        aff_pat = re.compile("|".join(re.escape(tok) for tok in AFFECTION_TOKENS), re.IGNORECASE)
-        d["is_affection"] = d["text"].str.contains(aff_pat, na=False)
-    else:
-        d["is_affection"] = False
-    aff_counts = d.groupby("sender")["is_affection"].sum().astype(int) if len(d)>0 else pd.Series(dtype=int)
-    aff_split = [{"sender": p, "affection": int(aff_counts.get(p,0))} for p in participants]
-    aff_total = int(aff_counts.sum())
-
-    we_ratio = we_ness(d)
-
-    # Timeline strings
-    if len(d)>0:
-        day = d.copy()
-        day["day"] = day["ts"].dt.strftime("%Y-%m-%d")
-        day["we"] = day["text"].fillna("").apply(lambda t: count_tokens(t, PRONOUNS_WE))
-        day["i"] = day["text"].fillna("").apply(lambda t: count_tokens(t, PRONOUNS_I))
-        timeline_messages_df = day.groupby(["day","sender"]).size().reset_index(name="messages")
-        timeline_words_df = day.groupby(["day","sender"])["n_words"].sum().reset_index(name="words")
-        timeline_questions_df = day.groupby(["day","sender"])["is_question"].sum().reset_index(name="questions")
-        timeline_media_df = day.groupby(["day","sender"])["has_media"].sum().reset_index(name="media")
-        timeline_affection_df = day.groupby(["day","sender"])["is_affection"].sum().reset_index(name="affection")
-        timeline_profanity_df = day.groupby(["day","sender"])["is_profanity"].sum().reset_index(name="profanity")
-        timeline_we_df = day.groupby(["day","sender"])[["we","i"]].sum().reset_index()
-    else:
-        timeline_messages_df = pd.DataFrame(columns=["day","sender","messages"])
-        timeline_words_df = pd.DataFrame(columns=["day","sender","words"])
-        timeline_questions_df = pd.DataFrame(columns=["day","sender","questions"])
-        timeline_media_df = pd.DataFrame(columns=["day","sender","media"])
-        timeline_affection_df = pd.DataFrame(columns=["day","sender","affection"])
-        timeline_profanity_df = pd.DataFrame(columns=["day","sender","profanity"])
-        timeline_we_df = pd.DataFrame(columns=["day","sender","we","i"])
-
-    # Heatmap
-    heat_df = heatmap_hour_weekday(d) if len(d)>0 else pd.DataFrame(columns=["weekday","hour","sender","count"])
-
-    word_cloud = word_counts(d, participants) if len(d)>0 else {}
-
-    payload = {
-        "participants": participants,
-        "by_sender": by_sender_df.to_dict(orient="records"),
-        "totals": totals,
-        "reply_simple": reply_simple,
-        "words_per_message": words_per_message,
-        "words_per_message_timeline": words_per_message_timeline,
-        "reply_times": reply_times,
-        "reply_times_timeline": reply_times_timeline,
-        "interruptions": interrupts.to_dict(orient="records"),
-        "questions": {"total": questions_total, "unanswered_15m": unanswered_total},
-        "questions_split": q_split,
-        "media_total": int(d["has_media"].sum()) if len(d)>0 else 0,
-        "profanity_hits": prof_total,
-        "we_ness_ratio": we_ratio,
-        "affection_hits": aff_total,
-        "affection_split": aff_split,
-        "timeline_messages": timeline_messages_df.to_dict(orient="records"),
-        "timeline_words": timeline_words_df.to_dict(orient="records"),
-        "timeline_questions": timeline_questions_df.to_dict(orient="records"),
-        "timeline_media": timeline_media_df.to_dict(orient="records"),
-        "timeline_affection": timeline_affection_df.to_dict(orient="records"),
-        "timeline_profanity": timeline_profanity_df.to_dict(orient="records"),
-        "timeline_we_ness": timeline_we_df.to_dict(orient="records"),
-        "heatmap": heat_df.to_dict(orient="records"),
-        "word_cloud": word_cloud
-    }
-    # legacy mirrors for compatibility
-    payload["timeline"] = payload["timeline_messages"]
-    payload["reply_times_summary"] = [{"to": r["person"], "seconds": r["seconds"], "count": r["n"]} for r in reply_simple]
-    return payload
+    def _replies(self) -> Dict[str, Any]:
+        # Reply stats (first message in each run versus next sender)
+        rp = self.reply_pairs
+        stats = []
+        if not rp.empty:
+            for person, arr in rp.groupby("to", observed=True)["sec"]:
+                arr = arr.clip(lower=0)
+                stats.append((person, arr.mean(), arr.size))
+        return reply_summary(self.participants, stats)
+
+    def _reply_times(self) -> Dict[str, Any]:
+        rp = self.reply_pairs
+        if self.distributions == "sketch":
+            replies = (
+                distributions_by(rp["day"], rp["to"], rp["sec"].clip(lower=0), REPLY_TIME_BINS)
+                if not rp.empty else ({}, {})
+            )
+            out = distribution_payload(self.participants, ({}, {}), replies)
+            return {k: out[k] for k in ("reply_times", "reply_times_timeline")}
+        reply_times = {str(p): [] for p in self.participants}
+        reply_times_timeline = []
+        if not rp.empty:
+            reply_times_timeline = (
+                rp[["day", "to", "sec"]]
+                .rename(columns={"to": "sender", "sec": "seconds"})
+                .to_dict(orient="records")
+            )
+            for person, arr in rp.groupby("to", observed=True)["sec"]:
+                reply_times[str(person)] = arr.clip(lower=0).astype(float).tolist()
+        return {"reply_times": reply_times, "reply_times_timeline": reply_times_timeline}
+
+    def _reply_latency_rolling(self) -> Dict[str, Any]:
+        rp = self.reply_pairs
+        if rp.empty:
+            return {"reply_latency_rolling": []}
+        rolling = rolling_latency(
+            rp["to_ts"].to_numpy().astype("datetime64[D]"),
+            rp["to"].to_numpy(),
+            QuantileSketch().bucket_keys(rp["sec"].clip(lower=0)),
+            np.ones(len(rp), dtype=np.int64),
+        )
+        return {"reply_latency_rolling": rolling}
+
+    def _interruptions(self) -> Dict[str, Any]:
+        runs_df = interruptions(self.d, self.turns)
+        stats = {}
+        if not runs_df.empty:
+            long_runs = runs_df[runs_df["len"] >= INTERRUPTION_RUN]
+            agg = long_runs.groupby("sender", observed=True)["len"].agg(["count", "max"])
+            stats = {s: (c, m) for s, c, m in agg.itertuples()}
+        return {"interruptions": interruption_records(stats)}
+
+    def _reply_graph(self) -> Dict[str, Any]:
+        sketch = self.distributions == "sketch"
+        return {"reply_graph": reply_graph(self.reply_pairs, self.participants, sketch)}
+
+    def _questions(self) -> Dict[str, Any]:
+        # Questions and unanswered within 15 minutes
+        d = self.d
+        is_question = self.lexical["is_question"]
+        unanswered = self.unanswered
+        questions_total = int(is_question.sum())
+        unanswered_total = int(unanswered.sum())
+
+        q_counts = is_question.groupby(d["sender"], observed=True).sum().astype(int) if len(d)>0 else pd.Series(dtype=int)
+        un_counts = unanswered[is_question].groupby(d["sender"][is_question], observed=True).sum().astype(int)
+        return {
+            "questions": {"total": questions_total, "unanswered_15m": unanswered_total},
+            "questions_split": sender_split(
+                self.participants, questions=q_counts, unanswered_15m=un_counts
+            ),
+        }
+
+    def _media_total(self) -> Dict[str, Any]:
+        return {"media_total": int(self.d["has_media"].sum()) if len(self.d)>0 else 0}
+
+    def _profanity(self) -> Dict[str, Any]:
+        return {"profanity_hits": int(self.lexical["is_profanity"].sum())}
+
+    def _we_ness(self) -> Dict[str, Any]:
+        return {"we_ness_ratio": we_ness(self.lexical)}
+
+    def _affection(self) -> Dict[str, Any]:
+        d = self.d
+        aff_counts = self.lexical["is_affection"].groupby(d["sender"], observed=True).sum().astype(int) if len(d)>0 else pd.Series(dtype=int)
+        return {
+            "affection_hits": int(aff_counts.sum()),
+            "affection_split": sender_split(self.participants, affection=aff_counts),
+        }
+
+    def _day_groups(self, frame: pd.DataFrame):
+        """``frame`` (aligned with ``d``) grouped by day and sender, without copying it."""
+        return frame.groupby([self.days, self.d["sender"]], observed=True)
+
+    def _timeline_messages(self) -> Dict[str, Any]:
+        if len(self.d) == 0:
+            return {"timeline_messages": [], "timeline": []}
+        records = self._day_groups(self.d).size().reset_index(name="messages").to_dict(orient="records")
+        return {"timeline_messages": records, "timeline": records}
+
+    def _timeline_words(self) -> Dict[str, Any]:
+        if len(self.d) == 0:
+            return {"timeline_words": []}
+        words = self._day_groups(self.d)["n_words"].sum().reset_index(name="words")
+        return {"timeline_words": words.to_dict(orient="records")}
+
+    def _timeline_media(self) -> Dict[str, Any]:
+        if len(self.d) == 0:
+            return {"timeline_media": []}
+        media = self._day_groups(self.d)["has_media"].sum().reset_index(name="media")
+        return {"timeline_media": media.to_dict(orient="records")}
+
+    def _timeline_lexical(self) -> Dict[str, Any]:
+        keys = ["timeline_questions", "timeline_affection", "timeline_profanity", "timeline_we_ness"]
+        if len(self.d) == 0:
+            return dict.fromkeys(keys, [])
+        day = self._day_groups(self.lexical)
+        return {
+            "timeline_questions": day["is_question"].sum().reset_index(name="questions").to_dict(orient="records"),
+            "timeline_affection": day["is_affection"].sum().reset_index(name="affection").to_dict(orient="records"),
+            "timeline_profanity": day["is_profanity"].sum().reset_index(name="profanity").to_dict(orient="records"),
+            "timeline_we_ness": day[["we_count","i_count"]].sum().rename(columns={"we_count": "we", "i_count": "i"}).reset_index().to_dict(orient="records"),
+        }
+
+    def _heatmap(self) -> Dict[str, Any]:
+        if len(self.d) == 0:
+            return {"heatmap": []}
+        return {"heatmap": heatmap_hour_weekday(self.d).to_dict(orient="records")}
+
+    def _word_cloud(self) -> Dict[str, Any]:
+        wc_bounds: Dict[str, int] = {}
+        capacity = self.word_cloud_capacity
+        if capacity is not None and capacity < 50:
+            raise ValueError("capacity must be at least top_n")
+        word_cloud = word_cloud_entries(self.words, error_bounds=wc_bounds) if len(self.d) else {}
+        return {"word_cloud": word_cloud, "word_cloud_error_bound": wc_bounds}
+
+
+def compute(
+    df: pd.DataFrame,
+    word_cloud_capacity: Optional[int] = None,
+    distributions: str = "raw",
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Compute the dashboard KPI payload for a message DataFrame.
+
+    ``word_cloud_capacity`` switches the word cloud to the bounded-memory
+    approximate mode; the payload then also carries ``word_cloud_error_bound``
+    per sender. ``distributions="sketch"`` replaces the per-message
+    words-per-message and reply-time arrays with the bounded summaries of
+    :func:`distribution_payload`. With ``workers`` > 1 the sections run
+    concurrently in that many processes (see :mod:`parallel`).
+    """
+    if workers is not None and workers > 1:
+        from parallel import compute_parallel  # parallel imports this module
+
+        return compute_parallel(df, workers, word_cloud_capacity, distributions)
+    return KPIEngine(df, word_cloud_capacity, distributions).get()
@@ -1,16 +1,28 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import BackgroundTasks, FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 import asyncio
 import datetime as dt
-from parse import parse_export, group_by_day, iterate_14day_ranges
-from kpis import to_df, compute
+from parse import parse_file, parse_stream, open_zip_export, group_by_day, iterate_14day_ranges
+from kpis import ON_REQUEST, SECTIONS, KPIEngine, to_df
+from incremental import KPIState
+from cube import METRICS, DayCube
+from store import MessageStore
+from cache import KPICache, content_hash
+from tzbucket import rebucket
+from sessions import SessionIndex
+from search import SearchIndex
+from timeline import TimelineRollups
 from conflict import analyze_conflicts, stream_conflicts, periods_to_months
 from daily_themes import analyze_ranges, stream_daily_themes
+import hashlib
 import json
 import os
+import zipfile
+from pathlib import Path
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,6 +31,28 @@ API_VERSION = "0.2.9"
 app = FastAPI(title="WhatsApp Relationship Analytics API", version="0.2.9")
 
 MAX_CONCURRENCY = int(os.getenv("CONFLICT_MAX_CONCURRENCY", 0)) or (os.cpu_count() or 10)
+# When set, word clouds use bounded-memory sketches with this many counters
+# per sender and tag instead of exact counts.
+WORD_CLOUD_CAPACITY = int(os.getenv("WORD_CLOUD_CAPACITY", 0)) or None
+# "sketch" ships histograms and p50/p90/p99 per sender and per day instead of
+# one value per message for the words-per-message and reply-time sections.
+KPI_DISTRIBUTIONS = os.getenv("KPI_DISTRIBUTIONS", "raw")
+# Set to 1 for lower-memory frames: categorical senders and, with pyarrow
+# installed, Arrow-backed texts over the store's buffers.
+KPI_LEAN = bool(int(os.getenv("KPI_LEAN", 0)))
+# Parsed chats and KPI payloads are cached on disk by content hash.
+KPI_CACHE = KPICache(
+    Path(os.getenv("KPI_CACHE_DIR") or Path(__file__).with_name("kpi_cache")),
+    max_bytes=int(os.getenv("KPI_CACHE_MAX_MB", 512)) << 20,
+)
+# Idle gap (minutes) that ends a conversation session; the session index for
+# it is built at upload time, other gaps on first request.
+SESSION_GAP_MINUTES = int(os.getenv("SESSION_GAP_MINUTES", 60))
+# Processes used to parse large plain-text uploads (see parse.parse_file).
+# Above 1 such uploads are decoded whole in memory, several times the file
+# size, instead of streamed in bounded memory; only for servers with RAM to
+# spare.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", 1))
 
 # Dev CORS
 app.add_middleware(
@@ -29,14 +63,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Sections computed during /upload; the rest are computed when requested.
+UPLOAD_SECTIONS = [
+    "participants", "by_sender", "totals", "media_total",
+    "timeline_messages", "timeline_words", "heatmap",
+]
+
+# Payload keys sent by /upload_stream, one event per stage in this order:
+# cheap totals, then per-day series, then the reply, lexical and word-cloud
+# analyses.
+STREAM_STAGES = [
+    ["participants", "by_sender", "totals", "media_total"],
+    ["timeline_messages", "timeline", "timeline_words", "timeline_media", "heatmap"],
+    [
+        "reply_simple", "reply_times_summary", "reply_times", "reply_times_timeline",
+        "words_per_message", "words_per_message_timeline",
+        "interruptions", "reply_graph",
+    ],
+    [
+        "questions", "questions_split", "profanity_hits", "we_ness_ratio",
+        "affection_hits", "affection_split", "timeline_questions",
+        "timeline_affection", "timeline_profanity", "timeline_we_ness",
+    ],
+    ["word_cloud", "word_cloud_error_bound"],
+]
+
+# ``messages`` is the canonical columnar MessageStore; ``messages_df`` is a
+# DataFrame view over its columns. ``engine`` computes and memoizes payload
+# sections on demand. ``kpi_state`` (the mergeable aggregates behind the
+# full payload, so a longer export of the same chat only has to analyse the
+# appended messages) is folded after the upload response is sent; ``kpis``
+# and ``cube`` are built on first use.
+# ``tz_kpis`` caches the re-bucketed ``tzbucket.TZ_SECTIONS`` per timezone
+# name and ``sessions`` the ``SessionIndex`` per idle gap in minutes. ``search`` is
+# the chat's ``SearchIndex``, built on the first search. ``cube`` comes from
+# the folded state when there is one and from the engine otherwise;
+# ``timeline`` holds its week/month rollups behind ``/timeline``.
 STATE = {
     "messages_df": None,
     "messages": None,
+    "media_files": None,
+    "media": None,
+    "content_hash": None,
+    "engine": None,
     "kpis": None,
+    "kpi_state": None,
+    "cube": None,
+    "tz_kpis": {},
+    "sessions": {},
+    "search": None,
+    "timeline": None,
 }
 
 class KPIResponse(BaseModel):
     kpis: Dict[str, Any]
+    merge: Optional[Dict[str, int]] = None
 
 
 class ConflictMonth(BaseModel):
@@ -48,27 +129,396 @@ class ConflictMonth(BaseModel):
 class ConflictResponse(BaseModel):
     months: List[ConflictMonth]
 
+# Uploads being processed, keyed by (content hash, mode), so concurrent
+# uploads of the same bytes share one computation.
+_INFLIGHT: Dict[tuple, asyncio.Future] = {}
+
+
+# Changes whenever payload keys are added or removed, so payloads cached by
+# an older version are not served without their new sections.
+KPI_SCHEMA = hashlib.blake2b(
+    ",".join(sorted(set(SECTIONS) - ON_REQUEST)).encode(), digest_size=4
+).hexdigest()
+
+
+def _kpi_variant() -> str:
+    """Cache key part for the settings that change the KPI payload."""
+    return f"wc{WORD_CLOUD_CAPACITY or 0}-{KPI_DISTRIBUTIONS}-{KPI_SCHEMA}"
+
+
+def _chat_state(
+    store: MessageStore,
+    media: Dict[str, int],
+    key: Optional[str],
+    prev: Optional[MessageStore],
+    state: Optional[KPIState],
+) -> Dict[str, Any]:
+    """The ``STATE`` entries that make ``store`` the current chat.
+
+    Runs off the event loop and writes nothing; the caller commits the
+    entries in one ``STATE.update`` so no request sees the new engine next
+    to the old store. When ``state`` (the aggregates of ``prev``, the
+    current chat) exists and ``store`` only appends to ``prev``, the new
+    messages are folded in and the full payload is ready at once; a payload
+    cached for the same content hash is reused as is.
+    """
+    df = to_df(store, lean=KPI_LEAN)
+    sessions = SessionIndex(store, dt.timedelta(minutes=SESSION_GAP_MINUTES))
+    new = {
+        "messages_df": df, "messages": store, "media_files": media,
+        "media": store.attachments(media), "content_hash": key,
+        "engine": KPIEngine(df, WORD_CLOUD_CAPACITY, KPI_DISTRIBUTIONS),
+        "kpis": None, "kpi_state": None, "cube": None, "tz_kpis": {},
+        "sessions": {SESSION_GAP_MINUTES: sessions}, "search": None, "timeline": None,
+    }
+    if state is not None and isinstance(prev, MessageStore) and store.extends(prev):
+        state.extend(df.iloc[len(prev):])
+        new.update(kpi_state=state, kpis=state.payload())
+        if key is not None:
+            KPI_CACHE.save_kpis(key, _kpi_variant(), new["kpis"])
+    elif key is not None:
+        new["kpis"] = KPI_CACHE.load_kpis(key, _kpi_variant())
+    return new
+
+
+def _parse_upload(fileobj, is_zip: bool, key: str, tz: Optional[dt.tzinfo] = None):
+    """Parsed store and media index of an upload, from the cache if present.
+
+    ``tz`` is the timezone of the export's (naive) timestamps.
+    """
+    cached = KPI_CACHE.load(key)
+    if cached is not None:
+        return cached
+    if is_zip:
+        chat, media = open_zip_export(fileobj)
+        with chat:
+            store = MessageStore.from_messages(parse_stream(chat, tz))
+    else:
+        media = {}
+        store = MessageStore.from_messages(parse_file(fileobj, tz, workers=PARSE_WORKERS))
+    if not len(store):
+        raise ValueError("No messages parsed")
+    KPI_CACHE.save(key, store, media)
+    return store, media
+
+
+async def _ingest(
+    fileobj, is_zip: bool, key: str, mode: str, tz: Optional[dt.tzinfo] = None
+) -> Optional[Dict[str, int]]:
+    """Make the upload the current chat; returns the merge counts, if merging."""
+    if mode == "replace" and key == STATE["content_hash"]:
+        # the current chat again: keep its memoized sections
+        return None
+    store, media = await asyncio.to_thread(_parse_upload, fileobj, is_zip, key, tz)
+    merge = None
+    if mode == "merge" and isinstance(STATE["messages"], MessageStore):
+        store, n_new, n_dup = await asyncio.to_thread(STATE["messages"].merge, store)
+        media = {**(STATE["media_files"] or {}), **media}
+        merge = {"new": n_new, "duplicate": n_dup}
+        key = None
+    STATE.update(await asyncio.to_thread(
+        _chat_state, store, media, key, STATE["messages"], STATE["kpi_state"]
+    ))
+    return merge
+
+
+def _zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {name}")
+
+
+async def _receive(
+    file: UploadFile, mode: str, tz: Optional[str] = None
+) -> Optional[Dict[str, int]]:
+    """Validate and ingest an upload; concurrent uploads of the same bytes
+    (and ``tz``) share one ingest."""
+    name = (file.filename or "").lower()
+    if not name.endswith((".zip", ".txt")):
+        raise HTTPException(status_code=400, detail="Upload a .txt or .zip export")
+    zone = _zone(tz) if tz else None
+    key = await asyncio.to_thread(content_hash, file.file)
+    if zone is not None:
+        # the same bytes in another timezone parse to other instants
+        key += "-" + hashlib.blake2b(tz.encode(), digest_size=4).hexdigest()
+    task = _INFLIGHT.get((key, mode))
+    if task is None:
+        task = asyncio.ensure_future(_ingest(file.file, name.endswith(".zip"), key, mode, zone))
+        _INFLIGHT[(key, mode)] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop((key, mode), None))
+    try:
+        # shielded so one client disconnecting does not cancel the others
+        return await asyncio.shield(task)
+    except (zipfile.BadZipFile, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _sections(engine: KPIEngine, keys: List[str]) -> Dict[str, Any]:
+    """``keys`` of the payload, from the full payload when it is already known;
+    keys it lacks are computed by ``engine``."""
+    kpis = STATE["kpis"] if STATE["engine"] is engine else None
+    if kpis is None:
+        return engine.get(keys)
+    missing = engine.get([k for k in keys if k not in kpis])
+    return {k: kpis[k] if k in kpis else missing[k] for k in keys}
+
+
+def _kpi_state() -> KPIState:
+    if STATE["kpi_state"] is None:
+        STATE["kpi_state"] = KPIState.from_engine(STATE["engine"])
+    return STATE["kpi_state"]
+
+
+def _fold_after_upload(engine: KPIEngine) -> None:
+    """Background task of the uploads: fold the chat into a ``KPIState`` so
+    that a longer re-export of it only analyses the appended messages.
+
+    The state reuses the engine's intermediates (see
+    ``KPIState.from_engine``), which the engine keeps for later sections.
+    Skipped when the chat already has a state, and dropped if another upload
+    replaced the chat meanwhile.
+    """
+    if STATE["engine"] is not engine or STATE["kpi_state"] is not None:
+        return
+    state = KPIState.from_engine(engine)
+    if STATE["engine"] is engine and STATE["kpi_state"] is None:
+        STATE["kpi_state"] = state
+
+
+def _full_kpis() -> Dict[str, Any]:
+    if STATE["kpis"] is None:
+        STATE["kpis"] = _kpi_state().payload()
+        if STATE["content_hash"] is not None:
+            KPI_CACHE.save_kpis(STATE["content_hash"], _kpi_variant(), STATE["kpis"])
+    return STATE["kpis"]
+
+
+def _tz_kpis(name: str) -> Dict[str, Any]:
+    if name not in STATE["tz_kpis"]:
+        tz = _zone(name)
+        engine = STATE["engine"]
+        STATE["tz_kpis"][name] = rebucket(engine.d, engine.lexical, STATE["messages"].ts, tz)
+    return STATE["tz_kpis"][name]
+
+
+def _session_index(gap: Optional[int]) -> SessionIndex:
+    if STATE["messages"] is None:
+        raise HTTPException(status_code=404, detail="No upload yet")
+    gap = SESSION_GAP_MINUTES if gap is None else gap
+    if gap not in STATE["sessions"]:
+        STATE["sessions"][gap] = SessionIndex(STATE["messages"], dt.timedelta(minutes=gap))
+    return STATE["sessions"][gap]
+
+
+def _search_index() -> SearchIndex:
+    if STATE["search"] is None:
+        STATE["search"] = SearchIndex(STATE["messages"])
+    return STATE["search"]
+
+
+def _cube() -> DayCube:
+    if STATE["cube"] is None:
+        state = STATE["kpi_state"]
+        if state is not None:
+            STATE["cube"] = DayCube.from_state(state)
+        else:
+            STATE["cube"] = DayCube.from_engine(STATE["engine"])
+    return STATE["cube"]
+
+
+def _timeline() -> TimelineRollups:
+    if STATE["timeline"] is None:
+        STATE["timeline"] = TimelineRollups(_cube())
+    return STATE["timeline"]
+
+
 @app.post("/upload", response_model=KPIResponse)
-async def upload(file: UploadFile = File(...)):
-    if not file.filename.endswith(".txt"):
-        raise HTTPException(status_code=400, detail="Upload a .txt export")
-    content = await file.read()
-    text = content.decode("utf-8", errors="ignore")
-    msgs = parse_export(text)
-    if not msgs:
-        raise HTTPException(status_code=400, detail="No messages parsed")
-    df = to_df(msgs)
-    k = compute(df)
-    STATE["messages_df"] = df
-    STATE["messages"] = msgs
-    STATE["kpis"] = k
-    return {"kpis": k}
+async def upload(
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    mode: Literal["replace", "merge"] = Query("replace"),
+    tz: Optional[str] = Query(None),
+):
+    """Parse an export and compute the cheap KPI sections (``UPLOAD_SECTIONS``).
+
+    The remaining sections are computed on request through ``/kpis``. With
+    ``mode=merge`` the export is merged into the current chat instead of
+    replacing it; messages already present are dropped and the response
+    reports how many were new versus duplicate. ``tz`` (an IANA name) is the
+    timezone the export was written in; without it timestamps are taken as
+    UTC.
+
+    Uploads are keyed by a hash of their bytes: parsed messages and KPI
+    payloads come from the on-disk cache when the same export was seen
+    before, and concurrent uploads of the same export share one computation.
+    Once the response is sent the chat is folded into mergeable aggregates,
+    so a later upload of a longer export only analyses the new messages.
+    """
+    merge = await _receive(file, mode, tz)
+    kpis = await asyncio.to_thread(_sections, STATE["engine"], UPLOAD_SECTIONS)
+    background.add_task(_fold_after_upload, STATE["engine"])
+    return {"kpis": kpis, "merge": merge}
+
+
+@app.post("/upload_stream")
+async def upload_stream(
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    mode: Literal["replace", "merge"] = Query("replace"),
+    tz: Optional[str] = Query(None),
+):
+    """``/upload`` with the whole payload streamed as server-sent events.
+
+    Once the export is parsed, every stage of ``STREAM_STAGES`` sends one
+    event ``{"current", "total", "kpis"}`` holding that stage's sections as
+    soon as they are computed (the first event, ``current`` 0, carries the
+    ``merge`` counts); ``[DONE]`` ends the stream. Invalid uploads fail with
+    400 before streaming starts.
+    """
+    merge = await _receive(file, mode, tz)
+    engine = STATE["engine"]
+    total = len(STREAM_STAGES)
+    background.add_task(_fold_after_upload, engine)
+
+    async def event_gen():
+        yield f"data: {json.dumps({'current': 0, 'total': total, 'merge': merge})}\n\n"
+        for current, stage in enumerate(STREAM_STAGES, 1):
+            keys = [k for k in stage if k in engine.keys]
+            kpis = await asyncio.to_thread(_sections, engine, keys)
+            payload = {"current": current, "total": total, "kpis": kpis}
+            yield f"data: {json.dumps(payload)}\n\n"
+        if STATE["engine"] is engine and STATE["kpis"] is None:
+            # every section is memoized now; keep the assembled payload
+            STATE["kpis"] = engine.get()
+            if STATE["content_hash"] is not None:
+                KPI_CACHE.save_kpis(STATE["content_hash"], _kpi_variant(), STATE["kpis"])
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream")
+
+def _parse_day(value: Optional[str], name: str) -> Optional[dt.date]:
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM-DD")
+
 
 @app.get("/kpis", response_model=KPIResponse)
-def get_kpis():
-    if STATE["kpis"] is None:
+def get_kpis(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    sections: Optional[str] = None,
+    tz: Optional[str] = None,
+):
+    """Return the KPI payload.
+
+    ``sections`` is a comma-separated list of payload keys; each is computed
+    on first request and memoized for the current chat. Keys too large for
+    the default payload (``kpis.ON_REQUEST``, e.g. ``reply_latency_rolling``)
+    are only served this way. With ``start``
+    and/or ``end`` (inclusive ``YYYY-MM-DD`` days) only the additive sections
+    are returned, answered from the per-day cube for that date range.
+
+    Days and hours follow the export's local time. ``tz`` (an IANA name such
+    as ``Europe/Berlin``) re-buckets the day timelines and the heatmap
+    (``tzbucket.TZ_SECTIONS``) into that timezone; exports uploaded without
+    a ``tz`` are taken as UTC.
+    """
+    if STATE["engine"] is None:
+        raise HTTPException(status_code=404, detail="No upload yet")
+    if start or end:
+        if tz:
+            raise HTTPException(status_code=400, detail="tz cannot be combined with a date range")
+        return {"kpis": _cube().kpis(_parse_day(start, "start"), _parse_day(end, "end"))}
+    if sections:
+        keys = [k.strip() for k in sections.split(",") if k.strip()]
+        local = _tz_kpis(tz) if tz else {}
+        rest = [k for k in keys if k not in local]
+        if STATE["kpis"] is not None and all(k in STATE["kpis"] for k in rest):
+            out = {k: STATE["kpis"][k] for k in rest}
+        else:
+            try:
+                out = STATE["engine"].get(rest)
+            except KeyError as exc:
+                raise HTTPException(status_code=400, detail=f"Unknown sections: {exc.args[0]}")
+        return {"kpis": {k: local[k] if k in local else out[k] for k in keys}}
+    if tz:
+        return {"kpis": {**_full_kpis(), **_tz_kpis(tz)}}
+    return {"kpis": _full_kpis()}
+
+@app.get("/timeline")
+def get_timeline(
+    metric: str = "messages",
+    granularity: Literal["day", "week", "month"] = "day",
+    max_points: Optional[int] = Query(None, ge=3),
+):
+    """One cube metric per period and sender, for charts.
+
+    Day, week (starting Monday) and month totals are rolled up once from
+    the per-day cube; with ``max_points`` longer series are downsampled
+    (LTTB on the all-sender totals) to that many periods. Results are
+    memoized per query for the current chat.
+    """
+    if STATE["engine"] is None:
         raise HTTPException(status_code=404, detail="No upload yet")
-    return {"kpis": STATE["kpis"]}
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {metric}")
+    return _timeline().series(metric, granularity, max_points)
+
+
+@app.get("/sessions")
+def get_sessions(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    gap: Optional[int] = Query(None, ge=1),
+):
+    """Session-level KPIs: who starts conversations, session durations and
+    lengths, and sessions per day.
+
+    A session ends after ``gap`` idle minutes (default
+    ``SESSION_GAP_MINUTES``). With ``start`` and/or ``end`` (inclusive
+    ``YYYY-MM-DD``) only sessions starting on those local days count.
+    """
+    index = _session_index(gap)
+    return index.kpis(_parse_day(start, "start"), _parse_day(end, "end"))
+
+
+@app.get("/sessions/list")
+def list_sessions(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    gap: Optional[int] = Query(None, ge=1),
+):
+    """One page of sessions in time order with their initiator, participants
+    (messages per sender), message range and duration."""
+    index = _session_index(gap)
+    return {"total": len(index), "sessions": index.records(offset, limit)}
+
+
+@app.get("/search")
+def search_messages(
+    q: str = Query(..., min_length=1),
+    sender: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """Messages matching ``q``, in chat order, one page at a time.
+
+    Every clause of ``q`` must match: words, ``"quoted phrases"`` and
+    ``prefix*`` words, case-insensitively. ``sender`` and the inclusive
+    ``start``/``end`` days (``YYYY-MM-DD``) narrow the matches; ``total``
+    counts them all.
+    """
+    if STATE["messages"] is None:
+        raise HTTPException(status_code=404, detail="No upload yet")
+    first, last = _parse_day(start, "start"), _parse_day(end, "end")
+    return _search_index().search(q, sender, first, last, offset, limit)
+
 
 @app.get("/messages")
 def get_messages():
@@ -78,6 +528,14 @@ def get_messages():
     return {"messages": df.to_dict(orient="records")}
 
 
+@app.get("/media")
+def get_media():
+    """Attachment file names and sizes for messages with media."""
+    if STATE["messages"] is None:
+        raise HTTPException(status_code=404, detail="No upload yet")
+    return {"media": STATE["media"] or []}
+
+
 @app.get("/daily_themes")
 async def get_daily_themes():
     """Return daily conversation themes for the uploaded chat."""
@@ -195,14 +653,14 @@ def debug():
 
 @app.get("/kpis_raw")
 def kpis_raw():
-    if STATE["kpis"] is None:
+    if STATE["engine"] is None:
         return {}
-    return STATE["kpis"]
+    return _full_kpis()
 
 
 @app.get("/health")
 def health():
-    return {"ok": True, "version": API_VERSION, "has_kpis": STATE["kpis"] is not None}
+    return {"ok": True, "version": API_VERSION, "has_kpis": STATE["engine"] is not None}
 
 
 @app.get("/conflicts_stream")
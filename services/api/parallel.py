@@ -0,0 +1,177 @@
+"""Section-parallel KPI computation over shared-memory columns.
+
+The cleaned message columns are copied once into a single
+:class:`multiprocessing.shared_memory.SharedMemory` block; every worker
+attaches to it in its initializer and tasks rebuild the frame as zero-copy
+views, so nothing but section names and results crosses process boundaries.
+Sections that share an expensive intermediate run in the same task, and the
+word cloud is split per sender. Texts are decoded only by the tasks that read
+them: the lexical sections, and each sender's word cloud for its own rows.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from kpis import SECTIONS, KPIEngine, word_counts, word_counts_approx
+
+# Section groups run as one task each, heaviest first. Sections within a
+# group share an intermediate (lexical features, reply pairs) that is then
+# computed once.
+TASKS = [
+    ["_questions", "_affection", "_profanity", "_we_ness", "_timeline_lexical"],
+    ["_replies", "_reply_times", "_reply_graph"],
+    ["_words_per_message"],
+    [
+        "_participants", "_by_sender", "_interruptions", "_media_total",
+        "_timeline_messages", "_timeline_words", "_timeline_media", "_heatmap",
+    ],
+]
+
+# Sections that read message texts; the other tasks never decode them
+TEXT_SECTIONS = {"_questions", "_affection", "_profanity", "_we_ness", "_timeline_lexical"}
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _share(d: pd.DataFrame) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """Copy the columns of the cleaned frame ``d`` into one shared block.
+
+    Rows are also listed grouped by sender (``sender_order``, with the
+    group of sender code ``k`` at ``sender_ptr[k]:sender_ptr[k + 1]``), so
+    a per-sender task reads only its own rows.
+    """
+    codes, labels = pd.factorize(d["sender"])
+    encoded = [t.encode("utf-8") for t in d["text"].fillna("").tolist()]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    order = np.argsort(codes, kind="stable")
+    columns = {
+        "i": d["i"].to_numpy(np.int64),
+        "ts": d["ts"].to_numpy("datetime64[ns]").view(np.int64),
+        "sender": codes.astype(np.int32),
+        "text_offsets": offsets,
+        "text_buffer": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "has_media": d["has_media"].to_numpy(bool),
+        "n_words": d["n_words"].to_numpy(np.int32),
+        "n_chars": d["n_chars"].to_numpy(np.int32),
+        "sender_order": order.astype(np.int64),
+        "sender_ptr": np.searchsorted(codes[order], np.arange(len(labels) + 1)).astype(np.int64),
+    }
+    layout, size = [], 0
+    for name, arr in columns.items():
+        size = -(-size // 8) * 8  # keep every column 8-byte aligned
+        layout.append((name, arr.dtype.str, arr.shape, size))
+        size += arr.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (name, dtype, shape, offset), arr in zip(layout, columns.values()):
+        np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)[...] = arr
+    return shm, {"name": shm.name, "layout": layout, "senders": list(labels)}
+
+
+def _attach(spec: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray]]:
+    # workers share the parent's resource tracker, which unlinks the block
+    # once the parent does; attaching only re-registers the same name
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    cols = {
+        name: np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+        for name, dtype, shape, offset in spec["layout"]
+    }
+    return shm, cols
+
+
+def _texts(cols: Dict[str, np.ndarray], rows: np.ndarray) -> np.ndarray:
+    """Decode the texts of ``rows`` only, straight from the shared buffer."""
+    offsets = cols["text_offsets"]
+    texts = np.empty(len(rows), dtype=object)
+    with memoryview(cols["text_buffer"]) as buf:
+        for k, (a, b) in enumerate(zip(offsets[rows].tolist(), offsets[rows + 1].tolist())):
+            texts[k] = str(buf[a:b], "utf-8")
+    return texts
+
+
+def _frame(cols: Dict[str, np.ndarray], senders: List[str], texts: bool) -> pd.DataFrame:
+    """The cleaned frame as views over the shared columns; without ``texts``
+    the text column is left empty."""
+    n = len(cols["i"])
+    labels = np.array(senders + [None], dtype=object)
+    return pd.DataFrame(
+        {
+            "i": cols["i"],
+            "ts": cols["ts"].view("datetime64[ns]"),
+            "sender": labels[cols["sender"]],
+            "text": _texts(cols, np.arange(n)) if texts else np.full(n, "", dtype=object),
+            "has_media": cols["has_media"],
+            "is_system": np.zeros(n, dtype=bool),
+            "n_words": cols["n_words"],
+            "n_chars": cols["n_chars"],
+        },
+        copy=False,
+    )
+
+
+def _init_worker(spec: Dict[str, Any], options: Dict[str, Any]) -> None:
+    shm, cols = _attach(spec)
+    _WORKER.update(shm=shm, cols=cols, senders=spec["senders"], options=options)
+
+
+def _run_sections(group: List[str]) -> Dict[str, Any]:
+    texts = any(section in TEXT_SECTIONS for section in group)
+    engine = KPIEngine(_frame(_WORKER["cols"], _WORKER["senders"], texts), **_WORKER["options"])
+    return engine.get([k for k in engine.keys if SECTIONS[k] in group])
+
+
+def _run_word_cloud(code: int) -> Tuple[Optional[list], int]:
+    cols, sender = _WORKER["cols"], _WORKER["senders"][code]
+    rows = cols["sender_order"][cols["sender_ptr"][code]:cols["sender_ptr"][code + 1]]
+    sub = pd.DataFrame({
+        "sender": np.full(len(rows), sender, dtype=object),
+        "text": _texts(cols, rows),
+        "has_media": cols["has_media"][rows],
+    })
+    capacity = _WORKER["options"]["word_cloud_capacity"]
+    bounds: Dict[str, int] = {}
+    if capacity is None:
+        cloud = word_counts(sub, [sender])
+    else:
+        cloud = word_counts_approx(sub, [sender], capacity=capacity, error_bounds=bounds)
+    return cloud.get(str(sender)), bounds.get(str(sender), 0)
+
+
+def compute_parallel(
+    df: pd.DataFrame,
+    workers: int,
+    word_cloud_capacity: Optional[int] = None,
+    distributions: str = "raw",
+) -> Dict[str, Any]:
+    """:func:`kpis.compute` with its sections spread over ``workers`` processes."""
+    options = {"word_cloud_capacity": word_cloud_capacity, "distributions": distributions}
+    engine = KPIEngine(df, **options)
+    d = engine.d
+    shm, spec = _share(d)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(spec, options)
+        ) as pool:
+            clouds = {
+                p: pool.submit(_run_word_cloud, k) for k, p in enumerate(spec["senders"])
+            }
+            sections = [pool.submit(_run_sections, group) for group in TASKS]
+            results: Dict[str, Any] = {}
+            for fut in sections:
+                results.update(fut.result())
+            word_cloud, bounds = {}, {}
+            for p in sorted(clouds, key=str):
+                entries, bound = clouds[p].result()
+                if entries is not None:
+                    word_cloud[str(p)] = entries
+                    bounds[str(p)] = bound
+    finally:
+        shm.close()
+        shm.unlink()
+    results["word_cloud"] = word_cloud
+    results["word_cloud_error_bound"] = bounds
+    return {k: results[k] for k in engine.keys}
@@ -1,8 +1,10 @@
-import re, unicodedata
+import codecs, itertools, os, re, unicodedata, zipfile
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import Dict, Iterator, List, Optional, Tuple
-from dateutil import parser as dtparser
+from dataclasses import dataclass, field
+from typing import (
+    BinaryIO, Dict, Iterable, Iterator, List, Match, Optional, Pattern, Tuple,
+)
 import datetime as dt
 
 CONTROL_REMOVE = dict.fromkeys(
@@ -23,11 +25,162 @@ class Message:
     is_system: bool = False
 
 
+# A timestamp line is either ``<date>, <time> - <tail>`` (Android) or
+# ``[<date>, <time>] <tail>`` (iOS). Dates use ``/``, ``.`` or ``-`` separators
+# in Y-M-D, D-M-Y or M-D-Y order; times are 24h or 12h with any of the
+# ``a.m.``/``am``/``AM`` spellings.
+_DATE = r"(\d{1,4}[./-]\d{1,2}[./-]\d{1,4})"
+_TIME = r"(\d{1,2}[:.]\d{2}(?:[:.]\d{2})?)"
+_AMPM = r"(?:\s*([ap])\.?\s?m\.?)?"
+
 TS_RE = re.compile(
-    r"^\s*(\d{4}-\d{2}-\d{2}),\s*(\d{1,2}:\d{2})\s*([ap]\.m\.)\s*-\s*(.*)$",
+    r"^\s*" + _DATE + r",?\s*" + _TIME + _AMPM + r"\s*-\s*(.*)$",
+    re.IGNORECASE,
+)
+BRACKET_TS_RE = re.compile(
+    r"^\s*\[" + _DATE + r",?\s*" + _TIME + _AMPM + r"\]\s*(.*)$",
     re.IGNORECASE,
 )
 
+# Exports "with media" reference attachments inline instead of
+# "<Media omitted>": iOS writes "<attached: NAME>" and Android
+# "NAME (file attached)".
+ATTACHMENT_RE = re.compile(
+    r"<attached:\s*([^>]+?)\s*>|^(\S+\.\w{2,5}) \(file attached\)", re.MULTILINE
+)
+
+# Number of leading lines inspected to pick a timestamp layout.
+SNIFF_LINES = 500
+
+
+@dataclass
+class TimestampFormat:
+    """A detected export layout with a memoized timestamp decoder.
+
+    ``order`` is one of ``"ymd"``, ``"dmy"`` or ``"mdy"``. ``settled`` is
+    false while ``order`` is only a guess between D-M-Y and M-D-Y; see
+    :meth:`settle`. Date and time strings repeat heavily within a chat, so
+    each distinct string is decoded once and cached.
+    """
+
+    pattern: Pattern[str]
+    order: str
+    settled: bool = True
+    _dates: Dict[str, Optional[Tuple[int, int, int]]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    _times: Dict[Tuple[str, str], Optional[Tuple[int, int, int]]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    def match(self, line: str) -> Optional[Match[str]]:
+        return self.pattern.match(line)
+
+    def settle(self, date_str: str) -> bool:
+        """Fix a guessed day/month order from ``date_str`` if it tells.
+
+        A leading field above 12 means D-M-Y and a middle one M-D-Y. Returns
+        whether the order is settled.
+        """
+
+        if not self.settled:
+            a, b = (int(p) for p in re.split(r"[./-]", date_str)[:2])
+            if a > 12 or b > 12:
+                order = "dmy" if a > 12 else "mdy"
+                if order != self.order:
+                    self.order = order
+                    self._dates.clear()
+                self.settled = True
+        return self.settled
+
+    def _date(self, date_str: str) -> Optional[Tuple[int, int, int]]:
+        a, b, c = (int(p) for p in re.split(r"[./-]", date_str))
+        if self.order == "ymd":
+            y, m, d = a, b, c
+        elif self.order == "dmy":
+            d, m, y = a, b, c
+        else:
+            m, d, y = a, b, c
+        if y < 100:
+            y += 2000
+        if not (1 <= m <= 12 and 1 <= d <= 31):
+            return None
+        return y, m, d
+
+    def _time(self, time_str: str, ampm: str) -> Optional[Tuple[int, int, int]]:
+        parts = [int(p) for p in re.split(r"[:.]", time_str)]
+        h, mi = parts[0], parts[1]
+        s = parts[2] if len(parts) > 2 else 0
+        if ampm:
+            if not 1 <= h <= 12:
+                return None
+            h = h % 12 + (12 if ampm == "p" else 0)
+        if h > 23 or mi > 59 or s > 59:
+            return None
+        return h, mi, s
+
+    def decode(self, date_str: str, time_str: str, ampm: Optional[str]) -> Optional[dt.datetime]:
+        """Return the naive timestamp for matched groups or ``None`` if invalid."""
+
+        ymd = self._dates.get(date_str)
+        if ymd is None and date_str not in self._dates:
+            ymd = self._dates[date_str] = self._date(date_str)
+        key = (time_str, (ampm or "").lower())
+        hms = self._times.get(key)
+        if hms is None and key not in self._times:
+            hms = self._times[key] = self._time(*key)
+        if ymd is None or hms is None:
+            return None
+        try:
+            return dt.datetime(*ymd, *hms)
+        except ValueError:
+            return None
+
+
+def detect_format(lines: Iterable[str]) -> TimestampFormat:
+    """Pick the timestamp layout used by an export from a sample of lines.
+
+    The bracketed iOS layout wins if it matches more lines than the Android
+    one. Date order is inferred from the sampled values: a four digit leading
+    field means Y-M-D, a leading field above 12 means D-M-Y and a middle field
+    above 12 means M-D-Y. Ambiguous samples fall back to M-D-Y for 12h clocks
+    with ``/`` separators (US phones) and D-M-Y otherwise, and the returned
+    format is left unsettled.
+    """
+
+    hits: Dict[str, List[Match[str]]] = {"dash": [], "bracket": []}
+    for line in lines:
+        m = TS_RE.match(line)
+        if m:
+            hits["dash"].append(m)
+            continue
+        m = BRACKET_TS_RE.match(line)
+        if m:
+            hits["bracket"].append(m)
+    shape = "bracket" if len(hits["bracket"]) > len(hits["dash"]) else "dash"
+    matches = hits[shape]
+    pattern = BRACKET_TS_RE if shape == "bracket" else TS_RE
+
+    order, settled = None, True
+    for m in matches:
+        parts = re.split(r"[./-]", m.group(1))
+        if len(parts[0]) == 4:
+            order = "ymd"
+            break
+        if int(parts[0]) > 12:
+            order = "dmy"
+            break
+        if int(parts[1]) > 12:
+            order = "mdy"
+            break
+    if order is None:
+        us_style = any(m.group(3) for m in matches) and any(
+            "/" in m.group(1) for m in matches
+        )
+        order = "mdy" if us_style else "dmy"
+        settled = False
+    return TimestampFormat(pattern=pattern, order=order, settled=settled)
+
 
 def normalize_line(s: str) -> str:
     if not isinstance(s, str):
@@ -39,75 +192,347 @@ def normalize_line(s: str) -> str:
     return s
 
 
-def parse_export(text: str, default_tz: dt.tzinfo = None) -> List[Message]:
-    text = normalize_line(text)
-    lines = text.splitlines()
+# Uploads are consumed in fixed-size chunks so peak memory while parsing is
+# bounded by the largest single message instead of the whole export.
+CHUNK_SIZE = 1 << 20
 
-    chunks, buf = [], []
 
-    def flush():
-        if buf:
-            chunks.append("\n".join(buf).strip("\n"))
-            buf.clear()
+def iter_lines(
+    chunks: Iterable[bytes], encoding: str = "utf-8"
+) -> Iterator[str]:
+    """Decode byte chunks and yield normalized lines without line endings.
 
-    for line in lines:
-        if TS_RE.match(line):
-            flush()
-            buf.append(line)
-        else:
-            if not buf:
-                continue
-            buf.append(line)
-    flush()
+    Chunks may split multi-byte characters or ``\\r\\n`` pairs; both are
+    carried over to the next chunk.
+    """
 
-    msgs: List[Message] = []
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    pending = ""
     for chunk in chunks:
-        first_line, *rest = chunk.split("\n")
-        m = TS_RE.match(first_line)
-        if not m:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        if not lines:
             continue
-        date_str, time_str, ampm, tail = m.groups()
-        ts = dtparser.parse(
-            f"{date_str} {time_str} {ampm.lower()}", dayfirst=False, yearfirst=True
-        )
-        if default_tz is not None and ts.tzinfo is None:
-            ts = ts.replace(tzinfo=default_tz)
-
-        sender, text, is_system, has_media = None, "", False, False
-        if ":" in tail:
-            sender, text = tail.split(":", 1)
-            sender = sender.strip()
-            text = text.strip()
+        # The last piece is incomplete unless it ends in a line break; a bare
+        # "\r" may still be followed by "\n" in the next chunk.
+        last = lines[-1]
+        if last.splitlines()[0] == last or last.endswith("\r"):
+            pending = lines.pop()
         else:
-            is_system = True
-            text = tail.strip()
-
-        if rest:
-            text = (text + "\n" + "\n".join(rest)).strip()
-
-        if "<Media omitted" in text:
-            has_media = True
-
-        msgs.append(
-            Message(
-                ts=ts,
-                sender=sender,
-                text=text,
-                has_media=has_media,
-                is_system=is_system,
-            )
-        )
+            pending = ""
+        for line in lines:
+            yield normalize_line(line.splitlines()[0])
+    pending += decoder.decode(b"", final=True)
+    for line in pending.splitlines():
+        yield normalize_line(line)
+
+
+def iter_chunks(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Read ``fileobj`` in ``chunk_size`` byte blocks until EOF."""
+
+    return iter(lambda: fileobj.read(chunk_size), b"")
+
+
+def open_zip_export(fileobj: BinaryIO) -> Tuple[BinaryIO, Dict[str, int]]:
+    """Open the chat text inside a WhatsApp ``.zip`` export.
+
+    Only the archive's central directory and the chat member are read; media
+    members are never decompressed. ``fileobj`` must be seekable.
+
+    Returns
+    -------
+    Tuple[BinaryIO, Dict[str, int]]
+        A streaming, decompressing reader over the chat text and a mapping
+        of every other member's base name to its uncompressed size.
+
+    Raises
+    ------
+    ValueError
+        If the archive contains no ``.txt`` member.
+    """
+
+    zf = zipfile.ZipFile(fileobj)
+    members = [i for i in zf.infolist() if not i.is_dir()]
+    texts = [i for i in members if i.filename.lower().endswith(".txt")]
+    if not texts:
+        raise ValueError("No chat .txt file in archive")
+    # iOS names the chat "_chat.txt"; Android uses "WhatsApp Chat with X.txt"
+    chat = next(
+        (i for i in texts if os.path.basename(i.filename) == "_chat.txt"),
+        max(texts, key=lambda i: i.file_size),
+    )
+    media = {
+        os.path.basename(i.filename): i.file_size for i in members if i is not chat
+    }
+    return zf.open(chat), media
+
+
+def _build_message(
+    lines: List[str], fmt: TimestampFormat, default_tz: Optional[dt.tzinfo]
+) -> Optional[Message]:
+    m = fmt.match(lines[0])
+    if not m:
+        return None
+    date_str, time_str, ampm, tail = m.groups()
+    ts = fmt.decode(date_str, time_str, ampm)
+    if ts is None:
+        return None
+    if default_tz is not None:
+        ts = ts.replace(tzinfo=default_tz)
+
+    sender, text, is_system, has_media = None, "", False, False
+    if ":" in tail:
+        sender, text = tail.split(":", 1)
+        sender = sender.strip()
+        text = text.strip()
+    else:
+        is_system = True
+        text = tail.strip()
+
+    if len(lines) > 1:
+        text = (text + "\n" + "\n".join(lines[1:])).strip()
+
+    if "<Media omitted" in text or ATTACHMENT_RE.search(text):
+        has_media = True
+
+    return Message(
+        ts=ts,
+        sender=sender,
+        text=text,
+        has_media=has_media,
+        is_system=is_system,
+    )
+
+
+def iter_messages(
+    lines: Iterable[str],
+    default_tz: Optional[dt.tzinfo] = None,
+    fmt: Optional[TimestampFormat] = None,
+) -> Iterator[Message]:
+    """Yield messages from normalized export lines as soon as they complete.
+
+    A message starts at a timestamp line and extends over any following
+    continuation lines; lines before the first timestamp are ignored. When
+    ``fmt`` is not given the layout is detected from the first
+    ``SNIFF_LINES`` lines.
+
+    While the day/month order is unsettled, messages are held back until a
+    date with a field above 12 settles it (or the input ends), so no message
+    is decoded with the wrong order.
+    """
+
+    lines = iter(lines)
+    if fmt is None:
+        head = list(itertools.islice(lines, SNIFF_LINES))
+        fmt = detect_format(head)
+        lines = itertools.chain(head, lines)
+
+    match = fmt.match
+    held: List[List[str]] = []
+
+    def complete(group: List[str]) -> Iterator[Message]:
+        if not fmt.settled:
+            held.append(group)
+            if not fmt.settle(match(group[0]).group(1)):
+                return
+            groups = held[:]
+            held.clear()
+        else:
+            groups = [group]
+        for g in groups:
+            msg = _build_message(g, fmt, default_tz)
+            if msg is not None:
+                yield msg
+
+    buf: List[str] = []
+    for line in lines:
+        if match(line):
+            if buf:
+                yield from complete(buf)
+            buf = [line]
+        elif buf:
+            buf.append(line)
+    if buf:
+        yield from complete(buf)
+    # never settled: keep the guessed order
+    for g in held:
+        msg = _build_message(g, fmt, default_tz)
+        if msg is not None:
+            yield msg
+
+
+def parse_stream(
+    fileobj: BinaryIO,
+    default_tz: Optional[dt.tzinfo] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Message]:
+    """Incrementally parse a binary export file object.
+
+    Parameters
+    ----------
+    fileobj: BinaryIO
+        Readable binary stream, e.g. ``UploadFile.file``.
+    default_tz: datetime.tzinfo, optional
+        Timezone attached to the naive parsed timestamps.
+    chunk_size: int
+        Number of bytes read from ``fileobj`` at a time.
+
+    Yields
+    ------
+    Message
+        Parsed messages in export order.
+    """
+
+    return iter_messages(iter_lines(iter_chunks(fileobj, chunk_size)), default_tz)
+
+
+def parse_export(text: str, default_tz: dt.tzinfo = None) -> List[Message]:
+    text = normalize_line(text)
+    return list(iter_messages(text.splitlines(), default_tz))
+
+
+# Inputs smaller than this are parsed serially; process start-up and
+# pickling costs outweigh the speedup on typical chats.
+PARALLEL_MIN_CHARS = 8 << 20
+
+
+def _shard_boundaries(text: str, fmt: TimestampFormat, n_shards: int) -> List[int]:
+    """Return offsets splitting ``text`` into shards at timestamp lines.
+
+    Each boundary is the start of a line (after ``"\\n"``) whose normalized
+    content matches ``fmt``, so every multi-line message stays inside a
+    single shard.
+    """
+
+    bounds = [0]
+    size = len(text)
+    for k in range(1, n_shards):
+        pos = max(size * k // n_shards, bounds[-1])
+        while True:
+            nl = text.find("\n", pos)
+            if nl < 0:
+                pos = size
+                break
+            pos = nl + 1
+            end = text.find("\n", pos)
+            line = text[pos : size if end < 0 else end]
+            if fmt.match(normalize_line(line.splitlines()[0] if line else line)):
+                break
+        if pos >= size:
+            break
+        if pos > bounds[-1]:
+            bounds.append(pos)
+    bounds.append(size)
+    return bounds
+
+
+# Raw (not yet normalized) lines that may be timestamp lines: a date near
+# the start
+_LINE_DATE_RE = re.compile(r"^[^\d\n]{0,4}" + _DATE, re.MULTILINE)
+
+
+def _settle_order(text: str, fmt: TimestampFormat) -> None:
+    """Settle ``fmt``'s day/month order from the first timestamp line of
+    ``text`` that tells, as :func:`iter_messages` would.
+
+    Message bodies that merely start with a date are not timestamp lines and
+    do not count.
+    """
+
+    size = len(text)
+    for cand in _LINE_DATE_RE.finditer(text):
+        start = cand.start()
+        end = text.find("\n", start)
+        line = text[start : size if end < 0 else end]
+        m = fmt.match(normalize_line(line.splitlines()[0] if line else line))
+        if m and fmt.settle(m.group(1)):
+            return
+
+
+def _head_lines(text: str, n: int) -> List[str]:
+    """Return the first ``n`` normalized lines without splitting all of ``text``."""
+
+    end = 1 << 16
+    while True:
+        lines = normalize_line(text[:end]).splitlines()
+        if len(lines) > n or end >= len(text):
+            return lines[:n]
+        end *= 2
+
+
+def _parse_shard(
+    shard: str, fmt: TimestampFormat, default_tz: Optional[dt.tzinfo]
+) -> List[Message]:
+    return list(iter_messages(normalize_line(shard).splitlines(), default_tz, fmt))
+
+
+def parse_export_parallel(
+    text: str,
+    default_tz: Optional[dt.tzinfo] = None,
+    workers: Optional[int] = None,
+) -> List[Message]:
+    """Parse a large export across worker processes.
+
+    The text is split into one shard per worker at timestamp-line boundaries,
+    shards are parsed in a ``ProcessPoolExecutor`` and the results are
+    concatenated in order. The output is identical to :func:`parse_export`,
+    which is used directly for inputs under ``PARALLEL_MIN_CHARS`` or when
+    only one worker is available.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(text) < PARALLEL_MIN_CHARS:
+        return parse_export(text, default_tz)
+
+    fmt = detect_format(_head_lines(text, SNIFF_LINES))
+    if not fmt.settled:
+        # settle the day/month order once so that every shard agrees
+        _settle_order(text, fmt)
+    bounds = _shard_boundaries(text, fmt, workers)
+    shards = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+    if len(shards) <= 1:
+        return parse_export(text, default_tz)
+
+    msgs: List[Message] = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+        for part in pool.map(
+            _parse_shard, shards, [fmt] * len(shards), [default_tz] * len(shards)
+        ):
+            msgs.extend(part)
     return msgs
 
 
+def parse_file(
+    fileobj: BinaryIO,
+    default_tz: Optional[dt.tzinfo] = None,
+    workers: int = 1,
+) -> Iterable[Message]:
+    """Parse a seekable binary export, in parallel when asked and large.
+
+    With ``workers`` above 1, exports of at least ``PARALLEL_MIN_CHARS``
+    bytes are read whole and handed to :func:`parse_export_parallel`. That
+    trades the bounded memory of :func:`parse_stream`, which parses every
+    other export, for the decoded text plus a copy in the shards.
+    """
+
+    start = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell() - start
+    fileobj.seek(start)
+    if workers <= 1 or size < PARALLEL_MIN_CHARS:
+        return parse_stream(fileobj, default_tz)
+    text = fileobj.read().decode("utf-8", errors="ignore")
+    return parse_export_parallel(text, default_tz, workers)
+
+
 def group_by_day(
-    messages: List[Message], tz: dt.tzinfo
+    messages: Iterable[Message], tz: dt.tzinfo
 ) -> Dict[dt.date, List[Message]]:
     """Group messages by day in the given timezone.
 
     Parameters
     ----------
-    messages: List[Message]
+    messages: Iterable[Message]
         Messages to group.
     tz: datetime.tzinfo
         Timezone used to interpret the message timestamps.
@@ -119,6 +544,12 @@ def group_by_day(
     """
 
     days: Dict[dt.date, List[Message]] = defaultdict(list)
+    if hasattr(messages, "local_days"):
+        # a MessageStore converts all its timestamps in one vectorised pass
+        epoch = dt.date(1970, 1, 1)
+        for i, ordinal in enumerate(messages.local_days(tz).tolist()):
+            days[epoch + dt.timedelta(days=ordinal)].append(messages[i])
+        return dict(days)
     for msg in messages:
         ts = msg.ts
         if tz is not None:
@@ -0,0 +1,212 @@
+"""Full-text message search over an inverted index.
+
+Every non-system message is split into lower-cased ``\\w+`` tokens. For each
+token of the (sorted) vocabulary the index keeps a posting list of the
+messages it occurs in and the token positions within them, both
+variable-byte encoded (message indices as deltas), in two flat buffers.
+Terms decode one posting list, prefix queries one contiguous run of them
+and phrases intersect position-shifted postings, so a query touches only
+the postings of its own tokens.
+"""
+
+import bisect
+import datetime as dt
+import re
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from store import MessageStore
+
+_TOKEN_RE = re.compile(r"\w+")
+# a quoted phrase or a bare word
+_QUERY_RE = re.compile(r'"([^"]*)"?|(\S+)')
+# messages tokenised per batch, bounding the number of live token strings
+_BATCH = 65536
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def parse_query(q: str) -> List[Tuple[str, List[str]]]:
+    """Clauses of ``q``, all of which must match: ``("term", [token])``,
+    ``("prefix", [token])`` for a bare word ending in ``*`` and
+    ``("phrase", tokens)`` for quoted text or a word that splits into
+    several tokens."""
+    clauses = []
+    for quoted, word in _QUERY_RE.findall(q):
+        prefix = not quoted and word.endswith("*")
+        tokens = tokenize(quoted or word)
+        if not tokens:
+            continue
+        if len(tokens) > 1:
+            clauses.append(("phrase", tokens))
+        else:
+            clauses.append(("prefix" if prefix else "term", tokens))
+    return clauses
+
+
+def _vbyte_encode(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Variable-byte code of non-negative ``values``, 7 bits per byte with the
+    high bit set on all but the last byte; returns the bytes and the number
+    of bytes of each value."""
+    v = values.astype(np.uint64)
+    nbytes = np.ones(len(v), dtype=np.int64)
+    for shift in (7, 14, 21, 28, 35):
+        nbytes += v >= (1 << shift)
+    owner = np.repeat(np.arange(len(v)), nbytes)
+    k = np.arange(len(owner)) - np.repeat(np.cumsum(nbytes) - nbytes, nbytes)
+    out = ((v[owner] >> (7 * k).astype(np.uint64)) & 0x7F).astype(np.uint8)
+    out[k < nbytes[owner] - 1] |= 0x80
+    return out, nbytes
+
+
+def _vbyte_decode(buf: np.ndarray) -> np.ndarray:
+    if len(buf) == 0:
+        return np.zeros(0, dtype=np.int64)
+    last = buf < 0x80
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    k = np.arange(len(buf)) - np.repeat(starts, np.diff(np.append(starts, len(buf))))
+    return np.add.reduceat((buf & 0x7F).astype(np.int64) << (7 * k), starts)
+
+
+class SearchIndex:
+    """Inverted index over the non-system messages of a store.
+
+    ``words`` is the sorted vocabulary; the postings of ``words[t]`` are
+    entries ``ptr[t]:ptr[t + 1]``, stored in ``doc_bytes[doc_ptr[t]:doc_ptr[t + 1]]``
+    (store row indices, delta-coded) and ``pos_bytes[pos_ptr[t]:pos_ptr[t + 1]]``
+    (token positions), ordered by row and position.
+    """
+
+    def __init__(self, store: MessageStore):
+        self._store = store
+        rows = np.flatnonzero(store.sender_codes >= 0)
+        texts = store.texts()
+        ids: Dict[str, int] = {}
+        codes, counts = [], []
+        for a in range(0, len(rows), _BATCH):
+            tokens = [tokenize(t) for t in texts[rows[a:a + _BATCH]].tolist()]
+            counts.append(np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens)))
+            codes.append(np.fromiter(
+                (ids.setdefault(w, len(ids)) for w in chain.from_iterable(tokens)), dtype=np.int64
+            ))
+        counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+
+        self.words = sorted(ids)
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[[ids[w] for w in self.words]] = np.arange(len(ids))
+        codes = rank[codes]
+        docs = np.repeat(rows, counts)
+        pos = np.arange(len(codes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        # stable: each posting list stays in row, then position order
+        order = np.argsort(codes, kind="stable")
+        codes, docs, pos = codes[order], docs[order], pos[order]
+
+        self.ptr = np.searchsorted(codes, np.arange(len(self.words) + 1))
+        deltas = np.diff(docs, prepend=0)
+        heads = self.ptr[:-1][self.ptr[:-1] < len(docs)]
+        deltas[heads] = docs[heads]
+        self.doc_bytes, nbytes = _vbyte_encode(deltas)
+        self.doc_ptr = np.concatenate(([0], np.cumsum(nbytes)))[self.ptr]
+        self.pos_bytes, nbytes = _vbyte_encode(pos)
+        self.pos_ptr = np.concatenate(([0], np.cumsum(nbytes)))[self.ptr]
+        self.max_pos = int(pos.max()) if len(pos) else 0
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def _postings(self, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and positions of the postings of ``words[lo:hi]``."""
+        deltas = _vbyte_decode(self.doc_bytes[self.doc_ptr[lo]:self.doc_ptr[hi]])
+        pos = _vbyte_decode(self.pos_bytes[self.pos_ptr[lo]:self.pos_ptr[hi]])
+        docs = np.cumsum(deltas)
+        # delta coding restarts with every posting list
+        sizes = np.diff(self.ptr[lo:hi + 1])
+        heads = (self.ptr[lo:hi] - self.ptr[lo])[sizes > 0]
+        docs -= np.repeat(docs[heads] - deltas[heads], sizes[sizes > 0])
+        return docs, pos
+
+    def _code(self, token: str) -> Optional[int]:
+        k = bisect.bisect_left(self.words, token)
+        return k if k < len(self.words) and self.words[k] == token else None
+
+    def _term(self, token: str) -> np.ndarray:
+        k = self._code(token)
+        if k is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(self._postings(k, k + 1)[0])
+
+    def _prefix(self, prefix: str) -> np.ndarray:
+        lo = bisect.bisect_left(self.words, prefix)
+        hi = bisect.bisect_left(self.words, prefix + "\U0010ffff", lo)
+        return np.unique(self._postings(lo, hi)[0])
+
+    def _phrase(self, tokens: List[str]) -> np.ndarray:
+        width = self.max_pos + 1
+        keys = None
+        for i, token in enumerate(tokens):
+            k = self._code(token)
+            if k is None:
+                return np.zeros(0, dtype=np.int64)
+            docs, pos = self._postings(k, k + 1)
+            start = pos >= i
+            # (row, position of the phrase's first token) of each occurrence
+            found = docs[start] * width + pos[start] - i
+            keys = found if keys is None else np.intersect1d(keys, found, assume_unique=True)
+            if not len(keys):
+                break
+        return np.unique(keys // width)
+
+    def match(self, q: str) -> np.ndarray:
+        """Sorted store rows of the messages matching every clause of ``q``."""
+        rows = None
+        for kind, tokens in parse_query(q):
+            if kind == "phrase":
+                found = self._phrase(tokens)
+            elif kind == "prefix":
+                found = self._prefix(tokens[0])
+            else:
+                found = self._term(tokens[0])
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            if not len(rows):
+                break
+        return np.zeros(0, dtype=np.int64) if rows is None else rows
+
+    def search(
+        self,
+        q: str,
+        sender: Optional[str] = None,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """One page of the messages matching ``q``, in chat order.
+
+        ``sender`` keeps one sender's messages; ``start``/``end`` keep
+        inclusive local days. ``total`` counts all matches.
+        """
+        store = self._store
+        rows = self.match(q)
+        if sender is not None:
+            code = store.senders.index(sender) if sender in store.senders else -2
+            rows = rows[store.sender_codes[rows] == code]
+        if start is not None or end is not None:
+            days = store.local_days(None)[rows]
+            epoch = dt.date(1970, 1, 1)
+            keep = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                keep &= days >= (start - epoch).days
+            if end is not None:
+                keep &= days <= (end - epoch).days
+            rows = rows[keep]
+        hits = [
+            {"i": i, "ts": store.timestamp(i).isoformat(), "sender": store.sender(i),
+             "text": store.text(i)}
+            for i in rows[offset:offset + limit].tolist()
+        ]
+        return {"total": int(len(rows)), "offset": offset, "limit": limit, "hits": hits}
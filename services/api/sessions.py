@@ -0,0 +1,156 @@
+"""Conversation sessions: runs of messages separated by idle gaps.
+
+A session starts with the first message of a chat and after every gap
+longer than the idle threshold between two consecutive (non-system)
+messages. The index is built once per chat by vectorised gap detection on
+the sorted UTC timestamps and keeps one row per session, so session-level
+KPIs cost O(sessions) instead of a pass over the messages.
+"""
+
+import datetime as dt
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from kpis import QUANTILES
+from store import MessageStore
+
+_NS_PER_SECOND = 1_000_000_000
+
+# Histogram edges of the session length distributions
+DURATION_MINUTES_BINS = [0, 1, 5, 15, 30, 60, 2 * 60, 4 * 60, 12 * 60]
+MESSAGE_COUNT_BINS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+def _distribution(values: np.ndarray, bins: List[float]) -> Dict[str, Any]:
+    n = len(values)
+    out: Dict[str, Any] = {"count": n, "mean": float(values.mean()) if n else 0.0}
+    out.update(
+        (k, float(np.quantile(values, q)) if n else 0.0) for k, q in QUANTILES.items()
+    )
+    counts = np.bincount(
+        np.searchsorted(bins, values, side="right") - 1, minlength=len(bins)
+    )
+    out["histogram"] = {"edges": list(bins), "counts": counts.tolist()}
+    return out
+
+
+class SessionIndex:
+    """Per-session arrays of one chat.
+
+    ``rows`` holds the store indices of the non-system messages in time
+    order and session ``k`` spans ``rows[start[k]:end[k]]``. Per session the
+    index keeps the UTC start and end times, the initiator's sender code and
+    the local day it started on; the senders taking part are stored CSR
+    style, session ``k``'s in ``members[member_offsets[k]:member_offsets[k + 1]]``
+    with their message counts in ``member_messages``.
+    """
+
+    def __init__(self, store: MessageStore, gap: dt.timedelta):
+        self.gap = gap
+        self.senders = list(store.senders)
+        self._store = store
+        rows = np.flatnonzero(store.sender_codes >= 0)
+        ts = store.ts[rows]
+        if len(ts) > 1 and not bool(np.all(ts[1:] >= ts[:-1])):
+            order = np.argsort(ts, kind="stable")
+            rows, ts = rows[order], ts[order]
+        self.rows = rows
+        gap_ns = int(gap.total_seconds() * _NS_PER_SECOND)
+        breaks = np.flatnonzero(np.diff(ts) > gap_ns) + 1
+        if len(rows):
+            self.start = np.concatenate(([0], breaks))
+            self.end = np.concatenate((breaks, [len(rows)]))
+        else:
+            self.start = self.end = np.zeros(0, dtype=np.int64)
+        last = np.maximum(self.end - 1, 0)
+        self.start_ts = ts[self.start]
+        self.end_ts = ts[last] if len(rows) else ts[:0]
+        codes = store.sender_codes[rows].astype(np.int64)
+        self.initiator = codes[self.start]
+        self.day = store.local_days(None)[rows[self.start]]
+
+        n_senders = max(len(self.senders), 1)
+        session = np.repeat(np.arange(len(self.start)), self.end - self.start)
+        pairs, self.member_messages = np.unique(session * n_senders + codes, return_counts=True)
+        self.members = pairs % n_senders
+        self.member_offsets = np.searchsorted(pairs // n_senders, np.arange(len(self.start) + 1))
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def messages(self) -> np.ndarray:
+        return self.end - self.start
+
+    @property
+    def duration_seconds(self) -> np.ndarray:
+        return (self.end_ts - self.start_ts) / _NS_PER_SECOND
+
+    def _select(self, start: Optional[dt.date], end: Optional[dt.date]) -> np.ndarray:
+        """Sessions starting within the inclusive local date range."""
+        keep = np.ones(len(self), dtype=bool)
+        epoch = dt.date(1970, 1, 1)
+        if start is not None:
+            keep &= self.day >= (start - epoch).days
+        if end is not None:
+            keep &= self.day <= (end - epoch).days
+        return np.flatnonzero(keep)
+
+    def kpis(self, start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> Dict[str, Any]:
+        """Session-level KPIs for the sessions started in the date range.
+
+        Per sender: sessions started and sessions taken part in; the
+        distributions of session duration (minutes) and length (messages);
+        and the number of sessions started per local day.
+        """
+        sel = self._select(start, end)
+        n_senders = len(self.senders)
+        started = np.bincount(self.initiator[sel], minlength=n_senders)
+        # membership rows of the selected sessions
+        counts = self.member_offsets[sel + 1] - self.member_offsets[sel]
+        idx = np.repeat(self.member_offsets[sel] - np.cumsum(counts) + counts, counts)
+        idx += np.arange(len(idx))
+        joined = np.bincount(self.members[idx], minlength=n_senders)
+        order = sorted(range(n_senders), key=self.senders.__getitem__)
+        initiators = [
+            {"sender": self.senders[k], "started": int(started[k]), "joined": int(joined[k]),
+             "share": float(started[k] / len(sel)) if len(sel) else 0.0}
+            for k in order if joined[k]
+        ]
+        days, per_day = np.unique(self.day[sel], return_counts=True)
+        labels = np.datetime_as_string(days.astype("datetime64[D]"), unit="D").tolist()
+        return {
+            "gap_minutes": self.gap.total_seconds() / 60,
+            "sessions": int(len(sel)),
+            "initiators": initiators,
+            "duration_minutes": _distribution(
+                self.duration_seconds[sel] / 60, DURATION_MINUTES_BINS
+            ),
+            "messages": _distribution(self.messages[sel].astype(np.float64), MESSAGE_COUNT_BINS),
+            "per_day": [
+                {"day": d, "sessions": int(n)} for d, n in zip(labels, per_day.tolist())
+            ],
+        }
+
+    def records(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Sessions ``offset`` to ``offset + limit`` in time order."""
+        out = []
+        for k in range(max(offset, 0), min(offset + limit, len(self))):
+            a, b = self.member_offsets[k], self.member_offsets[k + 1]
+            first, last = int(self.rows[self.start[k]]), int(self.rows[self.end[k] - 1])
+            out.append({
+                "id": k,
+                "start": self._store.timestamp(first).isoformat(),
+                "end": self._store.timestamp(last).isoformat(),
+                "first_message": first,
+                "last_message": last,
+                "initiator": self.senders[self.initiator[k]],
+                "participants": {
+                    self.senders[c]: int(n)
+                    for c, n in zip(self.members[a:b].tolist(), self.member_messages[a:b].tolist())
+                },
+                "messages": int(self.end[k] - self.start[k]),
+                "duration_seconds": float(self.duration_seconds[k]),
+            })
+        return out
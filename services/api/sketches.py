@@ -0,0 +1,155 @@
+"""Bounded-memory streaming summaries used by the approximate KPI modes."""
+
+import heapq
+import math
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+
+class SpaceSaving:
+    """Heavy-hitters sketch (Metwally et al.'s Space-Saving).
+
+    At most ``capacity`` counters are kept regardless of stream length. When a
+    new item arrives and the table is full, the item with the smallest count
+    is evicted and the newcomer inherits that count as its error. Hence every
+    reported count overestimates the true count by at most its ``error``, and
+    any item whose true count exceeds :attr:`error_bound` is guaranteed to be
+    monitored.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        # One (count, item) entry per monitored item; counts may be stale
+        # (too low) and are refreshed lazily when the entry reaches the top.
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    def add(self, item: Hashable, count: int = 1) -> None:
+        self.total += count
+        current = self.counts.get(item)
+        if current is not None:
+            self.counts[item] = current + count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, item))
+            return
+        heap = self._heap
+        while True:
+            stale, victim = heap[0]
+            actual = self.counts[victim]
+            if actual == stale:
+                break
+            heapq.heapreplace(heap, (actual, victim))
+        del self.counts[victim]
+        del self.errors[victim]
+        self.counts[item] = stale + count
+        self.errors[item] = stale
+        heapq.heapreplace(heap, (stale + count, item))
+
+    def update(self, items) -> None:
+        for item in items:
+            self.add(item)
+
+    @property
+    def error_bound(self) -> int:
+        """Maximum overestimate of any count; 0 while the sketch is exact."""
+
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def top(self, n: int) -> List[Tuple[Hashable, int]]:
+        """The ``n`` items with the largest estimated counts."""
+
+        return heapq.nlargest(n, self.counts.items(), key=lambda kv: kv[1])
+
+
+# bucket key of zero values in QuantileSketch.bucket_keys
+ZERO_KEY = np.iinfo(np.int64).min
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Non-negative values are counted in logarithmic buckets
+    ``(gamma ** (i - 1), gamma ** i]`` with
+    ``gamma = (1 + relative_accuracy) / (1 - relative_accuracy)``, so every
+    quantile is reported within a factor ``1 +- relative_accuracy`` of the
+    exact one and the number of buckets grows with ``log(max / min)`` rather
+    than with the number of values. Merging adds bucket counts, so the
+    sketch of a stream does not depend on how the stream was split.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zeros = 0
+        self.buckets: Dict[int, int] = {}
+
+    def update(self, values: Iterable[float]) -> None:
+        x = np.asarray(values, dtype=np.float64)
+        if (x < 0).any():
+            raise ValueError("values must be non-negative")
+        pos = x[x > 0]
+        self.count += len(x)
+        self.zeros += len(x) - len(pos)
+        if len(pos):
+            keys, counts = np.unique(self.bucket_keys(pos), return_counts=True)
+            for k, c in zip(keys.tolist(), counts.tolist()):
+                self.buckets[k] = self.buckets.get(k, 0) + c
+
+    def bucket_keys(self, values: Iterable[float]) -> np.ndarray:
+        """Bucket of every value; zeros get :data:`ZERO_KEY`, below all others."""
+
+        x = np.asarray(values, dtype=np.float64)
+        keys = np.full(len(x), ZERO_KEY, dtype=np.int64)
+        pos = x > 0
+        keys[pos] = np.ceil(np.log(x[pos]) / self._log_gamma).astype(np.int64)
+        return keys
+
+    def bucket_values(self, keys: np.ndarray) -> np.ndarray:
+        """The value :meth:`quantile` reports for a rank in each bucket."""
+
+        # scalar powers, so values match quantile() bit for bit
+        return np.array([
+            0.0 if k == ZERO_KEY else 2 * self.gamma ** k / (self.gamma + 1)
+            for k in np.asarray(keys, dtype=np.int64).tolist()
+        ])
+
+    def add(self, value: float) -> None:
+        self.update([value])
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches of different accuracy")
+        self.count += other.count
+        self.zeros += other.zeros
+        for k, c in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + c
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the ``q``-quantile, ``0 <= q <= 1``."""
+
+        if not self.count:
+            raise ValueError("quantile of an empty sketch")
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                break
+        # midpoint (in relative terms) of the bucket holding the rank
+        return 2 * self.gamma ** k / (self.gamma + 1)
@@ -0,0 +1,459 @@
+from array import array
+from collections import Counter
+import datetime as dt
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from parse import ATTACHMENT_RE, Message
+from tzbucket import local_ns
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_NO_SENDER = -1
+
+
+class MessageStore:
+    """Columnar, immutable storage for a parsed chat.
+
+    Messages are kept sorted by timestamp (ties keep export order) in flat
+    arrays:
+
+    - ``ts``: int64 nanoseconds since the epoch, UTC
+    - ``utc_offset``: int32 seconds east of UTC of each message's local time
+      in the export, or ``None`` for naive exports (local time taken as UTC)
+    - ``sender_codes``: int32 index into ``senders`` (``-1`` for system lines)
+    - ``text_buffer`` / ``text_offsets``: all texts as one UTF-8 buffer,
+      message ``i`` spanning ``text_offsets[i]:text_offsets[i + 1]``
+    - ``has_media`` / ``is_system``: bool flags
+    - ``n_words`` / ``n_chars``: int32 per-message sizes
+
+    The store is the single canonical copy of a chat. :meth:`to_df` hands out
+    a DataFrame whose numeric columns are views over these arrays and
+    iterating yields :class:`parse.Message` objects on demand.
+    """
+
+    def __init__(
+        self,
+        ts: np.ndarray,
+        sender_codes: np.ndarray,
+        senders: List[str],
+        text_buffer: bytes,
+        text_offsets: np.ndarray,
+        has_media: np.ndarray,
+        is_system: np.ndarray,
+        n_words: np.ndarray,
+        n_chars: np.ndarray,
+        tz: Optional[dt.tzinfo] = None,
+        utc_offset: Optional[np.ndarray] = None,
+    ):
+        self.ts = ts
+        self.utc_offset = utc_offset
+        self.sender_codes = sender_codes
+        self.senders = senders
+        self.text_buffer = text_buffer
+        self.text_offsets = text_offsets
+        self.has_media = has_media
+        self.is_system = is_system
+        self.n_words = n_words
+        self.n_chars = n_chars
+        self.tz = tz
+        self._texts: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Message]) -> "MessageStore":
+        """Fill a store directly from a (possibly streaming) message iterable."""
+
+        ts = array("q")
+        codes = array("i")
+        offsets = array("q", [0])
+        buf = bytearray()
+        media = array("b")
+        system = array("b")
+        n_words = array("i")
+        n_chars = array("i")
+        utc_offset = array("i")
+        senders: List[str] = []
+        lookup: Dict[str, int] = {}
+        tz: Optional[dt.tzinfo] = None
+
+        for m in messages:
+            stamp = m.ts
+            offset = 0
+            if stamp.tzinfo is not None:
+                tz = tz or stamp.tzinfo
+                offset = int(stamp.utcoffset().total_seconds())
+                stamp = stamp.replace(tzinfo=None)
+            utc_offset.append(offset)
+            delta = stamp - _EPOCH - dt.timedelta(seconds=offset)
+            ts.append(
+                (delta.days * 86400 + delta.seconds) * 1_000_000_000
+                + delta.microseconds * 1000
+            )
+            if m.sender is None:
+                codes.append(_NO_SENDER)
+            else:
+                code = lookup.get(m.sender)
+                if code is None:
+                    code = lookup[m.sender] = len(senders)
+                    senders.append(m.sender)
+                codes.append(code)
+            text = m.text or ""
+            buf += text.encode("utf-8")
+            offsets.append(len(buf))
+            media.append(m.has_media)
+            system.append(m.is_system)
+            n_words.append(len(text.split()))
+            n_chars.append(len(text))
+
+        store = cls(
+            ts=np.frombuffer(ts, dtype=np.int64),
+            sender_codes=np.frombuffer(codes, dtype=np.int32),
+            senders=senders,
+            text_buffer=bytes(buf),
+            text_offsets=np.frombuffer(offsets, dtype=np.int64),
+            has_media=np.frombuffer(media, dtype=np.bool_),
+            is_system=np.frombuffer(system, dtype=np.bool_),
+            n_words=np.frombuffer(n_words, dtype=np.int32),
+            n_chars=np.frombuffer(n_chars, dtype=np.int32),
+            tz=tz,
+            utc_offset=np.frombuffer(utc_offset, dtype=np.int32) if tz is not None else None,
+        )
+        return store.sorted()
+
+    def take(self, idx: np.ndarray) -> "MessageStore":
+        """Return a new store holding the rows at ``idx`` in that order."""
+
+        starts = self.text_offsets[:-1][idx]
+        ends = self.text_offsets[1:][idx]
+        mv = memoryview(self.text_buffer)
+        text_buffer = b"".join(mv[a:b] for a, b in zip(starts.tolist(), ends.tolist()))
+        offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+        np.cumsum(ends - starts, out=offsets[1:])
+        return MessageStore(
+            ts=self.ts[idx],
+            sender_codes=self.sender_codes[idx],
+            senders=list(self.senders),
+            text_buffer=text_buffer,
+            text_offsets=offsets,
+            has_media=self.has_media[idx],
+            is_system=self.is_system[idx],
+            n_words=self.n_words[idx],
+            n_chars=self.n_chars[idx],
+            tz=self.tz,
+            utc_offset=None if self.utc_offset is None else self.utc_offset[idx],
+        )
+
+    @classmethod
+    def concat(cls, first: "MessageStore", second: "MessageStore") -> "MessageStore":
+        """Append ``second`` to ``first``, re-sorting by timestamp if needed."""
+
+        senders = list(first.senders)
+        lookup = {s: i for i, s in enumerate(senders)}
+        remap = np.empty(len(second.senders) + 1, dtype=np.int32)
+        for i, s in enumerate(second.senders):
+            if s not in lookup:
+                lookup[s] = len(senders)
+                senders.append(s)
+            remap[i] = lookup[s]
+        remap[-1] = _NO_SENDER
+        utc_offset = None
+        if first.utc_offset is not None or second.utc_offset is not None:
+            utc_offset = np.concatenate([first.utc_offsets(), second.utc_offsets()])
+        return cls(
+            ts=np.concatenate([first.ts, second.ts]),
+            sender_codes=np.concatenate([first.sender_codes, remap[second.sender_codes]]),
+            senders=senders,
+            text_buffer=first.text_buffer + second.text_buffer,
+            text_offsets=np.concatenate(
+                [first.text_offsets, second.text_offsets[1:] + first.text_offsets[-1]]
+            ),
+            has_media=np.concatenate([first.has_media, second.has_media]),
+            is_system=np.concatenate([first.is_system, second.is_system]),
+            n_words=np.concatenate([first.n_words, second.n_words]),
+            n_chars=np.concatenate([first.n_chars, second.n_chars]),
+            tz=first.tz or second.tz,
+            utc_offset=utc_offset,
+        ).sorted()
+
+    def fingerprints(self) -> Iterator[Tuple[int, str, bytes]]:
+        """Yield a ``(ts, sender, text)`` identity key for every message."""
+
+        labels = self.sender_labels().tolist()
+        mv = memoryview(self.text_buffer)
+        offsets = self.text_offsets.tolist()
+        for i, ts in enumerate(self.ts.tolist()):
+            yield ts, labels[i], bytes(mv[offsets[i] : offsets[i + 1]])
+
+    def merge(self, other: "MessageStore") -> Tuple["MessageStore", int, int]:
+        """Merge an overlapping export of the same chat into this one.
+
+        A hash index over the fingerprints of this store is built once and
+        every message of ``other`` is looked up in it, so deduplication is
+        O(n) overall. Repeated identical messages (the same text sent twice in
+        one minute) are matched one-to-one.
+
+        Returns
+        -------
+        Tuple[MessageStore, int, int]
+            The merged store and the number of new and duplicate messages
+            found in ``other``.
+        """
+
+        seen = Counter(self.fingerprints())
+        keep = np.zeros(len(other), dtype=bool)
+        for i, fp in enumerate(other.fingerprints()):
+            if seen[fp] > 0:
+                seen[fp] -= 1
+            else:
+                keep[i] = True
+        n_new = int(keep.sum())
+        if n_new == 0:
+            return self, 0, len(other)
+        merged = MessageStore.concat(self, other.take(np.flatnonzero(keep)))
+        return merged, n_new, len(other) - n_new
+
+    def extends(self, prefix: "MessageStore") -> bool:
+        """Whether this store starts with all messages of ``prefix``, in order.
+
+        True when a later export of the same chat only appended messages.
+        The comparison is a handful of vectorised array and buffer compares.
+        """
+
+        n = len(prefix)
+        if n > len(self):
+            return False
+        lookup = {s: i for i, s in enumerate(self.senders)}
+        # senders unknown to this store map to -2, which never matches
+        remap = np.array(
+            [lookup.get(s, -2) for s in prefix.senders] + [_NO_SENDER], dtype=np.int32
+        )
+        end = int(prefix.text_offsets[-1])
+        return (
+            np.array_equal(self.ts[:n], prefix.ts)
+            and np.array_equal(self.sender_codes[:n], remap[prefix.sender_codes])
+            and np.array_equal(self.is_system[:n], prefix.is_system)
+            and np.array_equal(self.has_media[:n], prefix.has_media)
+            and np.array_equal(self.text_offsets[: n + 1], prefix.text_offsets)
+            and memoryview(self.text_buffer)[:end] == memoryview(prefix.text_buffer)
+        )
+
+    def save(self, path) -> None:
+        """Write the store's arrays to ``path`` as an uncompressed ``.npz``.
+
+        ``tz`` is kept as its IANA key when it has one (``ZoneInfo``) and as
+        a fixed offset otherwise.
+        """
+
+        key = getattr(self.tz, "key", None) or ""
+        offset = self.tz.utcoffset(None) if self.tz is not None and not key else None
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                ts=self.ts,
+                sender_codes=self.sender_codes,
+                senders=np.array(self.senders, dtype=str),
+                text_buffer=np.frombuffer(self.text_buffer, dtype=np.uint8),
+                text_offsets=self.text_offsets,
+                has_media=self.has_media,
+                is_system=self.is_system,
+                n_words=self.n_words,
+                n_chars=self.n_chars,
+                tz_key=np.array(key),
+                tz_offset=np.array(
+                    [offset.total_seconds() if offset is not None else np.nan]
+                ),
+                # empty for naive exports
+                utc_offset=self.utc_offset if self.utc_offset is not None else np.zeros(0, np.int32),
+            )
+
+    @classmethod
+    def load(cls, path) -> "MessageStore":
+        """Read a store written by :meth:`save`."""
+
+        with np.load(path) as data:
+            key, offset = str(data["tz_key"]), float(data["tz_offset"][0])
+            if key:
+                tz = ZoneInfo(key)
+            elif not np.isnan(offset):
+                tz = dt.timezone(dt.timedelta(seconds=offset))
+            else:
+                tz = None
+            return cls(
+                ts=data["ts"],
+                sender_codes=data["sender_codes"],
+                senders=data["senders"].tolist(),
+                text_buffer=data["text_buffer"].tobytes(),
+                text_offsets=data["text_offsets"],
+                has_media=data["has_media"],
+                is_system=data["is_system"],
+                n_words=data["n_words"],
+                n_chars=data["n_chars"],
+                tz=tz,
+                utc_offset=data["utc_offset"] if len(data["utc_offset"]) else None,
+            )
+
+    def sorted(self) -> "MessageStore":
+        """Return the store ordered by timestamp, or ``self`` if it already is."""
+
+        if len(self) < 2 or bool(np.all(self.ts[1:] >= self.ts[:-1])):
+            return self
+        return self.take(np.argsort(self.ts, kind="stable"))
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def text(self, i: int) -> str:
+        a, b = self.text_offsets[i], self.text_offsets[i + 1]
+        return self.text_buffer[a:b].decode("utf-8")
+
+    def sender(self, i: int) -> Optional[str]:
+        code = int(self.sender_codes[i])
+        return None if code == _NO_SENDER else self.senders[code]
+
+    def utc_offsets(self) -> np.ndarray:
+        """Per-message UTC offsets in seconds (zeros for naive exports)."""
+
+        if self.utc_offset is None:
+            return np.zeros(len(self), dtype=np.int32)
+        return self.utc_offset
+
+    def local_ts(self) -> np.ndarray:
+        """int64 nanoseconds of the export's local wall-clock time.
+
+        For naive exports this is ``ts`` itself, not a copy.
+        """
+
+        if self.utc_offset is None:
+            return self.ts
+        return self.ts + self.utc_offset.astype(np.int64) * 1_000_000_000
+
+    def local_days(self, tz: Optional[dt.tzinfo]) -> np.ndarray:
+        """Day ordinals (days since the epoch) of each message in ``tz``.
+
+        Like :func:`parse.group_by_day`, naive exports keep their own
+        wall-clock days whatever ``tz`` is.
+        """
+
+        local = self.local_ts() if tz is None or self.tz is None else local_ns(self.ts, tz)
+        return local // (86400 * 1_000_000_000)
+
+    def timestamp(self, i: int) -> dt.datetime:
+        local = int(self.ts[i])
+        if self.utc_offset is not None:
+            local += int(self.utc_offset[i]) * 1_000_000_000
+        stamp = _EPOCH + dt.timedelta(microseconds=local // 1000)
+        return stamp if self.tz is None else stamp.replace(tzinfo=self.tz)
+
+    def __getitem__(self, i: int) -> Message:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Message(
+            ts=self.timestamp(i),
+            sender=self.sender(i),
+            text=self.text(i),
+            has_media=bool(self.has_media[i]),
+            is_system=bool(self.is_system[i]),
+        )
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def attachments(self, media: Dict[str, int]) -> List[Dict[str, object]]:
+        """Match attachment references to the media members of a zip export.
+
+        Returns one record per ``has_media`` row with its index, the
+        referenced file name and its size from ``media`` (``None`` when the
+        export omitted media or the file is missing).
+        """
+
+        out: List[Dict[str, object]] = []
+        for i in np.flatnonzero(self.has_media).tolist():
+            found = ATTACHMENT_RE.search(self.text(i))
+            name = (found.group(1) or found.group(2)) if found else None
+            out.append({"i": i, "name": name, "size": media.get(name) if name else None})
+        return out
+
+    def texts(self) -> np.ndarray:
+        """Decoded texts as an object array, built once and cached."""
+
+        if self._texts is None:
+            out = np.empty(len(self), dtype=object)
+            mv = memoryview(self.text_buffer)
+            offsets = self.text_offsets.tolist()
+            for i in range(len(self)):
+                out[i] = str(mv[offsets[i] : offsets[i + 1]], "utf-8")
+            self._texts = out
+        return self._texts
+
+    def sender_labels(self) -> np.ndarray:
+        """Sender names per row as an object array, ``""`` for system lines."""
+
+        labels = np.array(self.senders + [""], dtype=object)
+        # code -1 indexes the trailing "" entry
+        return labels[self.sender_codes]
+
+    def sender_categorical(self) -> pd.Categorical:
+        """Sender names per row as a categorical, ``""`` for system lines.
+
+        Categories are sorted, so grouping by them orders groups as grouping
+        the plain labels would.
+        """
+
+        labels = self.senders + [""]
+        order = sorted(range(len(labels)), key=labels.__getitem__)
+        rank = np.empty(len(labels), dtype=np.int32)
+        rank[order] = np.arange(len(labels), dtype=np.int32)
+        return pd.Categorical.from_codes(
+            rank[self.sender_codes], categories=[labels[k] for k in order]
+        )
+
+    def arrow_texts(self) -> Optional[pd.api.extensions.ExtensionArray]:
+        """Texts as an Arrow string array over the store's own buffers.
+
+        No per-message Python strings are created. Returns ``None`` when
+        pyarrow is not installed.
+        """
+
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return None
+        arr = pa.LargeStringArray.from_buffers(
+            len(self), pa.py_buffer(self.text_offsets), pa.py_buffer(self.text_buffer)
+        )
+        return pd.arrays.ArrowExtensionArray(arr)
+
+    def to_df(self, lean: bool = False) -> pd.DataFrame:
+        """DataFrame view with the columns produced by ``kpis.to_df``.
+
+        ``ts`` is the export's local time. It, ``has_media``, ``is_system``,
+        ``n_words`` and ``n_chars`` share memory with the store (``ts`` only
+        for naive exports); ``text`` reuses the cached decoded strings. With
+        ``lean`` the sender column is categorical and, when pyarrow is
+        installed, ``text`` is an Arrow string column over the text buffer.
+        """
+
+        if lean:
+            sender, text = self.sender_categorical(), self.arrow_texts()
+        else:
+            sender, text = self.sender_labels(), None
+        if text is None:
+            text = self.texts()
+        return pd.DataFrame(
+            {
+                "i": np.arange(len(self)),
+                "ts": self.local_ts().view("datetime64[ns]"),
+                "sender": sender,
+                "text": text,
+                "has_media": self.has_media,
+                "is_system": self.is_system,
+                "n_words": self.n_words,
+                "n_chars": self.n_chars,
+            },
+            copy=False,
+        )
@@ -0,0 +1,71 @@
+import json
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import batch
+
+chat = (
+    "2024-01-01, 9:00 a.m. - Alice: hi\n"
+    "2024-01-01, 9:01 a.m. - Bob: hey there\n"
+)
+
+
+def test_batch_writes_kpis_and_messages(tmp_path):
+    src = tmp_path / "exports"
+    (src / "old").mkdir(parents=True)
+    (src / "one.txt").write_text(chat, encoding="utf-8")
+    (src / "old" / "two.txt").write_text(chat, encoding="utf-8")
+    (src / "notes.md").write_text("ignored", encoding="utf-8")
+    out = tmp_path / "out"
+
+    rc = batch.main([str(src), "--out", str(out), "--workers", "1", "--messages-format", "json"])
+
+    assert rc == 0
+    assert sorted(str(p.relative_to(out)) for p in out.rglob("*.json")) == [
+        "old/two.kpis.json", "old/two.messages.json", "one.kpis.json", "one.messages.json",
+    ]
+    kpis = json.loads((out / "one.kpis.json").read_text())
+    assert kpis["totals"] == {"messages": 2, "words": 3}
+    msgs = json.loads((out / "one.messages.json").read_text())
+    assert [m["sender"] for m in msgs] == ["Alice", "Bob"]
+
+
+def test_same_named_exports_do_not_collide(tmp_path):
+    src = tmp_path / "exports"
+    for who in ("alice", "bob"):
+        (src / who).mkdir(parents=True)
+    (src / "alice" / "_chat.txt").write_text(chat, encoding="utf-8")
+    (src / "bob" / "_chat.txt").write_text(chat + chat.replace("9:0", "10:0"), encoding="utf-8")
+    (src / "bob" / "_chat.zip").write_bytes(b"")
+    out = tmp_path / "out"
+
+    rc = batch.main([str(src / "*" / "_chat.*"), "--out", str(out), "--workers", "2",
+                     "--messages-format", "json"])
+
+    assert rc == 1  # the empty zip fails; the text exports still land
+    assert sorted(str(p.relative_to(out)) for p in out.rglob("*.kpis.json")) == [
+        "alice/_chat.kpis.json", "bob/_chat.txt.kpis.json",
+    ]
+    kpis = json.loads((out / "bob" / "_chat.txt.kpis.json").read_text())
+    assert kpis["totals"]["messages"] == 4
+
+
+def test_batch_reports_failures(tmp_path):
+    (tmp_path / "empty.txt").write_text("no timestamps here", encoding="utf-8")
+    rc = batch.main([str(tmp_path / "*.txt"), "--out", str(tmp_path / "out"), "--workers", "1"])
+    assert rc == 1
+
+
+def test_batch_passes_the_export_timezone(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text(chat, encoding="utf-8")
+    zones = []
+    real = batch.parse_file
+    monkeypatch.setattr(
+        batch, "parse_file", lambda f, tz, **kw: zones.append(tz) or real(f, tz, **kw)
+    )
+    batch.process_export(tmp_path / "a.txt", tmp_path / "out", "json",
+                         default_tz=ZoneInfo("Europe/Berlin"))
+    assert zones == [ZoneInfo("Europe/Berlin")]
+    with pytest.raises(SystemExit):
+        batch.main([str(tmp_path), "--out", str(tmp_path / "out"), "--tz", "Mars/Olympus"])
@@ -0,0 +1,105 @@
+import asyncio
+import io
+import json
+import os
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import KPICache, content_hash
+from kpis import to_df
+from main import app
+from store import MessageStore
+from test_incremental import _export, _messages
+
+
+def test_store_round_trips_through_npz(tmp_path):
+    store = MessageStore.from_messages(_messages(100))
+    store.save(tmp_path / "s.npz")
+    loaded = MessageStore.load(tmp_path / "s.npz")
+    assert list(loaded) == list(store)
+    assert to_df(loaded).equals(to_df(store))
+
+
+def test_content_hash_rewinds_and_depends_on_bytes():
+    f = io.BytesIO(b"abc" * 1000)
+    assert content_hash(f, chunk_size=7) == content_hash(io.BytesIO(b"abc" * 1000))
+    assert f.tell() == 0
+    assert content_hash(io.BytesIO(b"abd")) != content_hash(io.BytesIO(b"abc"))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    store = MessageStore.from_messages(_messages(200))
+    cache = KPICache(tmp_path, max_bytes=1 << 30)
+    for key in "abc":
+        cache.save(key, store, {})
+    entry_size = sum(f.stat().st_size for f in (tmp_path / "a").iterdir())
+    for age, key in enumerate("bac"):
+        os.utime(tmp_path / key, (1000 + age, 1000 + age))
+    cache.max_bytes = 2 * entry_size + 100
+    cache.save_kpis("c", "v", {"x": 1})
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "c"]
+    assert cache.load("b") is None
+    assert cache.load_kpis("c", "v") == {"x": 1}
+
+
+def test_repeated_upload_skips_parsing(monkeypatch):
+    data = _export(_messages(150, seed=11))
+    client = TestClient(app)
+    first = client.post("/upload", files={"file": ("a.txt", data)}).json()
+    full = client.get("/kpis").json()["kpis"]
+
+    # a fresh process state: the cache alone must serve the upload
+    main.STATE.update(content_hash=None, engine=None, kpis=None, kpi_state=None)
+    monkeypatch.setattr(main, "parse_file", lambda *a, **k: pytest.fail("parsed again"))
+    monkeypatch.setattr(main.KPIState, "payload", lambda self: pytest.fail("recomputed"))
+    second = client.post("/upload", files={"file": ("b.txt", data)}).json()
+    assert second == first
+    assert client.get("/kpis").json()["kpis"] == full
+    # still folded, for a longer re-export
+    assert main.STATE["kpi_state"] is not None
+
+
+def test_payload_without_new_sections_is_completed(monkeypatch):
+    data = _export(_messages(150, seed=13))
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", data)})
+    full = client.get("/kpis").json()["kpis"]
+    assert main.KPI_SCHEMA in main._kpi_variant()
+
+    # a payload cached before "reply_graph" existed, under the current variant
+    stale = {k: v for k, v in full.items() if k != "reply_graph"}
+    main.KPI_CACHE.save_kpis(main.STATE["content_hash"], main._kpi_variant(), stale)
+    main.STATE.update(content_hash=None, engine=None, kpis=None, kpi_state=None)
+    res = client.post("/upload_stream", files={"file": ("a.txt", data)})
+    assert res.status_code == 200
+    events = [json.loads(line[6:]) for line in res.text.splitlines()
+              if line.startswith("data: {")]
+    streamed = {k: v for e in events for k, v in e.get("kpis", {}).items()}
+    assert streamed["reply_graph"] == full["reply_graph"]
+
+
+def test_concurrent_uploads_share_one_parse(monkeypatch):
+    data = _export(_messages(150, seed=12))
+    calls = []
+    real = main._parse_upload
+
+    def spy(*args):
+        calls.append(1)
+        return real(*args)
+
+    monkeypatch.setattr(main, "_parse_upload", spy)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/upload", files={"file": ("a.txt", data)}) for _ in range(3)
+            ])
+
+    responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert responses[0].json() == responses[1].json() == responses[2].json()
+    assert calls == [1]
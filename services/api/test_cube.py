@@ -0,0 +1,82 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from cube import DayCube
+from incremental import KPIState
+import main
+from kpis import KPIEngine, compute, to_df
+from main import app
+from store import MessageStore
+from test_incremental import _export, _messages
+
+EXACT = [
+    "by_sender", "totals", "questions", "questions_split", "media_total",
+    "profanity_hits", "we_ness_ratio", "affection_hits", "affection_split", "heatmap",
+]
+
+
+def _cube(msgs):
+    state = KPIState()
+    state.extend(to_df(MessageStore.from_messages(msgs)))
+    return DayCube.from_state(state)
+
+
+def test_full_range_matches_compute():
+    msgs = _messages(400)
+    cube = _cube(msgs)
+    full = compute(to_df(msgs))
+    got = cube.kpis()
+    for key in EXACT:
+        assert got[key] == full[key], key
+    for a, b in zip(got["reply_simple"], full["reply_simple"]):
+        assert a["person"] == b["person"] and a["n"] == b["n"]
+        assert a["seconds"] == pytest.approx(b["seconds"])
+
+
+def test_sub_range_matches_filtered_messages():
+    msgs = _messages(400)
+    cube = _cube(msgs)
+    start, end = dt.date(2024, 1, 3), dt.date(2024, 1, 5)
+    inside = [m for m in msgs if start <= m.ts.date() <= end]
+    sub = compute(to_df(inside))
+    got = cube.kpis(start, end)
+    assert got["range"] == {"start": "2024-01-03", "end": "2024-01-05"}
+    for key in ["by_sender", "totals", "media_total", "profanity_hits", "affection_hits", "heatmap"]:
+        assert got[key] == sub[key], key
+    assert {r["sender"]: r["questions"] for r in got["questions_split"] if r["questions"]} == {
+        r["sender"]: r["questions"] for r in sub["questions_split"] if r["questions"]
+    }
+
+
+@pytest.mark.parametrize("n, seed", [(400, 0), (1500, 1), (1, 2)])
+def test_engine_cube_matches_state_cube(n, seed):
+    msgs = _messages(n, seed=seed)
+    state = _cube(msgs)
+    engine = DayCube.from_engine(KPIEngine(to_df(MessageStore.from_messages(msgs))))
+    assert (engine.first_day, engine.senders) == (state.first_day, state.senders)
+    np.testing.assert_allclose(engine.cum, state.cum)
+    assert np.array_equal(engine.hours, state.hours)
+
+
+def test_ranges_outside_chat_are_empty():
+    cube = _cube(_messages(50))
+    got = cube.kpis(dt.date(2030, 1, 1), None)
+    assert got["range"] == {"start": None, "end": None}
+    assert got["totals"] == {"messages": 0, "words": 0}
+    assert got["heatmap"] == []
+
+
+def test_kpis_endpoint_accepts_date_range(monkeypatch):
+    msgs = _messages(200, seed=5)
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(msgs))})
+    # range queries build the cube from the engine, without folding the chat
+    monkeypatch.setattr(main, "KPIState", lambda *a, **k: pytest.fail("folded"))
+    res = client.get("/kpis", params={"start": "2024-01-02", "end": "2024-01-02"})
+    assert res.status_code == 200
+    expected = sum(1 for m in msgs if not m.is_system and m.ts.date() == dt.date(2024, 1, 2))
+    assert res.json()["kpis"]["totals"]["messages"] == expected
+    assert client.get("/kpis", params={"start": "yesterday"}).status_code == 400
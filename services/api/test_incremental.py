@@ -0,0 +1,151 @@
+import datetime as dt
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import incremental
+import main
+from incremental import KPIState
+from kpis import compute, to_df
+from main import app
+from parse import Message
+from store import MessageStore
+
+TEXTS = [
+    "how are you?", "love you ❤️", "what the hell", "we should go", "I think my dog",
+    "ok", "<Media omitted>", "space rocket 🚀🚀", "haha 😂", "did you eat", "fuck",
+]
+
+
+def _messages(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    ts = dt.datetime(2024, 1, 1, 8, 0)
+    out = []
+    for _ in range(n):
+        ts += dt.timedelta(minutes=rng.choice([0, 1, 14, 16, 300]))
+        if rng.random() < 0.03:
+            out.append(Message(ts=ts, sender=None, text="Alice changed the subject", is_system=True))
+            continue
+        text = rng.choice(TEXTS)
+        out.append(Message(
+            ts=ts,
+            sender=rng.choice(["Alice", "Alice", "Bob", "Carol"]),
+            text=text,
+            has_media=text == "<Media omitted>",
+        ))
+    return out
+
+
+@pytest.mark.parametrize("capacity, distributions", [(None, "raw"), (60, "sketch")])
+@pytest.mark.parametrize("cuts", [[0], [1], [250], [100, 101, 102, 397]])
+def test_folding_in_chunks_equals_full_compute(cuts, capacity, distributions):
+    df = to_df(MessageStore.from_messages(_messages(400)))
+    state = KPIState(word_cloud_capacity=capacity, distributions=distributions)
+    for a, b in zip([0] + cuts, cuts + [len(df)]):
+        state.extend(df.iloc[a:b])
+    assert state.payload() == compute(
+        df, word_cloud_capacity=capacity, distributions=distributions
+    )
+
+
+def test_empty_state_matches_compute_of_empty_chat():
+    assert KPIState().payload() == compute(to_df([]))
+
+
+def test_extend_rejects_older_messages():
+    df = to_df(_messages(50))
+    state = KPIState()
+    state.extend(df.iloc[25:])
+    with pytest.raises(ValueError):
+        state.extend(df.iloc[:25])
+
+
+def test_store_extends_detects_appended_exports():
+    msgs = _messages(100)
+    full = MessageStore.from_messages(msgs)
+    assert full.extends(MessageStore.from_messages(msgs[:60]))
+    assert full.extends(full)
+    assert not MessageStore.from_messages(msgs[:60]).extends(full)
+    edited = msgs[:60]
+    edited[30] = Message(ts=edited[30].ts, sender=edited[30].sender, text="edited")
+    assert not full.extends(MessageStore.from_messages(edited))
+
+
+def _export(msgs):
+    lines = []
+    for m in msgs:
+        stamp = m.ts.strftime("%Y-%m-%d, %H:%M")
+        lines.append(f"{stamp} - {m.text}" if m.is_system else f"{stamp} - {m.sender}: {m.text}")
+    return "\n".join(lines) + "\n"
+
+
+def test_upload_of_longer_export_folds_only_new_messages(monkeypatch):
+    msgs = _messages(300, seed=3)
+    client = TestClient(app)
+    assert client.post("/upload", files={"file": ("a.txt", _export(msgs[:200]))}).status_code == 200
+
+    folded = []
+    real_extend = incremental.KPIState.extend
+
+    def spy(self, df):
+        folded.append(len(df))
+        return real_extend(self, df)
+
+    monkeypatch.setattr(incremental.KPIState, "extend", spy)
+    res = client.post("/upload", files={"file": ("a.txt", _export(msgs))})
+    assert res.status_code == 200
+    assert folded == [100]
+    full = compute(to_df(MessageStore.from_messages(msgs)))
+    assert res.json()["kpis"]["totals"] == full["totals"]
+    assert client.get("/kpis").json()["kpis"] == full
+
+    # an unrelated chat is analysed from scratch
+    other = _messages(50, seed=4)
+    client.post("/upload", files={"file": ("b.txt", _export(other))})
+    res = client.get("/kpis")
+    assert folded == [100]
+    assert len(main.STATE["kpi_state"]) == sum(1 for m in other if not m.is_system)
+    assert res.json()["kpis"] == compute(to_df(MessageStore.from_messages(other)))
+
+
+def test_streamed_upload_of_longer_export_is_folded(monkeypatch):
+    msgs = _messages(300, seed=5)
+    client = TestClient(app)
+    client.post("/upload_stream", files={"file": ("a.txt", _export(msgs[:200]))})
+    state = main.STATE["kpi_state"]
+    assert len(state) == sum(1 for m in msgs[:200] if not m.is_system)
+
+    computed = []
+    real_get = main.KPIEngine.get
+    monkeypatch.setattr(
+        main.KPIEngine, "get", lambda self, keys=None: computed.append(keys) or real_get(self, keys)
+    )
+    res = client.post("/upload_stream", files={"file": ("a.txt", _export(msgs))})
+    assert res.status_code == 200
+    assert main.STATE["kpi_state"] is state
+    assert not any(computed)  # every stage came from the folded payload
+    streamed = {}
+    for line in res.text.splitlines():
+        if line.startswith("data: {"):
+            streamed.update(json.loads(line[len("data: "):]).get("kpis", {}))
+    full = compute(to_df(MessageStore.from_messages(msgs)))
+    assert streamed == json.loads(json.dumps(full))
+
+
+def test_new_chat_replaces_the_state_at_once(monkeypatch):
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(_messages(100, seed=6)))})
+    old = dict(main.STATE)
+    real = main.KPI_CACHE.load_kpis
+
+    def check(*args):
+        # the new chat is built off the event loop before any of it is visible
+        assert all(main.STATE[k] is v for k, v in old.items())
+        return real(*args)
+
+    monkeypatch.setattr(main.KPI_CACHE, "load_kpis", check)
+    client.post("/upload", files={"file": ("b.txt", _export(_messages(80, seed=7)))})
+    assert main.STATE["engine"].df is main.STATE["messages_df"]
+    assert len(main.STATE["messages"]) == 80
@@ -0,0 +1,44 @@
+import re
+
+import pandas as pd
+
+from kpis import (
+    AFFECTION_TOKENS, PRONOUNS_I, PRONOUNS_WE, PROFANITY, QUESTION_PAT,
+    count_tokens, lexical_features,
+)
+
+texts = pd.Series([
+    "We should get dinner, just us?",
+    "I told my mum I'd be late",
+    "What the HELL happened to our rocket",
+    "Love you babe ❤️",
+    "hello class",
+    "",
+    None,
+    "mars moon and the sexy cosmos",
+])
+
+
+def test_lexical_features_match_per_column_scans():
+    feats = lexical_features(texts)
+    filled = texts.fillna("")
+    prof = re.compile("|".join(re.escape(w) for w in PROFANITY), re.IGNORECASE)
+    aff = re.compile("|".join(re.escape(t) for t in AFFECTION_TOKENS), re.IGNORECASE)
+    assert feats["is_question"].tolist() == filled.str.contains(QUESTION_PAT).tolist()
+    assert feats["is_profanity"].tolist() == texts.str.contains(prof, na=False).tolist()
+    assert feats["is_affection"].tolist() == texts.str.contains(aff, na=False).tolist()
+    assert feats["we_count"].tolist() == [count_tokens(t, PRONOUNS_WE) for t in filled]
+    assert feats["i_count"].tolist() == [count_tokens(t, PRONOUNS_I) for t in filled]
+
+
+def test_lexical_category_hits():
+    feats = lexical_features(texts)
+    assert feats["swear_hits"].tolist() == [0, 0, 1, 0, 0, 0, 0, 0]
+    assert feats["space_hits"].tolist() == [0, 0, 1, 0, 0, 0, 0, 3]
+    assert feats["sexual_hits"].tolist() == [0, 0, 0, 0, 0, 0, 0, 1]
+
+
+def test_lexical_features_empty():
+    feats = lexical_features(pd.Series([], dtype=object))
+    assert len(feats) == 0
+    assert feats["is_question"].dtype == bool
@@ -0,0 +1,48 @@
+import datetime as dt
+
+from fastapi.testclient import TestClient
+
+from main import app
+from parse import Message
+from store import MessageStore
+
+
+def _msg(minute, sender, text):
+    return Message(ts=dt.datetime(2024, 1, 1, 9, minute), sender=sender, text=text)
+
+
+def test_merge_deduplicates_overlap():
+    older = MessageStore.from_messages(
+        [_msg(0, "A", "hi"), _msg(1, "B", "ok"), _msg(1, "B", "ok"), _msg(2, "A", "bye")]
+    )
+    newer = MessageStore.from_messages(
+        [_msg(1, "B", "ok"), _msg(1, "B", "ok"), _msg(2, "A", "bye"), _msg(2, "A", "bye"),
+         _msg(3, "C", "new person")]
+    )
+    merged, n_new, n_dup = older.merge(newer)
+    assert (n_new, n_dup) == (2, 3)
+    assert [(m.ts.minute, m.sender, m.text) for m in merged] == [
+        (0, "A", "hi"), (1, "B", "ok"), (1, "B", "ok"), (2, "A", "bye"),
+        (2, "A", "bye"), (3, "C", "new person"),
+    ]
+    assert merged.senders == ["A", "B", "C"]
+
+
+def test_merge_identical_export_adds_nothing():
+    store = MessageStore.from_messages([_msg(0, "A", "hi"), _msg(1, "B", "yo")])
+    merged, n_new, n_dup = store.merge(store)
+    assert merged is store
+    assert (n_new, n_dup) == (0, 2)
+
+
+def test_upload_merge_mode_reports_counts():
+    first = "2024-01-01, 9:00 a.m. - A: hi\n2024-01-01, 9:01 a.m. - B: hey\n"
+    second = "2024-01-01, 9:01 a.m. - B: hey\n2024-01-01, 9:05 a.m. - A: later\n"
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", first.encode())})
+    res = client.post(
+        "/upload", params={"mode": "merge"}, files={"file": ("b.txt", second.encode())}
+    )
+    body = res.json()
+    assert body["merge"] == {"new": 1, "duplicate": 1}
+    assert body["kpis"]["totals"]["messages"] == 3
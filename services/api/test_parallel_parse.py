@@ -0,0 +1,91 @@
+import io
+import random
+
+import parse
+from parse import parse_export, parse_export_parallel
+
+
+def _make_chat(n: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = ["‎Messages and calls are end-to-end encrypted."]
+    for i in range(n):
+        hour = rng.randint(1, 12)
+        ampm = rng.choice(["a.m.", "p.m."])
+        sender = rng.choice(["Alice", "Bob", "Carol"])
+        lines.append(f"2024-01-{i % 28 + 1:02d}, {hour}:{i % 60:02d} {ampm} - {sender}: msg {i}")
+        # multi-line messages, some of which will straddle shard cut points
+        for j in range(rng.choice([0, 0, 0, 1, 3])):
+            lines.append(f"continued {i}.{j}")
+        if rng.random() < 0.05:
+            lines.append("")
+    return "\r\n".join(lines)
+
+
+def test_parallel_matches_serial(monkeypatch):
+    monkeypatch.setattr(parse, "PARALLEL_MIN_CHARS", 0)
+    text = _make_chat(2000)
+    serial = parse_export(text)
+    for workers in (2, 3, 7):
+        assert parse_export_parallel(text, workers=workers) == serial
+
+
+def test_shard_boundaries_start_at_timestamp_lines():
+    text = _make_chat(500, seed=1)
+    fmt = parse.detect_format(text.splitlines()[:50])
+    bounds = parse._shard_boundaries(text, fmt, 5)
+    assert bounds[0] == 0 and bounds[-1] == len(text)
+    for b in bounds[1:-1]:
+        assert text[b - 1] == "\n"
+        assert fmt.match(text[b:].splitlines()[0])
+
+
+def test_small_input_uses_serial_path(monkeypatch):
+    def boom(*args, **kwargs):
+        raise AssertionError("process pool should not be used")
+
+    monkeypatch.setattr(parse, "ProcessPoolExecutor", boom)
+    text = _make_chat(10)
+    assert parse_export_parallel(text, workers=4) == parse_export(text)
+
+
+def test_parallel_settles_day_order_for_every_shard(monkeypatch):
+    monkeypatch.setattr(parse, "PARALLEL_MIN_CHARS", 0)
+    # days <= 12 in the sniffed head; the first day > 12 is in the last shard
+    lines = [
+        f"{d:02d}/03/2024, {h}:{m:02d} pm - A: msg {d} {h} {m}"
+        for d in range(1, 13) for h in range(1, 12) for m in range(0, 60, 15)
+    ] + [f"{d:02d}/03/2024, 1:00 pm - B: late {d}" for d in range(13, 32)]
+    text = "\n".join(lines)
+    msgs = parse_export_parallel(text, workers=4)
+    assert msgs == parse_export(text)
+    assert {m.ts.month for m in msgs} == {3}
+
+
+def test_parse_file_goes_parallel_above_threshold(monkeypatch):
+    data = _make_chat(300).encode("utf-8")
+    calls = []
+    monkeypatch.setattr(
+        parse, "parse_export_parallel", lambda text, tz, workers: calls.append(workers) or []
+    )
+    assert list(parse.parse_file(io.BytesIO(data), workers=3)) == parse_export(data.decode())
+    assert calls == []
+    monkeypatch.setattr(parse, "PARALLEL_MIN_CHARS", len(data))
+    parse.parse_file(io.BytesIO(data), workers=3)
+    parse.parse_file(io.BytesIO(data), workers=1)
+    assert calls == [3]
+
+
+def test_message_bodies_do_not_settle_day_order(monkeypatch):
+    monkeypatch.setattr(parse, "PARALLEL_MIN_CHARS", 10)
+    lines = [
+        f"{d:02d}/01/2024, {h}:{m:02d} pm - A: msg {d} {h} {m}"
+        for d in range(1, 13) for h in range(1, 12) for m in range(0, 60, 15)
+    ]
+    # a continuation line that reads as M/D/Y, ahead of the D/M/Y date
+    lines[300:300] = ["05/13/2024 is the deadline"]
+    lines.append("13/01/2024, 1:00 pm - B: late")
+    text = "\n".join(lines)
+    msgs = parse_export_parallel(text, workers=4)
+    assert msgs == parse_export(text)
+    assert len(msgs) == 12 * 11 * 4 + 1
+    assert {m.ts.month for m in msgs} == {1}
@@ -0,0 +1,41 @@
+import pytest
+
+import parallel
+from kpis import compute, to_df
+from store import MessageStore
+from test_incremental import _messages
+
+
+@pytest.mark.parametrize("capacity, distributions", [(None, "raw"), (60, "sketch")])
+def test_parallel_compute_matches_sequential(capacity, distributions):
+    df = to_df(MessageStore.from_messages(_messages(600, seed=7)))
+    expected = compute(df, word_cloud_capacity=capacity, distributions=distributions)
+    got = compute(df, word_cloud_capacity=capacity, distributions=distributions, workers=2)
+    assert got == expected
+    assert list(got) == list(expected)
+
+
+def test_parallel_compute_of_empty_chat():
+    assert compute(to_df([]), workers=2) == compute(to_df([]))
+
+
+def test_shared_columns_round_trip():
+    df = to_df(_messages(80, seed=2))
+    d = df[~df["is_system"]].reset_index(drop=True)
+    shm, spec = parallel._share(d)
+    try:
+        attached, cols = parallel._attach(spec)
+        frame = parallel._frame(cols, spec["senders"], texts=True)
+        assert frame["text"].tolist() == d["text"].tolist()
+        assert frame["sender"].tolist() == d["sender"].tolist()
+        assert (frame["ts"] == d["ts"]).all()
+        assert set(parallel._frame(cols, spec["senders"], texts=False)["text"]) == {""}
+        for k, sender in enumerate(spec["senders"]):
+            rows = cols["sender_order"][cols["sender_ptr"][k]:cols["sender_ptr"][k + 1]]
+            expected = d.loc[d["sender"] == sender, "text"].tolist()
+            assert parallel._texts(cols, rows).tolist() == expected
+        del frame, cols, rows
+        attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
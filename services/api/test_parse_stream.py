@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+import parse
+from parse import parse_export, parse_stream
+
+sample_chat = (
+    "Messages and calls are end-to-end encrypted.\r\n"
+    "2024-01-01, 9:00 a.m. - Alice: hi ❤️\r\n"
+    "2024-01-01, 9:01 a.m. - Bob: first line\r\n"
+    "second line é\r\n"
+    "\r\n"
+    "2024-01-01, 9:02 a.m. - Alice added Bob\r\n"
+    "2024-01-01, 12:05 p.m. - Bob: <Media omitted>\r\n"
+    "2024-01-02, 1:15 a.m. - Alice: “quoted” text"
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_parse_stream_matches_parse_export(chunk_size):
+    expected = parse_export(sample_chat)
+    data = io.BytesIO(sample_chat.encode("utf-8"))
+    got = list(parse_stream(data, chunk_size=chunk_size))
+    assert got == expected
+    assert [m.text for m in got] == [
+        "hi ❤️",
+        "first line\nsecond line é",
+        "Alice added Bob",
+        "<Media omitted>",
+        '"quoted" text',
+    ]
+    assert got[2].is_system
+    assert got[3].has_media
+
+
+def test_parse_stream_is_incremental(monkeypatch):
+    monkeypatch.setattr(parse, "SNIFF_LINES", 2)
+    reads = []
+
+    class Reader(io.BytesIO):
+        def read(self, n=-1):
+            chunk = super().read(n)
+            reads.append(len(chunk))
+            return chunk
+
+    stream = parse_stream(Reader(sample_chat.encode("utf-8")), chunk_size=16)
+    first = next(stream)
+    assert first.sender == "Alice"
+    assert len(reads) < len(sample_chat.encode("utf-8")) // 16
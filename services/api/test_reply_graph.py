@@ -0,0 +1,47 @@
+import datetime as dt
+
+import pytest
+
+from incremental import KPIState
+from kpis import KPIEngine, compute, to_df
+from parse import Message
+from store import MessageStore
+from test_incremental import _messages
+
+
+def _chat(*rows):
+    start = dt.datetime(2024, 1, 1, 8, 0)
+    return [Message(ts=start + dt.timedelta(seconds=s), sender=p, text="hi") for p, s in rows]
+
+
+def test_reply_graph_counts_who_answers_whom():
+    df = to_df(_chat(
+        ("Alice", 0), ("Alice", 10), ("Bob", 60),    # Bob answers a 2-message run
+        ("Carol", 90),                               # Carol answers Bob
+        ("Alice", 100), ("Bob", 200),                # Bob answers Alice again
+        ("Alice", 230), ("Alice", 240), ("Carol", 300),
+    ))
+    graph = KPIEngine(df).get(["reply_graph"])["reply_graph"]
+    assert graph["senders"] == ["Alice", "Bob", "Carol"]
+    assert graph["replies"] == [[0, 2, 1], [1, 0, 1], [1, 0, 0]]
+    assert graph["interruptions"] == [[0, 1, 1], [0, 0, 0], [0, 0, 0]]
+    assert graph["median_seconds"] == [
+        [None, 80.0, 70.0], [30.0, None, 30.0], [10.0, None, None],
+    ]
+
+
+def test_reply_graph_of_empty_chat():
+    graph = compute(to_df([]))["reply_graph"]
+    assert graph == {"senders": [], "replies": [], "median_seconds": [], "interruptions": []}
+
+
+@pytest.mark.parametrize("distributions", ["raw", "sketch"])
+@pytest.mark.parametrize("cuts", [[1], [3, 4, 5], [150, 151, 299]])
+def test_reply_graph_folds_across_run_boundaries(cuts, distributions):
+    df = to_df(MessageStore.from_messages(_messages(300, seed=3)))
+    state = KPIState(distributions=distributions)
+    for a, b in zip([0] + cuts, cuts + [len(df)]):
+        state.extend(df.iloc[a:b])
+    expected = compute(df, distributions=distributions)["reply_graph"]
+    assert state.payload()["reply_graph"] == expected
+    assert sum(map(sum, expected["replies"])) > 0
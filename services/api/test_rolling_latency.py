@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from kpis import KPIEngine, compute, rolling_latency, to_df
+from main import app
+from sketches import QuantileSketch
+from store import MessageStore
+from test_incremental import _export, _messages
+
+
+def _rolling(df, **options):
+    return KPIEngine(df, **options).get(["reply_latency_rolling"])["reply_latency_rolling"]
+
+
+def _brute_force(rp, windows=(7, 30)):
+    day = rp["to_ts"].dt.normalize()
+    sec = rp["sec"].clip(lower=0)
+    out = []
+    for w in windows:
+        for d in pd.date_range(day.min(), day.max(), freq="D"):
+            for sender in sorted(rp["to"].unique()):
+                mask = (rp["to"] == sender) & (day > d - pd.Timedelta(days=w)) & (day <= d)
+                if not mask.any():
+                    continue
+                sketch = QuantileSketch()
+                sketch.update(sec[mask])
+                out.append({
+                    "window": w, "day": d.strftime("%Y-%m-%d"), "sender": sender,
+                    "replies": int(mask.sum()),
+                    "p50": sketch.quantile(0.5), "p90": sketch.quantile(0.9),
+                })
+    return out
+
+
+def test_rolling_latency_matches_a_sketch_per_window():
+    df = to_df(MessageStore.from_messages(_messages(600, seed=4)))
+    engine = KPIEngine(df)
+    rolling = engine.get(["reply_latency_rolling"])["reply_latency_rolling"]
+    assert rolling == _brute_force(engine.reply_pairs)
+    assert {r["window"] for r in rolling} == {7, 30}
+
+
+def test_rolling_latency_window_forgets_old_replies():
+    days = np.array(["2024-01-01", "2024-01-01", "2024-01-09"], dtype="datetime64[D]")
+    keys = QuantileSketch().bucket_keys([0.0, 100.0, 10.0])
+    rolling = rolling_latency(days, np.array(["Bob"] * 3, dtype=object), keys, np.ones(3), [7])
+    by_day = {r["day"]: r for r in rolling}
+    assert sorted(by_day) == [f"2024-01-0{k}" for k in range(1, 10) if k != 8]
+    assert by_day["2024-01-07"]["replies"] == 2
+    assert by_day["2024-01-07"]["p50"] == 0.0
+    assert by_day["2024-01-09"]["replies"] == 1
+    assert abs(by_day["2024-01-09"]["p90"] - 10.0) <= 0.1
+
+
+def test_rolling_latency_is_the_same_in_sketch_mode():
+    df = to_df(MessageStore.from_messages(_messages(400, seed=5)))
+    assert _rolling(df) == _rolling(df, distributions="sketch")
+
+
+def test_only_served_on_request():
+    msgs = _messages(300, seed=6)
+    assert "reply_latency_rolling" not in compute(to_df(msgs))
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(msgs))})
+    assert "reply_latency_rolling" not in client.get("/kpis").json()["kpis"]
+    res = client.get("/kpis", params={"sections": "reply_latency_rolling"})
+    assert res.json()["kpis"]["reply_latency_rolling"] == _rolling(
+        to_df(MessageStore.from_messages(msgs))
+    )
+
+
+def test_no_replies_gives_no_records():
+    assert _rolling(to_df([])) == []
+    assert rolling_latency(np.array([], dtype="datetime64[D]"), np.array([]), np.array([]), []) == []
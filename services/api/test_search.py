@@ -0,0 +1,93 @@
+import datetime as dt
+import re
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from main import app
+from parse import Message
+from search import SearchIndex, _vbyte_decode, _vbyte_encode, parse_query
+from store import MessageStore
+from test_incremental import _export, _messages
+
+
+def _store():
+    start = dt.datetime(2024, 1, 1, 9, 0)
+    rows = [
+        ("Alice", "Should we go to Paris?"),
+        ("Bob", "paris is far, we should go to Rome"),
+        (None, "Alice changed the subject to Paris"),
+        ("Alice", "We should GO. Parisian food!"),
+        ("Bob", "go go go"),
+    ]
+    return MessageStore.from_messages([
+        Message(ts=start + dt.timedelta(days=k), sender=p, text=t, is_system=p is None)
+        for k, (p, t) in enumerate(rows)
+    ])
+
+
+def test_vbyte_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2 ** 21, 2 ** 35 + 5, 2 ** 40])
+    buf, nbytes = _vbyte_encode(values)
+    assert nbytes.tolist() == [1, 1, 1, 2, 2, 4, 6, 6]
+    assert _vbyte_decode(buf).tolist() == values.tolist()
+
+
+def test_parse_query():
+    assert parse_query('"we should" go* Don\'t x') == [
+        ("phrase", ["we", "should"]), ("prefix", ["go"]), ("phrase", ["don", "t"]),
+        ("term", ["x"]),
+    ]
+    assert parse_query('"" ?') == []
+
+
+def test_terms_phrases_and_prefixes():
+    index = SearchIndex(_store())
+    assert index.match("paris").tolist() == [0, 1]
+    assert index.match("pari*").tolist() == [0, 1, 3]
+    assert index.match('"we should go"').tolist() == [1, 3]
+    assert index.match('"go to" paris').tolist() == [0, 1]
+    assert index.match('"go go"').tolist() == [4]
+    assert index.match("rome london").tolist() == []
+    assert index.match("subject").tolist() == []
+
+
+def test_filters_and_pages():
+    index = SearchIndex(_store())
+    res = index.search("go", sender="Alice")
+    assert [h["i"] for h in res["hits"]] == [0, 3]
+    assert res["hits"][1] == {
+        "i": 3, "ts": "2024-01-04T09:00:00", "sender": "Alice",
+        "text": "We should GO. Parisian food!",
+    }
+    assert index.search("go", start=dt.date(2024, 1, 2), end=dt.date(2024, 1, 4))["total"] == 2
+    page = index.search("go", offset=1, limit=2)
+    assert page["total"] == 4 and [h["i"] for h in page["hits"]] == [1, 3]
+    assert index.search("go", sender="Nobody")["total"] == 0
+
+
+def test_matches_a_linear_scan():
+    store = MessageStore.from_messages(_messages(500, seed=8))
+    index = SearchIndex(store)
+    texts = store.texts()
+    for q, pattern in [("you", r"\byou\b"), ('"did you eat"', r"\bdid you eat\b"),
+                       ("d*", r"\bd\w*")]:
+        expected = [
+            i for i, t in enumerate(texts)
+            if store.sender_codes[i] >= 0 and re.search(pattern, t.lower())
+        ]
+        assert index.match(q).tolist() == expected, q
+
+
+def test_search_endpoint():
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(_messages(100, seed=7)))})
+    assert main.STATE["search"] is None
+    res = client.get("/search", params={"q": "love", "limit": 3})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["total"] > 3 and len(body["hits"]) == 3
+    assert all("love" in h["text"].lower() for h in body["hits"])
+    assert client.get("/search", params={"q": "love", "end": "x"}).status_code == 400
+    assert client.get("/search").status_code == 422
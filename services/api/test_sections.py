@@ -0,0 +1,82 @@
+import json
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import kpis
+import main
+from kpis import KPIEngine, compute, to_df
+from main import app
+from store import MessageStore
+from test_incremental import _export, _messages
+
+
+def test_sections_match_full_compute_and_share_intermediates(monkeypatch):
+    df = to_df(_messages(300))
+    full = compute(df)
+    calls = []
+    real = kpis.lexical_features
+    monkeypatch.setattr(kpis, "lexical_features", lambda t: calls.append(1) or real(t))
+    engine = KPIEngine(df)
+    assert engine.get(["totals", "heatmap"]) == {"totals": full["totals"], "heatmap": full["heatmap"]}
+    assert calls == []
+    keys = ["questions", "affection_split", "timeline_we_ness", "profanity_hits"]
+    assert engine.get(keys) == {k: full[k] for k in keys}
+    assert engine.get() == full
+    assert calls == [1]
+
+
+@pytest.mark.parametrize("capacity, distributions", [(None, "raw"), (60, "sketch")])
+def test_lean_frame_gives_same_payload(capacity, distributions):
+    store = MessageStore.from_messages(_messages(400))
+    assert compute(
+        to_df(store, lean=True), word_cloud_capacity=capacity, distributions=distributions
+    ) == compute(to_df(store), word_cloud_capacity=capacity, distributions=distributions)
+
+
+def test_kpi_lean_uploads_use_the_lean_frame(monkeypatch):
+    monkeypatch.setattr(main, "KPI_LEAN", True)
+    msgs = _messages(300, seed=5)
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(msgs))})
+    assert isinstance(main.STATE["messages_df"]["sender"].dtype, pd.CategoricalDtype)
+    assert client.get("/kpis").json()["kpis"] == json.loads(json.dumps(compute(to_df(msgs))))
+
+
+def test_unsorted_frames_are_sorted_stably():
+    shuffled = to_df(_messages(200)).sample(frac=1, random_state=1)
+    cleaned = shuffled.sort_values("ts", kind="stable")
+    assert compute(shuffled) == compute(cleaned)
+
+
+def test_day_labels_format_only_at_the_end():
+    ts = pd.Series(pd.to_datetime(["2024-03-02 23:59", "2024-02-28 00:01", "2024-03-02 01:00"]))
+    days = kpis.day_labels(ts)
+    assert days.tolist() == ["2024-03-02", "2024-02-28", "2024-03-02"]
+    assert list(days.cat.categories) == ["2024-02-28", "2024-02-29", "2024-03-01", "2024-03-02"]
+    assert kpis.day_labels(ts.iloc[:0]).tolist() == []
+
+
+def test_word_cloud_error_bound_only_in_approximate_mode():
+    df = to_df(_messages(50))
+    assert "word_cloud_error_bound" not in KPIEngine(df).keys
+    assert "word_cloud_error_bound" in KPIEngine(df, word_cloud_capacity=60).keys
+
+
+def test_upload_defers_expensive_sections(monkeypatch):
+    msgs = _messages(200, seed=7)
+    calls = []
+    real = kpis.word_counters
+    monkeypatch.setattr(kpis, "word_counters", lambda *a, **k: calls.append(1) or real(*a, **k))
+    client = TestClient(app)
+    res = client.post("/upload", files={"file": ("a.txt", _export(msgs))})
+    assert "word_cloud" not in res.json()["kpis"]
+    # counted once, by the fold after the response
+    assert calls == [1]
+
+    res = client.get("/kpis", params={"sections": "word_cloud,totals"})
+    assert set(res.json()["kpis"]) == {"word_cloud", "totals"}
+    client.get("/kpis", params={"sections": "word_cloud"})
+    assert calls == [1]
+    assert client.get("/kpis", params={"sections": "nope"}).status_code == 400
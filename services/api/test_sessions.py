@@ -0,0 +1,88 @@
+import datetime as dt
+
+from fastapi.testclient import TestClient
+
+import main
+from main import app
+from parse import Message
+from sessions import SessionIndex
+from store import MessageStore
+from test_incremental import _export, _messages
+
+HOUR = dt.timedelta(hours=1)
+
+
+def _chat():
+    start = dt.datetime(2024, 1, 1, 22, 0)
+    rows = [
+        ("Alice", 0), ("Bob", 5), ("Alice", 10),       # session 0, 10 minutes
+        ("Bob", 200), ("Carol", 201),                  # session 1, next day
+        (None, 210),
+        ("Carol", 300), ("Carol", 330), ("Alice", 340),  # session 2
+    ]
+    return [
+        Message(ts=start + dt.timedelta(minutes=m), sender=p, text="hi", is_system=p is None)
+        for p, m in rows
+    ]
+
+
+def test_sessions_split_on_idle_gaps():
+    index = SessionIndex(MessageStore.from_messages(_chat()), HOUR)
+    assert len(index) == 3
+    records = index.records()
+    assert [r["initiator"] for r in records] == ["Alice", "Bob", "Carol"]
+    assert [r["messages"] for r in records] == [3, 2, 3]
+    assert records[0]["participants"] == {"Alice": 2, "Bob": 1}
+    assert records[0]["duration_seconds"] == 600.0
+    assert (records[1]["first_message"], records[1]["last_message"]) == (3, 4)
+    assert records[2]["start"] == "2024-01-02T03:00:00"
+
+
+def test_session_kpis_and_date_range():
+    index = SessionIndex(MessageStore.from_messages(_chat()), HOUR)
+    kpis = index.kpis()
+    assert kpis["sessions"] == 3
+    assert kpis["initiators"] == [
+        {"sender": "Alice", "started": 1, "joined": 2, "share": 1 / 3},
+        {"sender": "Bob", "started": 1, "joined": 2, "share": 1 / 3},
+        {"sender": "Carol", "started": 1, "joined": 2, "share": 1 / 3},
+    ]
+    assert kpis["per_day"] == [
+        {"day": "2024-01-01", "sessions": 1}, {"day": "2024-01-02", "sessions": 2},
+    ]
+    assert kpis["messages"]["p50"] == 3.0
+    assert kpis["duration_minutes"]["histogram"]["counts"][:5] == [0, 1, 1, 0, 1]
+    day2 = index.kpis(start=dt.date(2024, 1, 2))
+    assert day2["sessions"] == 2
+    assert [r["sender"] for r in day2["initiators"]] == ["Alice", "Bob", "Carol"]
+    assert [r["started"] for r in day2["initiators"]] == [0, 1, 1]
+
+
+def test_unsorted_store_matches_sorted_one():
+    msgs = _messages(300, seed=2)
+    gap = dt.timedelta(minutes=30)
+    ordered = SessionIndex(MessageStore.from_messages(msgs), gap)
+    shuffled = SessionIndex(MessageStore.from_messages(msgs[150:] + msgs[:150]), gap)
+    assert ordered.kpis() == shuffled.kpis()
+    assert len(ordered) > 1
+
+
+def test_empty_chat_has_no_sessions():
+    index = SessionIndex(MessageStore.from_messages([]), HOUR)
+    assert len(index) == 0 and index.records() == []
+    assert index.kpis()["sessions"] == 0
+
+
+def test_session_endpoints():
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(_messages(200, seed=6)))})
+    assert list(main.STATE["sessions"]) == [main.SESSION_GAP_MINUTES]
+    res = client.get("/sessions")
+    assert res.status_code == 200
+    total = res.json()["sessions"]
+    assert sum(r["started"] for r in res.json()["initiators"]) == total
+    page = client.get("/sessions/list", params={"offset": 1, "limit": 2}).json()
+    assert page["total"] == total and [s["id"] for s in page["sessions"]] == [1, 2]
+    assert client.get("/sessions", params={"gap": 5}).json()["sessions"] >= total
+    assert 5 in main.STATE["sessions"]
+    assert client.get("/sessions", params={"start": "nope"}).status_code == 400
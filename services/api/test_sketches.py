@@ -0,0 +1,88 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpis import compute, to_df, word_counts
+from sketches import QuantileSketch, SpaceSaving
+
+
+def _zipf_stream(n, vocab, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (r + 1) for r in range(vocab)]
+    return rng.choices([f"w{r}" for r in range(vocab)], weights=weights, k=n)
+
+
+def test_space_saving_bounds_hold():
+    stream = _zipf_stream(20000, 2000)
+    exact = Counter(stream)
+    sk = SpaceSaving(100)
+    sk.update(stream)
+    assert len(sk.counts) == 100
+    assert sk.total == len(stream)
+    assert 0 < sk.error_bound <= len(stream) / 100
+    for w, c in sk.counts.items():
+        assert exact[w] <= c <= exact[w] + sk.errors[w]
+    # every item more frequent than the bound is monitored
+    assert all(w in sk.counts for w, c in exact.items() if c > sk.error_bound)
+    assert [w for w, _ in sk.top(5)] == [w for w, _ in exact.most_common(5)]
+
+
+def test_space_saving_is_exact_below_capacity():
+    sk = SpaceSaving(10)
+    sk.update("abracadabra")
+    assert sk.counts == dict(Counter("abracadabra"))
+    assert sk.error_bound == 0
+
+
+def test_approximate_word_cloud_matches_exact_top_words():
+    stream = _zipf_stream(24000, 3000)
+    texts = [" ".join(stream[i * 8:(i + 1) * 8]) + " fuck moon" * (i % 3) for i in range(3000)]
+    df = pd.DataFrame({"sender": "A", "text": texts, "has_media": False})
+    exact = word_counts(df, ["A"], top_n=10)["A"]
+    approx = word_counts(df, ["A"], top_n=10, capacity=300)["A"]
+    approx_by_name = {r["name"]: r for r in approx}
+    for row in exact[:5]:
+        got = approx_by_name[row["name"]]
+        assert got["value"] - got["error"] <= row["value"] <= got["value"]
+        assert got["tags"] == row["tags"]
+    assert approx_by_name["moon"]["tags"] == ["space"]
+    assert approx_by_name["moon"]["error"] == 0
+
+
+def test_quantile_sketch_has_relative_error_and_merges_exactly():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([np.zeros(50), rng.lognormal(5, 2, 20000)])
+    whole = QuantileSketch(0.01)
+    whole.update(values)
+    parts = QuantileSketch(0.01)
+    for chunk in np.array_split(values, 7):
+        piece = QuantileSketch(0.01)
+        piece.update(chunk)
+        parts.merge(piece)
+    assert parts.buckets == whole.buckets and parts.count == whole.count
+    for q in (0.5, 0.9, 0.99):
+        assert whole.quantile(q) == pytest.approx(np.quantile(values, q, method="lower"), rel=0.011)
+    assert whole.quantile(0) == 0.0
+    assert len(whole.buckets) < 1500
+
+
+def test_sketch_distributions_are_bounded_per_day():
+    from test_incremental import _messages
+
+    msgs = _messages(600)
+    raw = compute(to_df(msgs))
+    k = compute(to_df(msgs), distributions="sketch")
+    for sender, values in raw["words_per_message"].items():
+        summary = k["words_per_message"][sender]
+        assert summary["count"] == len(values)
+        assert sum(summary["histogram"]["counts"]) == len(values)
+        assert summary["p50"] == pytest.approx(np.quantile(values, 0.5, method="lower"), rel=0.011)
+    days = {(r["day"], r["sender"]) for r in raw["words_per_message_timeline"]}
+    assert len(k["words_per_message_timeline"]) == len(days)
+    assert sum(r["replies"] for r in k["reply_times_timeline"]) == sum(
+        r["n"] for r in raw["reply_simple"]
+    )
+    assert k["reply_simple"] == raw["reply_simple"]
@@ -0,0 +1,78 @@
+import datetime as dt
+import importlib.util
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpis import compute, to_df
+from parse import Message, group_by_day
+from store import MessageStore
+
+msgs = [
+    Message(ts=dt.datetime(2024, 1, 2, 9, 0), sender="Bob", text="later ❤️"),
+    Message(ts=dt.datetime(2024, 1, 1, 9, 0), sender="Alice", text="hi there"),
+    Message(ts=dt.datetime(2024, 1, 1, 9, 0), sender=None, text="Alice added Bob", is_system=True),
+    Message(ts=dt.datetime(2024, 1, 1, 9, 5), sender="Bob", text="<Media omitted>", has_media=True),
+]
+
+
+def test_store_sorts_stably_and_round_trips_messages():
+    store = MessageStore.from_messages(iter(msgs))
+    assert len(store) == 4
+    assert list(store) == [msgs[1], msgs[2], msgs[3], msgs[0]]
+    assert store.senders == ["Bob", "Alice"]
+    assert store[-1].text == "later ❤️"
+
+
+def test_df_view_shares_memory_with_store():
+    store = MessageStore.from_messages(msgs)
+    df = to_df(store)
+    assert list(df.columns) == [
+        "i", "ts", "sender", "text", "has_media", "is_system", "n_words", "n_chars",
+    ]
+    assert df["sender"].tolist() == ["Alice", "", "Bob", "Bob"]
+    assert df["n_words"].tolist() == [2, 3, 2, 2]
+    assert df["n_chars"].tolist() == [8, 15, 15, 8]
+    for col in ("ts", "has_media", "is_system", "n_words", "n_chars"):
+        assert np.shares_memory(df[col].to_numpy(), getattr(store, col))
+
+
+def test_to_df_accepts_message_lists():
+    assert to_df(msgs).equals(to_df(MessageStore.from_messages(msgs)))
+
+
+def test_lean_df_uses_sorted_categorical_senders():
+    store = MessageStore.from_messages(msgs)
+    lean = to_df(store, lean=True)
+    assert lean["sender"].dtype == "category"
+    assert list(lean["sender"].cat.categories) == ["", "Alice", "Bob"]
+    assert lean["sender"].tolist() == to_df(store)["sender"].tolist()
+    assert lean["text"].tolist() == to_df(store)["text"].tolist()
+
+
+@pytest.mark.skipif(importlib.util.find_spec("pyarrow") is None, reason="needs pyarrow")
+def test_arrow_texts_share_the_store_buffers():
+    store = MessageStore.from_messages(msgs)
+    arrow = store.arrow_texts()
+    assert arrow is not None and list(arrow) == store.texts().tolist()
+    lean = to_df(store, lean=True)
+    assert isinstance(lean["text"].dtype, pd.ArrowDtype)
+    assert compute(lean) == compute(to_df(store))
+
+
+def test_arrow_texts_without_pyarrow(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    store = MessageStore.from_messages(msgs)
+    assert store.arrow_texts() is None
+    assert to_df(store, lean=True)["text"].tolist() == store.texts().tolist()
+
+
+def test_group_by_day_iterates_store():
+    store = MessageStore.from_messages(msgs)
+    days = group_by_day(store, dt.timezone.utc)
+    assert sorted(days) == [dt.date(2024, 1, 1), dt.date(2024, 1, 2)]
+    assert [m.text for m in days[dt.date(2024, 1, 1)]] == [
+        "hi there", "Alice added Bob", "<Media omitted>",
+    ]
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cube import DayCube
+from kpis import KPIEngine, compute, to_df
+from main import app
+from store import MessageStore
+from test_incremental import _export, _messages
+from timeline import TimelineRollups, lttb
+
+
+def _cube(msgs):
+    return DayCube.from_engine(KPIEngine(to_df(MessageStore.from_messages(msgs))))
+
+
+def test_lttb_keeps_ends_and_peaks():
+    y = np.zeros(1000)
+    y[537] = 50.0
+    idx = lttb(y, 20)
+    assert len(idx) == 20 and idx[0] == 0 and idx[-1] == 999
+    assert 537 in idx.tolist()
+    assert np.all(np.diff(idx) > 0)
+    assert lttb(y[:10], 20).tolist() == list(range(10))
+
+
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+def test_rollups_match_grouped_daily_timeline(granularity):
+    msgs = _messages(2000, seed=1)
+    rollups = TimelineRollups(_cube(msgs))
+    got = rollups.series("words", granularity)
+
+    frame = pd.DataFrame(compute(to_df(msgs))["timeline_words"])
+    day = pd.to_datetime(frame["day"])
+    if granularity == "week":
+        day = day - pd.to_timedelta(day.dt.weekday, unit="D")
+    elif granularity == "month":
+        day = day.dt.to_period("M").dt.start_time
+    expected = frame.groupby([day.dt.strftime("%Y-%m-%d"), "sender"])["words"].sum()
+    for k, period in enumerate(got["periods"]):
+        for sender, values in got["series"].items():
+            assert values[k] == expected.get((period, sender), 0)
+    assert got["total"] == [sum(v[k] for v in got["series"].values()) for k in range(len(got["periods"]))]
+    assert sum(got["total"]) == frame["words"].sum()
+    assert len(got["periods"]) == got["total_periods"]
+
+
+def test_downsampled_series_is_memoized():
+    rollups = TimelineRollups(_cube(_messages(2000, seed=1)))
+    full = rollups.series("messages")
+    small = rollups.series("messages", max_points=10)
+    assert len(small["periods"]) == 10 < full["total_periods"] == small["total_periods"]
+    assert set(small["periods"]) <= set(full["periods"])
+    assert rollups.series("messages", max_points=10) is small
+
+
+def test_timeline_endpoint(monkeypatch):
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(_messages(300, seed=3)))})
+    monkeypatch.setattr(main, "KPIState", lambda *a, **k: pytest.fail("folded"))
+    res = client.get("/timeline", params={"metric": "messages", "granularity": "week"})
+    assert res.status_code == 200
+    assert sum(res.json()["total"]) == 300 - sum(1 for m in _messages(300, seed=3) if m.is_system)
+    assert main.STATE["timeline"].cube is main.STATE["cube"]
+    assert client.get("/timeline", params={"metric": "nope"}).status_code == 400
+    assert client.get("/timeline", params={"granularity": "year"}).status_code == 422
+    assert client.get("/timeline", params={"max_points": 2}).status_code == 422
@@ -0,0 +1,84 @@
+import datetime as dt
+
+import pytest
+
+from parse import BRACKET_TS_RE, SNIFF_LINES, TS_RE, detect_format, parse_export
+
+
+@pytest.mark.parametrize(
+    "chat, order",
+    [
+        (
+            "2024-03-14, 9:05 p.m. - Alice: hi\n"
+            "2024-03-14, 12:30 a.m. - Bob: hey",
+            "ymd",
+        ),
+        (
+            "14/03/2024, 21:05 - Alice: hi\n"
+            "14/03/2024, 00:30 - Bob: hey",
+            "dmy",
+        ),
+        (
+            "3/14/24, 9:05 PM - Alice: hi\n"
+            "3/14/24, 12:30 AM - Bob: hey",
+            "mdy",
+        ),
+        (
+            "[14.03.24, 21:05:00] Alice: hi\n"
+            "[14.03.24, 00:30:00] Bob: hey",
+            "dmy",
+        ),
+        (
+            "[3/14/24, 9:05:00 PM] Alice: hi\n"
+            "[3/14/24, 12:30:00 AM] Bob: hey",
+            "mdy",
+        ),
+    ],
+)
+def test_layouts_decode_to_same_timestamps(chat, order):
+    fmt = detect_format(chat.splitlines())
+    assert fmt.order == order
+    msgs = parse_export(chat)
+    assert [(m.sender, m.text) for m in msgs] == [("Alice", "hi"), ("Bob", "hey")]
+    assert [m.ts.replace(year=2024) for m in msgs] == [
+        dt.datetime(2024, 3, 14, 21, 5),
+        dt.datetime(2024, 3, 14, 0, 30),
+    ]
+
+
+def test_bracket_layout_detected():
+    lines = ["[01/02/2024, 10:00:00] A: x", "[01/02/2024, 10:01:00] B: y"]
+    assert detect_format(lines).pattern is BRACKET_TS_RE
+    assert detect_format(["01/02/2024, 10:00 - A: x"]).pattern is TS_RE
+
+
+def test_ambiguous_dates_use_clock_style():
+    assert detect_format(["01/02/24, 10:00 AM - A: x"]).order == "mdy"
+    assert detect_format(["01/02/24, 10:00 - A: x"]).order == "dmy"
+
+
+def test_invalid_timestamp_line_is_dropped():
+    chat = "2024-13-40, 9:00 a.m. - A: bad\n2024-01-01, 9:00 a.m. - B: ok"
+    msgs = parse_export(chat)
+    assert [m.text for m in msgs] == ["ok"]
+
+
+def test_day_order_settled_after_sniffed_lines():
+    # 12h UK export: every date in the sniffed head has day and month <= 12
+    lines = [
+        f"{d:02d}/03/2024, {h}:{m:02d} pm - A: msg {d} {h} {m}"
+        for d in range(1, 13) for h in range(1, 12) for m in range(0, 60, 15)
+    ] + [f"{d:02d}/03/2024, 1:00 pm - B: late {d}" for d in range(13, 32)]
+    assert len(lines) > SNIFF_LINES
+    fmt = detect_format(lines[:SNIFF_LINES])
+    assert (fmt.order, fmt.settled) == ("mdy", False)
+    msgs = parse_export("\n".join(lines))
+    assert len(msgs) == len(lines)
+    assert {m.ts.month for m in msgs} == {3}
+    assert msgs[0].ts == dt.datetime(2024, 3, 1, 13, 0)
+    assert msgs[-1].ts == dt.datetime(2024, 3, 31, 13, 0)
+
+
+def test_unsettled_order_keeps_the_guess():
+    msgs = parse_export("01/02/24, 10:00 AM - A: x\n01/03/24, 10:00 AM - B: y")
+    assert [m.ts.date() for m in msgs] == [dt.date(2024, 1, 2), dt.date(2024, 1, 3)]
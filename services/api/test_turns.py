@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from kpis import interruptions, reply_pairs, reply_pairs_general, turn_runs
+
+
+# Row-by-row reference implementations the vectorized engine must match.
+def ref_reply_pairs(df):
+    if len(df) == 0:
+        return pd.DataFrame()
+    d = df[df["sender"].astype(bool)].reset_index(drop=True)
+    run_starts = d[d["sender"].ne(d["sender"].shift())].reset_index(drop=True)
+    pairs = []
+    for idx in range(len(run_starts) - 1):
+        cur = run_starts.iloc[idx]
+        nxt = run_starts.iloc[idx + 1]
+        if cur["sender"] != nxt["sender"]:
+            pairs.append({
+                "from": cur["sender"],
+                "to": nxt["sender"],
+                "sec": (nxt["ts"] - cur["ts"]).total_seconds(),
+                "from_ts": cur["ts"],
+                "to_ts": nxt["ts"],
+            })
+    return pd.DataFrame(pairs)
+
+
+def ref_reply_pairs_general(df):
+    pairs = []
+    n = len(df)
+    for i in range(n - 1):
+        cur = df.iloc[i]
+        j = i + 1
+        while j < n and df.iloc[j]["sender"] == cur["sender"]:
+            j += 1
+        if j >= n:
+            break
+        nxt = df.iloc[j]
+        delta = (nxt["ts"] - cur["ts"]).total_seconds()
+        if delta >= 0:
+            pairs.append({"initiator": cur["sender"], "responder": nxt["sender"], "sec": float(delta)})
+    return pd.DataFrame(pairs)
+
+
+def ref_interruptions(df):
+    runs = []
+    if len(df) == 0:
+        return pd.DataFrame()
+    df = df.reset_index(drop=True)
+    cur_sender = df.iloc[0]["sender"]
+    run_len = 1
+    for idx in range(1, len(df)):
+        s = df.iloc[idx]["sender"]
+        if s == cur_sender:
+            run_len += 1
+        else:
+            runs.append({"sender": cur_sender, "len": run_len})
+            cur_sender = s
+            run_len = 1
+    runs.append({"sender": cur_sender, "len": run_len})
+    return pd.DataFrame(runs)
+
+
+def _random_chat(seed, n):
+    rng = np.random.default_rng(seed)
+    senders = rng.choice(["Alice", "Bob", "Carol", ""], size=n, p=[0.45, 0.4, 0.1, 0.05])
+    # mostly increasing timestamps with occasional out-of-order rows
+    steps = rng.integers(-120, 3600, size=n)
+    ts = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.cumsum(steps), unit="s")
+    return pd.DataFrame({"ts": ts, "sender": senders.astype(object)})
+
+
+@pytest.mark.parametrize("seed, n", [(0, 0), (1, 1), (2, 2), (3, 50), (4, 500), (5, 2000)])
+def test_turn_engine_matches_reference(seed, n):
+    df = _random_chat(seed, n)
+    pd.testing.assert_frame_equal(reply_pairs(df), ref_reply_pairs(df))
+    pd.testing.assert_frame_equal(reply_pairs_general(df), ref_reply_pairs_general(df))
+    pd.testing.assert_frame_equal(interruptions(df), ref_interruptions(df))
+
+
+def test_reply_pairs_reuses_precomputed_turns():
+    df = _random_chat(7, 300)
+    df = df[df["sender"].astype(bool)].reset_index(drop=True)
+    turns = turn_runs(df["sender"])
+    pd.testing.assert_frame_equal(reply_pairs(df, turns), ref_reply_pairs(df))
+    pd.testing.assert_frame_equal(interruptions(df, turns), ref_interruptions(df))
+
+
+def test_single_sender_chat():
+    df = pd.DataFrame({
+        "ts": pd.date_range("2024-01-01", periods=3, freq="min"),
+        "sender": ["A", "A", "A"],
+    })
+    assert reply_pairs(df).empty and ref_reply_pairs(df).empty
+    assert reply_pairs_general(df).empty
+    assert interruptions(df).to_dict(orient="records") == [{"sender": "A", "len": 3}]
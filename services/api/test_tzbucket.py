@@ -0,0 +1,120 @@
+import datetime as dt
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from kpis import KPIEngine, compute, to_df
+from main import app
+from parse import Message, group_by_day
+from store import MessageStore
+from test_incremental import _export, _messages
+from tzbucket import TZ_SECTIONS, local_ns, rebucket
+
+PLUS_TWO = dt.timezone(dt.timedelta(hours=2))
+
+
+def _shifted(msgs, hours):
+    return [
+        Message(ts=m.ts + dt.timedelta(hours=hours), sender=m.sender, text=m.text,
+                has_media=m.has_media, is_system=m.is_system)
+        for m in msgs
+    ]
+
+
+def test_store_keeps_utc_epochs_and_local_offsets(tmp_path):
+    msgs = [Message(ts=dt.datetime(2024, 5, 1, 9, 30, tzinfo=PLUS_TWO), sender="A", text="hi")]
+    store = MessageStore.from_messages(msgs)
+    assert store.ts[0] == np.datetime64("2024-05-01T07:30", "ns").view(np.int64)
+    assert store.utc_offset.tolist() == [7200]
+    assert to_df(store)["ts"].iloc[0] == dt.datetime(2024, 5, 1, 9, 30)
+    assert list(store) == msgs
+    store.save(tmp_path / "s.npz")
+    loaded = MessageStore.load(tmp_path / "s.npz")
+    assert np.array_equal(loaded.ts, store.ts) and list(loaded) == msgs
+
+
+def test_store_round_trips_its_zone(tmp_path):
+    berlin = ZoneInfo("Europe/Berlin")
+    msgs = [
+        Message(ts=m.ts.replace(tzinfo=berlin), sender=m.sender, text=m.text,
+                has_media=m.has_media, is_system=m.is_system)
+        for m in _messages(300)
+    ]
+    store = MessageStore.from_messages(msgs)
+    store.save(tmp_path / "s.npz")
+    loaded = MessageStore.load(tmp_path / "s.npz")
+    assert loaded.tz == berlin
+    assert list(loaded) == list(store) == msgs
+    utc = dt.timezone.utc
+    assert group_by_day(loaded, utc) == group_by_day(store, utc) == group_by_day(msgs, utc)
+
+
+def test_local_ns_follows_dst_transitions():
+    utc = np.array(["2024-03-10T06:30", "2024-03-10T07:30"], dtype="datetime64[ns]").view(np.int64)
+    local = local_ns(utc, ZoneInfo("America/New_York")).view("datetime64[ns]")
+    assert local.astype(str).tolist() == [
+        "2024-03-10T01:30:00.000000000", "2024-03-10T03:30:00.000000000",
+    ]
+
+
+def test_group_by_day_on_store_matches_message_loop():
+    msgs = [
+        Message(ts=m.ts.replace(tzinfo=PLUS_TWO), sender=m.sender, text=m.text,
+                has_media=m.has_media, is_system=m.is_system)
+        for m in _messages(300)
+    ]
+    tz = ZoneInfo("America/New_York")
+    assert group_by_day(MessageStore.from_messages(msgs), tz) == group_by_day(msgs, tz)
+
+
+def test_rebucket_matches_compute_on_shifted_messages():
+    msgs = _messages(600)
+    store = MessageStore.from_messages(msgs)
+    engine = KPIEngine(to_df(store))
+    full = engine.get()
+    same = rebucket(engine.d, engine.lexical, store.ts, dt.timezone.utc)
+    assert same == {k: full[k] for k in TZ_SECTIONS}
+    east = rebucket(engine.d, engine.lexical, store.ts, ZoneInfo("Etc/GMT-5"))
+    expected = compute(to_df(_shifted(msgs, 5)))
+    assert east == {k: expected[k] for k in TZ_SECTIONS}
+
+
+def test_kpis_endpoint_rebuckets_by_timezone():
+    msgs = _messages(200, seed=9)
+    client = TestClient(app)
+    client.post("/upload", files={"file": ("a.txt", _export(msgs))})
+    res = client.get("/kpis", params={"tz": "Etc/GMT+3"})
+    assert res.status_code == 200
+    expected = compute(to_df(_shifted(msgs, -3)))
+    got = res.json()["kpis"]
+    for key in TZ_SECTIONS + ["totals", "word_cloud"]:
+        assert got[key] == expected[key], key
+    assert "Etc/GMT+3" in main.STATE["tz_kpis"]
+    res = client.get("/kpis", params={"tz": "Etc/GMT+3", "sections": "heatmap,totals"})
+    assert res.json()["kpis"] == {"heatmap": expected["heatmap"], "totals": expected["totals"]}
+    assert client.get("/kpis", params={"tz": "Mars/Olympus"}).status_code == 400
+    assert client.get("/kpis", params={"tz": "UTC", "start": "2024-01-02"}).status_code == 400
+
+
+def test_upload_takes_the_export_timezone():
+    msgs = _messages(200, seed=10)
+    data = _export(msgs)
+    client = TestClient(app)
+    res = client.post("/upload", params={"tz": "Etc/GMT-5"}, files={"file": ("a.txt", data)})
+    assert res.status_code == 200
+    store = main.STATE["messages"]
+    naive = MessageStore.from_messages(msgs)
+    assert np.array_equal(store.ts, naive.ts - 5 * 3600 * 1_000_000_000)
+    assert res.json()["kpis"]["timeline_messages"] == compute(to_df(msgs))["timeline_messages"]
+    expected = compute(to_df(_shifted(msgs, -5)))
+    got = client.get("/kpis", params={"tz": "UTC", "sections": "heatmap"}).json()["kpis"]
+    assert got["heatmap"] == expected["heatmap"]
+
+    # the same bytes without a timezone are another upload
+    client.post("/upload", files={"file": ("a.txt", data)})
+    assert np.array_equal(main.STATE["messages"].ts, naive.ts)
+    res = client.post("/upload_stream", params={"tz": "Mars/Olympus"},
+                      files={"file": ("a.txt", data)})
+    assert res.status_code == 400
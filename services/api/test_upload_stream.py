@@ -0,0 +1,48 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from kpis import ON_REQUEST, SECTIONS, compute, to_df
+from main import STREAM_STAGES, app
+from store import MessageStore
+from test_incremental import _export, _messages
+
+
+def _events(res):
+    return [
+        line[len("data: "):] for line in res.text.splitlines() if line.startswith("data: ")
+    ]
+
+
+def test_stages_cover_every_payload_key():
+    keys = [k for stage in STREAM_STAGES for k in stage]
+    assert sorted(keys) == sorted(set(SECTIONS) - ON_REQUEST)
+
+
+def test_upload_stream_sends_sections_in_stages():
+    msgs = _messages(300, seed=8)
+    client = TestClient(app)
+    res = client.post("/upload_stream", files={"file": ("a.txt", _export(msgs))})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/event-stream")
+    events = _events(res)
+    assert events[-1] == "[DONE]"
+    first, *stages = [json.loads(e) for e in events[:-1]]
+    assert first == {"current": 0, "total": len(STREAM_STAGES), "merge": None}
+    assert [e["current"] for e in stages] == list(range(1, len(STREAM_STAGES) + 1))
+    assert list(stages[0]["kpis"]) == STREAM_STAGES[0]
+
+    full = compute(to_df(MessageStore.from_messages(msgs)))
+    streamed = {}
+    for e in stages:
+        streamed.update(e["kpis"])
+    assert json.loads(json.dumps(full)) == streamed
+    # the assembled payload is kept for /kpis
+    assert main.STATE["kpis"] == full
+
+
+def test_upload_stream_rejects_bad_uploads_before_streaming():
+    client = TestClient(app)
+    res = client.post("/upload_stream", files={"file": ("a.pdf", b"nope")})
+    assert res.status_code == 400
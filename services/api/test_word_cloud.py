@@ -0,0 +1,85 @@
+import random
+import re
+from collections import Counter
+
+import emoji
+import pandas as pd
+
+from kpis import PROFANITY, SEXUAL_WORDS, SPACE_WORDS, STOPWORDS, emoji_tokens, word_counts
+
+
+def ref_word_counts(df, participants, top_n=50):
+    """Previous list/set based implementation, kept as the reference."""
+    out = {}
+    filtered = df[
+        df["sender"].isin(participants)
+        & (~df["has_media"])
+        & (~df["text"].str.contains("<media omitted>", case=False, na=False))
+    ]
+    for sender, sub in filtered.groupby("sender"):
+        words, tags = [], {}
+        for text in sub["text"].fillna(""):
+            for w in re.findall(r"[A-Za-z']+", text.lower()):
+                if w in STOPWORDS:
+                    continue
+                words.append(w)
+                tags.setdefault(w, set())
+                if w in PROFANITY:
+                    tags[w].add("swear")
+                if w in SEXUAL_WORDS:
+                    tags[w].add("sexual")
+                if w in SPACE_WORDS:
+                    tags[w].add("space")
+            for e in [d["emoji"] for d in emoji.emoji_list(text)]:
+                words.append(e)
+                tags.setdefault(e, set()).add("emoji")
+        cnt = Counter(words)
+        top_words = {w for w, _ in cnt.most_common(top_n)}
+        for t in {t for ts in tags.values() for t in ts}:
+            tagged = [w for w in cnt if t in tags.get(w, set())]
+            top_words.update(w for w, _ in Counter({w: cnt[w] for w in tagged}).most_common(top_n))
+        out[str(sender)] = [
+            {"name": w, "value": int(cnt[w]), "tags": sorted(tags.get(w, set()))}
+            for w in sorted(top_words, key=lambda x: cnt[x], reverse=True)
+        ]
+    return out
+
+
+VOCAB = (
+    "we us love you babe hell class fuck shit sex sexy rocket moon mars the and "
+    "don't it's dinner tonight work home dog cat café naïve ok yes no maybe "
+    "❤️ ❤ 😘 😂 🥰 👍🏽 👨‍👩‍👧 🤦‍♀️ 🇨🇦 #️⃣ ©"
+).split()
+
+
+def _random_df(seed, n):
+    rng = random.Random(seed)
+    texts = [" ".join(rng.choice(VOCAB) for _ in range(rng.randint(1, 10))) for _ in range(n)]
+    texts[::17] = ["<Media omitted>"] * len(texts[::17])
+    return pd.DataFrame({
+        "sender": [rng.choice(["Alice", "Bob"]) for _ in range(n)],
+        "text": texts,
+        "has_media": [t == "<Media omitted>" for t in texts],
+    })
+
+
+def test_word_counts_matches_reference():
+    df = _random_df(0, 3000)
+    got = word_counts(df, ["Alice", "Bob"], top_n=10)
+    want = ref_word_counts(df, ["Alice", "Bob"], top_n=10)
+
+    def norm(x):
+        return {k: sorted((r["value"], r["name"], tuple(r["tags"])) for r in v) for k, v in x.items()}
+
+    assert norm(got) == norm(want)
+    for rows in got.values():
+        values = [r["value"] for r in rows]
+        assert values == sorted(values, reverse=True)
+
+
+def test_emoji_tokens_match_emoji_list():
+    rng = random.Random(1)
+    pool = list(emoji.EMOJI_DATA)[:800] + ["a", " ", "‍", "️", "⃣", "é", "🏽", "#"] * 40
+    for _ in range(5000):
+        text = "".join(rng.choice(pool) for _ in range(rng.randint(0, 8)))
+        assert emoji_tokens(text) == [d["emoji"] for d in emoji.emoji_list(text)]
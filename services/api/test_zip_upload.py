@@ -0,0 +1,61 @@
+import io
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from parse import open_zip_export
+
+chat = (
+    "[2024-01-01, 9:00:00 a.m.] Alice: hi\n"
+    "[2024-01-01, 9:01:00 a.m.] Bob: <attached: 00000001-PHOTO-2024-01-01.jpg>\n"
+    "[2024-01-01, 9:02:00 a.m.] Alice: <attached: missing.opus>\n"
+)
+
+
+def _make_zip() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("00000001-PHOTO-2024-01-01.jpg", b"\xff" * 5000)
+        zf.writestr("_chat.txt", chat)
+    return buf.getvalue()
+
+
+def test_open_zip_export_reads_only_chat_member(monkeypatch):
+    data = _make_zip()
+    opened = []
+    real_open = zipfile.ZipFile.open
+
+    def spy(self, name, *args, **kwargs):
+        opened.append(getattr(name, "filename", name))
+        return real_open(self, name, *args, **kwargs)
+
+    monkeypatch.setattr(zipfile.ZipFile, "open", spy)
+    reader, media = open_zip_export(io.BytesIO(data))
+    assert reader.read().decode() == chat
+    assert opened == ["_chat.txt"]
+    assert media == {"00000001-PHOTO-2024-01-01.jpg": 5000}
+
+
+def test_upload_zip_records_media():
+    client = TestClient(app)
+    res = client.post("/upload", files={"file": ("export.zip", _make_zip())})
+    assert res.status_code == 200
+    assert res.json()["kpis"]["totals"]["messages"] == 3
+    assert res.json()["kpis"]["media_total"] == 2
+    media = client.get("/media").json()["media"]
+    assert media == [
+        {"i": 1, "name": "00000001-PHOTO-2024-01-01.jpg", "size": 5000},
+        {"i": 2, "name": "missing.opus", "size": None},
+    ]
+
+
+@pytest.mark.parametrize(
+    "name, payload",
+    [("export.zip", b"not a zip"), ("export.pdf", b"x")],
+)
+def test_upload_rejects_bad_files(name, payload):
+    client = TestClient(app)
+    res = client.post("/upload", files={"file": (name, payload)})
+    assert res.status_code == 400
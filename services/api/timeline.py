@@ -0,0 +1,108 @@
+"""Week/month rollups and point-budget downsampling of the daily timelines.
+
+The per-day, per-sender aggregates of a :class:`cube.DayCube` are summed into
+calendar weeks (starting Monday) or months once per granularity. A series
+longer than the caller's point budget is thinned with
+Largest-Triangle-Three-Buckets (LTTB) on the all-sender totals, so every
+sender shares the same periods and peaks survive the downsampling.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cube import METRICS, DayCube
+
+GRANULARITIES = ["day", "week", "month"]
+
+
+def lttb(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the ``n_out`` points of ``y`` (at x = 0, 1, ...) kept by LTTB.
+
+    The first and last points are always kept. The points in between are
+    split into ``n_out - 2`` buckets, and each bucket keeps the point forming
+    the largest triangle with the previously kept point and the mean of the
+    next bucket.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx = (nxt_lo + nxt_hi - 1) / 2
+        cy = y[nxt_lo:nxt_hi].mean()
+        xs = np.arange(lo, hi)
+        area = np.abs((xs - a) * (cy - y[a]) - (cx - a) * (y[lo:hi] - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+class TimelineRollups:
+    """Per-period, per-sender totals of the cube's metrics, built once per
+    granularity; served series are memoized per query."""
+
+    def __init__(self, cube: DayCube):
+        self.cube = cube
+        self._rollups: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        self._series: Dict[Tuple[str, str, Optional[int]], Dict[str, Any]] = {}
+
+    def rollup(self, granularity: str) -> Tuple[List[str], np.ndarray]:
+        """Period start days and ``(periods, senders, METRICS)`` totals."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {GRANULARITIES}")
+        if granularity not in self._rollups:
+            cube = self.cube
+            daily = np.diff(cube.cum, axis=0)
+            if cube.first_day is None:
+                self._rollups[granularity] = ([], daily)
+                return self._rollups[granularity]
+            days = np.datetime64(cube.first_day, "D") + np.arange(cube.n_days)
+            if granularity == "week":
+                # 1970-01-01 was a Thursday; step back to each day's Monday
+                ordinal = days.astype(np.int64)
+                key = (ordinal - (ordinal + 3) % 7).astype("datetime64[D]")
+            elif granularity == "month":
+                key = days.astype("datetime64[M]").astype("datetime64[D]")
+            else:
+                key = days
+            starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+            labels = np.datetime_as_string(key[starts], unit="D").tolist()
+            self._rollups[granularity] = (labels, np.add.reduceat(daily, starts, axis=0))
+        return self._rollups[granularity]
+
+    def series(
+        self, metric: str, granularity: str = "day", max_points: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """One metric per period and sender, at most ``max_points`` periods.
+
+        ``total_periods`` is the length before downsampling; ``periods`` are
+        the start days of the periods kept.
+        """
+        key = (metric, granularity, max_points)
+        if key not in self._series:
+            labels, counts = self.rollup(granularity)
+            values = counts[:, :, METRICS.index(metric)]
+            if metric != "reply_seconds":
+                values = values.astype(np.int64)
+            total = values.sum(axis=1)
+            idx = lttb(total, max_points) if max_points else np.arange(len(labels))
+            self._series[key] = {
+                "metric": metric,
+                "granularity": granularity,
+                "total_periods": len(labels),
+                "periods": [labels[i] for i in idx.tolist()],
+                "senders": list(self.cube.senders),
+                "series": {
+                    s: values[idx, k].tolist() for k, s in enumerate(self.cube.senders)
+                },
+                "total": total[idx].tolist(),
+            }
+        return self._series[key]
@@ -0,0 +1,108 @@
+"""Re-bucketing of the time-keyed KPI sections into another timezone.
+
+The store keeps UTC epochs, so the day timelines and the hour x weekday
+heatmap for any timezone follow from one vectorised conversion to local
+wall-clock time and a few ``np.bincount`` passes, without re-parsing the
+export or rebuilding the frame.
+"""
+
+import datetime as dt
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+_NS_PER_HOUR = 3600 * 1_000_000_000
+_NS_PER_DAY = 24 * _NS_PER_HOUR
+
+# Payload keys recomputed by :func:`rebucket`.
+TZ_SECTIONS = [
+    "timeline_messages", "timeline", "timeline_words", "timeline_media",
+    "timeline_questions", "timeline_affection", "timeline_profanity",
+    "timeline_we_ness", "heatmap",
+]
+
+# (payload key, record fields) of the day timelines; every field is summed
+# from the column of the same position in the weights of ``rebucket``.
+_TIMELINES = [
+    ("timeline_messages", ["messages"]),
+    ("timeline_words", ["words"]),
+    ("timeline_media", ["media"]),
+    ("timeline_questions", ["questions"]),
+    ("timeline_affection", ["affection"]),
+    ("timeline_profanity", ["profanity"]),
+    ("timeline_we_ness", ["we", "i"]),
+]
+
+
+def local_ns(utc_ns: np.ndarray, tz: dt.tzinfo) -> np.ndarray:
+    """Wall-clock nanoseconds in ``tz`` for UTC epoch nanoseconds."""
+    offset = tz.utcoffset(None)
+    if offset is not None:
+        # fixed offset: no transitions to look up
+        return utc_ns + int(offset.total_seconds()) * 1_000_000_000
+    index = pd.DatetimeIndex(np.asarray(utc_ns).view("datetime64[ns]"), tz="UTC")
+    return index.tz_convert(tz).tz_localize(None).asi8
+
+
+def rebucket(
+    d: pd.DataFrame, lexical: pd.DataFrame, utc_ns: np.ndarray, tz: dt.tzinfo
+) -> Dict[str, Any]:
+    """The :data:`TZ_SECTIONS` of the payload with days and hours taken in ``tz``.
+
+    ``d`` is the cleaned frame of a :class:`kpis.KPIEngine` whose ``i`` column
+    indexes into the store's UTC timestamps ``utc_ns``, and ``lexical`` its
+    lexical features. Records come out in the order the engine produces them.
+    """
+    if len(d) == 0:
+        return dict.fromkeys(TZ_SECTIONS, [])
+    codes, senders = pd.factorize(np.asarray(d["sender"], dtype=object), sort=True)
+    n_senders = len(senders)
+    local = local_ns(utc_ns[d["i"].to_numpy()], tz)
+    day = local // _NS_PER_DAY
+    hour = (local // _NS_PER_HOUR) % 24
+    # 1970-01-01 was a Thursday (Monday is 0)
+    weekday = (day + 3) % 7
+
+    first = int(day.min())
+    n_days = int(day.max()) - first + 1
+    key = (day - first) * n_senders + codes
+    weights = [
+        np.ones(len(d), dtype=np.int64),
+        d["n_words"].to_numpy(np.int64),
+        d["has_media"].to_numpy(np.int64),
+        lexical["is_question"].to_numpy(np.int64),
+        lexical["is_affection"].to_numpy(np.int64),
+        lexical["is_profanity"].to_numpy(np.int64),
+        lexical["we_count"].to_numpy(np.int64),
+        lexical["i_count"].to_numpy(np.int64),
+    ]
+    sums = np.stack([np.bincount(key, w, minlength=n_days * n_senders) for w in weights])
+    sums = sums.astype(np.int64)
+    present = np.flatnonzero(sums[0])
+    labels = np.datetime_as_string(
+        (present // n_senders + first).astype("datetime64[D]"), unit="D"
+    ).tolist()
+    names = [str(senders[c]) for c in (present % n_senders).tolist()]
+    columns = sums[:, present].tolist()
+
+    out: Dict[str, Any] = {}
+    col = 0
+    for name, fields in _TIMELINES:
+        values = columns[col:col + len(fields)]
+        col += len(fields)
+        out[name] = [
+            {"day": d_, "sender": s, **dict(zip(fields, row))}
+            for d_, s, *row in zip(labels, names, *values)
+        ]
+    out["timeline"] = out["timeline_messages"]
+
+    cell = (weekday * 24 + hour) * n_senders + codes
+    counts = np.bincount(cell, minlength=7 * 24 * n_senders)
+    nz = np.flatnonzero(counts)
+    out["heatmap"] = [
+        {"weekday": int(c // (24 * n_senders)), "hour": int(c // n_senders % 24),
+         "sender": str(senders[c % n_senders]), "count": int(counts[c])}
+        for c in nz.tolist()
+    ]
+    return {k: out[k] for k in TZ_SECTIONS}
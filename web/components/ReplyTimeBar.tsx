@@ -8,6 +8,8 @@ interface ReplyRecord {
   day: string;
   sender: string;
   seconds: number;
+  // set on per-day summaries ("sketch" distributions), where seconds is a sum
+  replies?: number;
 }
 
 export default function ReplyTimeBar({ data }: { data: ReplyRecord[] }) {
@@ -25,7 +27,7 @@ export default function ReplyTimeBar({ data }: { data: ReplyRecord[] }) {
       if (!inRange(r.day)) return;
       if (!map[r.sender]) map[r.sender] = { total: 0, count: 0 };
       map[r.sender].total += r.seconds;
-      map[r.sender].count += 1;
+      map[r.sender].count += r.replies ?? 1;
     });
     return Object.keys(map).map((sender) => ({
       sender,
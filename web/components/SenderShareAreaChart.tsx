@@ -4,32 +4,34 @@ import Card from "@/components/Card";
 import useThemePalette from "@/lib/useThemePalette";
 import { useDateRange } from "@/lib/DateRangeContext";
 
-interface MessagePoint {
-  day: string;
-  sender: string;
-  messages: number;
+// Weekly messages per sender as served by /timeline?granularity=week
+interface WeeklyTimeline {
+  periods: string[];
+  series: Record<string, number[]>;
 }
 
 interface Props {
-  messages: MessagePoint[];
+  timeline: WeeklyTimeline | null;
   participants: string[];
 }
 
-function weekKey(day: string): string {
+function addDays(day: string, n: number): string {
   const d = new Date(day);
-  // Adjust to Monday as start of week
-  const diff = (d.getUTCDay() + 6) % 7;
-  const monday = new Date(Date.UTC(d.getUTCFullYear(), d.getUTCMonth(), d.getUTCDate() - diff));
-  return monday.toISOString().slice(0, 10);
+  return new Date(Date.UTC(d.getUTCFullYear(), d.getUTCMonth(), d.getUTCDate() + n))
+    .toISOString().slice(0, 10);
 }
 
-export default function SenderShareAreaChart({ messages, participants }: Props) {
+export default function SenderShareAreaChart({ timeline, participants }: Props) {
   const palette = useThemePalette();
   const { start, end } = useDateRange();
 
-  const filtered = useMemo(() => {
-    return messages.filter(m => (!start || m.day >= start) && (!end || m.day <= end));
-  }, [messages, start, end]);
+  // indices of the weeks (Monday start days) overlapping the selected range
+  const kept = useMemo(() => {
+    const periods = timeline?.periods || [];
+    return periods
+      .map((w, i) => ({ w, i }))
+      .filter(({ w }) => (!start || addDays(w, 6) >= start) && (!end || w <= end));
+  }, [timeline, start, end]);
 
   const colorMap = useMemo(() => {
     const map: Record<string, string> = {};
@@ -39,21 +41,18 @@ export default function SenderShareAreaChart({ messages, participants }: Props)
     return map;
   }, [participants, palette]);
 
-  const weeks = useMemo(() => {
-    const weekSet = new Set<string>();
-    filtered.forEach(m => weekSet.add(weekKey(m.day)));
-    return Array.from(weekSet).sort();
-  }, [filtered]);
+  const weeks = kept.map(k => k.w);
 
   const dataMap = useMemo(() => {
     const map: Record<string, Record<string, number>> = {};
-    filtered.forEach(m => {
-      const w = weekKey(m.day);
-      if (!map[w]) map[w] = {};
-      map[w][m.sender] = (map[w][m.sender] || 0) + m.messages;
+    kept.forEach(({ w, i }) => {
+      map[w] = {};
+      Object.entries(timeline?.series || {}).forEach(([s, values]) => {
+        map[w][s] = values[i] || 0;
+      });
     });
     return map;
-  }, [filtered]);
+  }, [kept, timeline]);
 
   const series = participants.map((p, i) => ({
     name: p,
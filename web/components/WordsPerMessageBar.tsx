@@ -8,6 +8,8 @@ interface WpmRecord {
   day: string;
   sender: string;
   words: number;
+  // set on per-day summaries ("sketch" distributions), where words is a sum
+  messages?: number;
 }
 
 export default function WordsPerMessageBar({ data }: { data: WpmRecord[] }) {
@@ -25,7 +27,7 @@ export default function WordsPerMessageBar({ data }: { data: WpmRecord[] }) {
       if (!inRange(r.day)) return;
       if (!map[r.sender]) map[r.sender] = { total: 0, count: 0 };
       map[r.sender].total += r.words;
-      map[r.sender].count += 1;
+      map[r.sender].count += r.messages ?? 1;
     });
     return Object.keys(map).map((sender) => ({
       sender,
@@ -7,6 +7,30 @@ export async function getKPIs() {
   return data.kpis;
 }
 
+export async function getRangeKPIs(start: string, end: string) {
+  const params = new URLSearchParams();
+  if (start) params.set("start", start);
+  if (end) params.set("end", end);
+  const res = await fetch(`${API_BASE}/kpis?${params}`);
+  if (!res.ok) throw new Error(await res.text());
+  const data = await res.json();
+  return data.kpis;
+}
+
+// Per-period, per-sender series of one metric, rolled up server-side
+// (granularity "day" | "week" | "month") and downsampled to maxPoints.
+export async function getTimeline(
+  metric: string,
+  granularity: "day" | "week" | "month",
+  maxPoints?: number
+) {
+  const params = new URLSearchParams({ metric, granularity });
+  if (maxPoints) params.set("max_points", String(maxPoints));
+  const res = await fetch(`${API_BASE}/timeline?${params}`);
+  if (!res.ok) throw new Error(await res.text());
+  return res.json();
+}
+
 export async function uploadFile(file: File) {
   const form = new FormData();
   form.append("file", file);
@@ -16,6 +40,44 @@ export async function uploadFile(file: File) {
   return data.kpis;
 }
 
+// Upload through /upload_stream, calling onSections with the payload
+// accumulated so far each time a stage of KPI sections arrives.
+export async function uploadFileStream(
+  file: File,
+  onSections?: (kpis: any) => void
+) {
+  const form = new FormData();
+  form.append("file", file);
+  const res = await fetch(`${API_BASE}/upload_stream`, { method: "POST", body: form });
+  if (!res.ok || !res.body) throw new Error(await res.text());
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let kpis: any = {};
+  let buffer = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split("\n\n");
+    buffer = events.pop() || "";
+    for (const ev of events) {
+      if (!ev.startsWith("data: ")) continue;
+      const data = ev.slice("data: ".length);
+      if (data === "[DONE]") return kpis;
+      try {
+        const msg = JSON.parse(data);
+        if (msg.kpis) {
+          kpis = { ...kpis, ...msg.kpis };
+          if (onSections) onSections(kpis);
+        }
+      } catch {
+        // ignore malformed messages
+      }
+    }
+  }
+  return kpis;
+}
+
 export async function getConflicts(
   onProgress?: (current: number, total: number) => void
 ) {
@@ -1,6 +1,6 @@
 
 import { useEffect, useMemo, useState } from "react";
-import { getKPIs, uploadFile, getConflicts } from "@/lib/api";
+import { getRangeKPIs, getTimeline, uploadFileStream, getConflicts } from "@/lib/api";
 import Card from "@/components/Card";
 import Chart from "@/components/Chart";
 import KpiStrip from "@/components/KpiStrip";
@@ -18,6 +18,10 @@ const formatNumber = (n: number) => n.toLocaleString();
 
 export default function Home() {
   const [kpis, setKpis] = useState<KPI | null>(null);
+  // additive KPIs for the selected date range, computed server-side
+  const [rangeKpis, setRangeKpis] = useState<KPI | null>(null);
+  // weekly messages per sender, rolled up server-side
+  const [weeklyMessages, setWeeklyMessages] = useState<any | null>(null);
   const [apiVersion, setApiVersion] = useState<string>("?");
   const [busy, setBusy] = useState(false);
   const [err, setErr] = useState<string | null>(null);
@@ -44,7 +48,27 @@ export default function Home() {
     if (days.length) {
       updateRange(days[0], days[days.length - 1]);
     }
-  }, [kpis]);
+  }, [kpis?.timeline_messages]);
+
+  useEffect(() => {
+    if (!kpis || (!startDate && !endDate)) { setRangeKpis(null); return; }
+    let cancelled = false;
+    getRangeKPIs(startDate, endDate)
+      .then(k => { if (!cancelled) setRangeKpis(k); })
+      .catch(() => { if (!cancelled) setRangeKpis(null); });
+    return () => { cancelled = true; };
+  }, [kpis?.timeline_messages, startDate, endDate]);
+
+  useEffect(() => {
+    if (!kpis?.timeline_messages) { setWeeklyMessages(null); return; }
+    let cancelled = false;
+    getTimeline("messages", "week", 520)
+      .then(t => { if (!cancelled) setWeeklyMessages(t); })
+      .catch(() => { if (!cancelled) setWeeklyMessages(null); });
+    return () => { cancelled = true; };
+  }, [kpis?.timeline_messages]);
+
+  const view: KPI | null = rangeKpis ?? kpis;
 
 async function fetchConflicts() {
   try {
@@ -62,8 +86,8 @@ async function fetchConflicts() {
   const onUpload = async (file: File) => {
     setBusy(true); setErr(null);
     try {
-      const k = await uploadFile(file);
-      setKpis(k);
+      // sections render as they stream in: totals first, word cloud last
+      setKpis(await uploadFileStream(file, setKpis));
       await fetchConflicts();
       setThemeRefresh((v) => v + 1);
     } catch (e: any) {
@@ -94,18 +118,12 @@ async function fetchConflicts() {
   };
 
   const filteredBySender = useMemo(() => {
-    if (!kpis) return [] as Array<any>;
-    if (!startDate && !endDate) return kpis.by_sender || [];
-    const msgMap: Record<string, number> = {};
-    const wordMap: Record<string, number> = {};
-    (kpis.timeline_messages || []).filter((r:any)=>dateFilter(r.day)).forEach((r:any)=>{
-      msgMap[r.sender] = (msgMap[r.sender]||0) + r.messages;
-    });
-    (kpis.timeline_words || []).filter((r:any)=>dateFilter(r.day)).forEach((r:any)=>{
-      wordMap[r.sender] = (wordMap[r.sender]||0) + r.words;
-    });
-    return participants.map(p => ({ sender: p, messages: msgMap[p]||0, words: wordMap[p]||0 }));
-  }, [kpis, startDate, endDate, participants]);
+    if (!view) return [] as Array<any>;
+    if (!rangeKpis) return view.by_sender || [];
+    const rows: Record<string, any> = {};
+    (rangeKpis.by_sender || []).forEach((r:any)=>{ rows[r.sender] = r; });
+    return participants.map(p => ({ sender: p, messages: rows[p]?.messages||0, words: rows[p]?.words||0 }));
+  }, [view, rangeKpis, participants]);
 
   const messagesWordsPerDayOption = () => {
     const daySet = new Set<string>();
@@ -211,9 +229,9 @@ async function fetchConflicts() {
     };
   };
 
-  const affSplit = (kpis?.affection_split ?? []) as Array<{sender:string; affection:number}>;
-  const qSplit = (kpis?.questions_split ?? []) as Array<{sender:string; questions:number; unanswered_15m:number}>;
-  const bySender = (kpis?.by_sender ?? []) as Array<{sender:string; media:number}>;
+  const affSplit = (view?.affection_split ?? []) as Array<{sender:string; affection:number}>;
+  const qSplit = (view?.questions_split ?? []) as Array<{sender:string; questions:number; unanswered_15m:number}>;
+  const bySender = (view?.by_sender ?? []) as Array<{sender:string; media:number}>;
 
   const cardSplit = (metric: "affection" | "questions" | "unanswered" | "attachments") => {
     const rows = participants.map(p => {
@@ -268,10 +286,10 @@ async function fetchConflicts() {
 
           <section id="analytics" className="grid grid-cols-1 xl:grid-cols-2 gap-6">
             <div className="space-y-6">
-              <SenderShareAreaChart messages={kpis?.timeline_messages || []} participants={participants} />
+              <SenderShareAreaChart timeline={weeklyMessages} participants={participants} />
               <WordsPerMessageBar data={kpis?.words_per_message_timeline || []} />
               <ReplyTimeBar data={kpis?.reply_times_timeline || []} />
-              <DailyRhythmHeatmap data={kpis?.heatmap || []} participants={participants} />
+              <DailyRhythmHeatmap data={view?.heatmap || []} participants={participants} />
             </div>
             <div className="space-y-6">
               <Card title="Timeline">
@@ -362,8 +380,8 @@ async function fetchConflicts() {
               title="Questions (total & per person)"
               tooltip="Questions are messages that end with a '?' or start with words like 'who' or 'why'. Marked as unanswered if no one else replies within 15 minutes."
             >
-              <div className="text-3xl">{kpis.questions.total}</div>
-              <div className="text-sm text-gray-300">Unanswered within 15m: {kpis.questions.unanswered_15m}</div>
+              <div className="text-3xl">{view.questions?.total ?? "…"}</div>
+              <div className="text-sm text-gray-300">Unanswered within 15m: {view.questions?.unanswered_15m ?? "…"}</div>
               {cardSplit("questions")}
               <div className="mt-1 text-sm text-gray-300">Unanswered per person:</div>
               {cardSplit("unanswered")}
@@ -372,14 +390,14 @@ async function fetchConflicts() {
               title="Attachments (total & per person)"
               tooltip="Counts messages that include media or file attachments such as photos, videos, audio, or documents."
             >
-              <div className="text-3xl">{kpis.media_total}</div>
+              <div className="text-3xl">{view.media_total}</div>
               {cardSplit("attachments")}
             </Card>
             <Card
               title="Affection markers (total & per person)"
               tooltip="Messages containing affectionate words or emojis like 'love you', '😘', or '❤️'."
             >
-              <div className="text-3xl">{kpis.affection_hits}</div>
+              <div className="text-3xl">{view.affection_hits}</div>
               {cardSplit("affection")}
             </Card>
           </section>